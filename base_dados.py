@@ -0,0 +1,22 @@
+# Ficheiro: base_dados.py
+# Ligações à base de dados local (BASE_DADOS), com a mesma configuração em todos os módulos
+
+import sqlite3
+
+from config import CONFIG
+
+# Tempo (ms) que uma escrita espera pelo lock de outro processo antes de falhar
+ESPERA_LOCK_MS = 5000
+
+def ligar(caminho: str = CONFIG.base_dados, outra_thread: bool = False) -> sqlite3.Connection:
+    """
+    Abre uma ligação em modo WAL (leituras não bloqueiam as escritas de
+    outros processos), em autocommit e com `busy_timeout`. Cada ligação é
+    usada por uma só thread: a do event loop, ou, com `outra_thread`, a
+    thread própria de quem a criou (ex.: um ThreadPoolExecutor de 1 worker).
+    """
+    ligacao = sqlite3.connect(caminho, isolation_level=None, check_same_thread=not outra_thread)
+    ligacao.execute("PRAGMA journal_mode=WAL")
+    ligacao.execute("PRAGMA synchronous=NORMAL")
+    ligacao.execute(f"PRAGMA busy_timeout={ESPERA_LOCK_MS}")
+    return ligacao
@@ -0,0 +1,532 @@
+# Ficheiro: benchmark.py
+# Benchmark e teste de carga offline: APIs simuladas (IPMA, fogos, SeismicPortal),
+# uma API do Telegram falsa e os handlers reais do bot, sem acesso à Internet.
+#
+# Utilização:
+#   python3 benchmark.py                                   # todos os cenários
+#   python3 benchmark.py --utilizadores 5000 --atraso 0.2  # mais carga, APIs mais lentas
+#   python3 benchmark.py --erros 0.3 --cenarios fogos      # 30% de respostas 500 das APIs
+#   python3 benchmark.py --guardar-base                    # grava os resultados como referência
+#   python3 benchmark.py --base benchmark_base.json        # compara (código de saída 1 se piorar)
+#
+# A referência depende da máquina e não é versionada: grava-se com
+# --guardar-base na máquina onde vai ser feita a comparação.
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import importlib
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+from aiohttp import web
+
+try:
+    import resource
+except ImportError:  # Windows: sem medição de memória
+    resource = None
+
+CENARIOS = ("previsao", "fogos", "fogos_paginas", "sismos", "sismos_filtros", "alertas")
+ARQUIVO_BASE = "benchmark_base.json"
+
+# ------------------------- APIS SIMULADAS ---------------------------------
+
+def _agora_iso(segundos_atras: float = 0) -> str:
+    return (datetime.now(timezone.utc) - timedelta(seconds=segundos_atras)).strftime("%Y-%m-%dT%H:%M:%S.0Z")
+
+def _ler_iso(texto: str) -> datetime:
+    # Aceita "2025-08-02" e "2025-08-02T14:14:03", com ou sem fração de segundo e "Z" (sempre UTC)
+    return datetime.fromisoformat(texto[:19]).replace(tzinfo=timezone.utc)
+
+def _gerar_fogos(total: int) -> list:
+    distritos = ("Braga", "Porto", "Viseu", "Coimbra", "Faro", "Lisboa", "Guarda", "Vila Real")
+    estados = ("Em Curso", "Em Resolução", "Conclusão", "Vigilância")
+    return [
+        {
+            "id": str(2025000000 + i), "location": f"Local {i}", "district": distritos[i % len(distritos)],
+            "concelho": f"Concelho {i % 50}", "freguesia": f"Freguesia {i}", "natureza": "Mato",
+            "status": estados[i % len(estados)], "date": "01-08-2025", "hour": "14:00",
+            "man": 10 + i % 300, "terrain": 3 + i % 80, "aerial": i % 6,
+            "lat": 37.0 + (i % 500) * 0.01, "lng": -9.0 + (i % 300) * 0.01,
+        }
+        for i in range(total)
+    ]
+
+def _gerar_sismo(i: int, magnitude: float, segundos_atras: float) -> dict:
+    hora = _agora_iso(segundos_atras)
+    latitude, longitude = 30 + (i * 7) % 40, -30 + (i * 11) % 50
+    return {
+        "type": "Feature", "id": f"bench{i}",
+        "geometry": {"type": "Point", "coordinates": [longitude, latitude, -10.0]},
+        "properties": {
+            "unid": f"bench{i}", "time": hora, "lastupdate": hora, "mag": magnitude, "magtype": "mw",
+            "depth": 10.0, "flynn_region": f"REGIÃO {i}", "lat": latitude, "lon": longitude,
+        },
+    }
+
+class APIsSimuladas:
+    """
+    Substitui as três APIs num único servidor local, com latência, taxa de
+    erros (respostas 500) e tamanho das respostas configuráveis.
+    """
+
+    def __init__(self, atraso: float, erros: float, total_fogos: int, total_sismos: int):
+        self.atraso = atraso
+        self.erros = erros
+        self.fogos = _gerar_fogos(total_fogos)
+        self.sismos = [_gerar_sismo(i, 2 + (i % 50) / 10, i * 60) for i in range(total_sismos)]
+        self.pedidos = {"ipma": 0, "fogos": 0, "sismos": 0}
+
+    async def _responder(self, api: str, dados) -> web.Response:
+        self.pedidos[api] += 1
+        if self.atraso:
+            await asyncio.sleep(self.atraso * random.uniform(0.5, 1.5))
+        if self.erros and random.random() < self.erros:
+            return web.Response(status=500, text="erro simulado")
+        return web.json_response(dados)
+
+    async def ipma(self, request: web.Request) -> web.Response:
+        hoje = datetime.now(timezone.utc).date()
+        registos = [
+            {
+                "dataPrev": f"{hoje + timedelta(days=dia)}T00:00:00", "tMin": 10 + dia, "tMax": 22 + dia,
+                "iUv": 6.5, "probabilidadePrecipita": "12.0", "globalIdLocal": int(request.match_info["local"]),
+            }
+            for dia in range(6)
+        ]
+        return await self._responder("ipma", registos)
+
+    async def fogos_ativos(self, request: web.Request) -> web.Response:
+        return await self._responder("fogos", {"success": True, "data": self.fogos})
+
+    def filtrar_sismos(self, query) -> list:
+        """
+        Aplica os parâmetros FDSN usados pelo bot como o SeismicPortal:
+        start/end (hora do sismo), updatedafter (última revisão), minmag,
+        caixa (minlat/maxlat/minlon/maxlon), orderby (time ou time-asc) e
+        só depois offset/limit.
+        """
+        filtros = []
+        if "start" in query:
+            filtros.append(lambda p, v=_ler_iso(query["start"]): _ler_iso(p["time"]) >= v)
+        if "end" in query:
+            filtros.append(lambda p, v=_ler_iso(query["end"]): _ler_iso(p["time"]) <= v)
+        if "updatedafter" in query:
+            filtros.append(lambda p, v=_ler_iso(query["updatedafter"]): _ler_iso(p["lastupdate"]) > v)
+        if "minmag" in query:
+            filtros.append(lambda p, v=float(query["minmag"]): p["mag"] >= v)
+        for parametro, campo, comparar in (
+            ("minlat", "lat", float.__ge__), ("maxlat", "lat", float.__le__),
+            ("minlon", "lon", float.__ge__), ("maxlon", "lon", float.__le__),
+        ):
+            if parametro in query:
+                filtros.append(lambda p, c=campo, f=comparar, v=float(query[parametro]): f(float(p[c]), v))
+
+        features = [sismo for sismo in self.sismos if all(f(sismo["properties"]) for f in filtros)]
+        features.sort(key=lambda sismo: _ler_iso(sismo["properties"]["time"]), reverse=query.get("orderby") != "time-asc")
+        limite = int(query.get("limit", "10"))
+        inicio = int(query.get("offset", "1")) - 1
+        return features[inicio:inicio + limite]
+
+    async def sismos_recentes(self, request: web.Request) -> web.Response:
+        return await self._responder("sismos", {"type": "FeatureCollection", "features": self.filtrar_sismos(request.query)})
+
+    def aplicacao(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/ipma/{local}.json", self.ipma)
+        app.router.add_get("/fogos", self.fogos_ativos)
+        app.router.add_get("/sismos", self.sismos_recentes)
+        return app
+
+# ------------------------- API DO TELEGRAM FALSA --------------------------
+
+def _criar_telegram_falso(atraso: float = 0.0):
+    """
+    API do Telegram falsa, dentro do processo: substitui o cliente HTTP do
+    `Bot` (`BaseRequest`) e responde aos métodos usados pelo bot sem enviar
+    nada, para que o benchmark meça o bot e não o cliente HTTP do teste.
+    """
+    from telegram.request import BaseRequest
+
+    class TelegramFalso(BaseRequest):
+        def __init__(self):
+            self.chamadas = {}
+            self.respostas_ajuda = 0
+            self._proxima_mensagem = 1
+
+        async def initialize(self) -> None:
+            pass
+
+        async def shutdown(self) -> None:
+            pass
+
+        def _mensagem(self, chat_id, texto: str) -> dict:
+            self._proxima_mensagem += 1
+            return {
+                "message_id": self._proxima_mensagem, "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": "private"}, "text": texto,
+            }
+
+        async def do_request(self, url: str, method: str, request_data=None, **timeouts) -> tuple:
+            nome = url.rsplit("/", 1)[-1]
+            self.chamadas[nome] = self.chamadas.get(nome, 0) + 1
+            dados = request_data.parameters if request_data is not None else {}
+            if atraso:
+                await asyncio.sleep(atraso)
+
+            if nome == "getMe":
+                resultado = {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+            elif nome in ("sendMessage", "editMessageText"):
+                texto = dados.get("text", "")
+                # Os textos de ajuda dos comandos querem dizer que o cenário mandou argumentos inválidos
+                if texto.startswith("Utilização"):
+                    self.respostas_ajuda += 1
+                resultado = self._mensagem(dados.get("chat_id") or 1, texto)
+            else:
+                resultado = True
+            return 200, json.dumps({"ok": True, "result": resultado}).encode("utf-8")
+
+    return TelegramFalso()
+
+async def _servir(app: web.Application) -> tuple:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    porta = site._server.sockets[0].getsockname()[1]
+    return runner, porta
+
+# ------------------------- MEDIÇÕES ---------------------------------------
+
+def _percentil(valores: list, fracao: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(fracao * (len(ordenados) - 1) + 0.5))]
+
+def _memoria_mb() -> float:
+    # Pico de memória residente do processo (ru_maxrss está em KiB no Linux)
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def _carga(args, pedido) -> dict:
+    """
+    Corre `pedido(i)` para cada um dos `--utilizadores`, com no máximo
+    `--concorrencia` em simultâneo, depois de `--aquecimento` pedidos não
+    medidos (caches e ligações já preparadas, como num bot em funcionamento).
+    """
+    utilizadores, concorrencia = args.utilizadores, args.concorrencia
+    for i in range(min(args.aquecimento, utilizadores)):
+        try:
+            await pedido(i)
+        except Exception:
+            pass
+
+    semaforo = asyncio.Semaphore(concorrencia)
+    latencias = []
+    erros = 0
+
+    async def utilizador(i: int) -> None:
+        nonlocal erros
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                await pedido(i)
+            except Exception:
+                erros += 1
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(utilizador(i) for i in range(utilizadores)))
+    duracao = time.perf_counter() - inicio
+    return {
+        "pedidos": utilizadores,
+        "erros": erros,
+        "duracao": round(duracao, 4),
+        "debito": round(utilizadores / duracao, 1) if duracao else 0.0,
+        "p50": round(_percentil(latencias, 0.50), 6),
+        "p99": round(_percentil(latencias, 0.99), 6),
+        "memoria_mb": round(_memoria_mb(), 1),
+    }
+
+# ------------------------- UPDATES SIMULADOS ------------------------------
+
+def _utilizador(i: int) -> dict:
+    return {"id": 100000 + i, "is_bot": False, "first_name": f"Utilizador {i}"}
+
+def _mensagem(i: int, texto: str) -> dict:
+    return {
+        "message_id": i, "date": int(time.time()), "text": texto,
+        "chat": {"id": 100000 + i, "type": "private"}, "from": _utilizador(i),
+    }
+
+def _update_comando(bot, i: int, texto: str):
+    from telegram import Update
+    return Update.de_json({"update_id": i, "message": _mensagem(i, texto)}, bot)
+
+def _update_callback(bot, i: int, dados: str):
+    from telegram import Update
+    return Update.de_json(
+        {
+            "update_id": i,
+            "callback_query": {
+                "id": str(i), "from": _utilizador(i), "chat_instance": str(i), "data": dados,
+                "message": _mensagem(i, "Escolhe a localidade:"),
+            },
+        },
+        bot,
+    )
+
+# ------------------------- CENÁRIOS ---------------------------------------
+
+async def cenario_previsao(bot, args) -> dict:
+    """Utilizadores a escolher uma localidade no teclado (previsão de 5 dias)."""
+    from handlers import callback_localidade
+    from indice_locais import localidades
+
+    ids = list(localidades())
+    updates = [_update_callback(bot, i, f"local_{random.choice(ids)}") for i in range(args.utilizadores)]
+    contexto = SimpleNamespace(bot=bot, args=[])
+    return await _carga(args, lambda i: callback_localidade(updates[i], contexto))
+
+async def cenario_fogos(bot, args) -> dict:
+    from handlers import comando_fogos
+
+    updates = [_update_comando(bot, i, "/fogos") for i in range(args.utilizadores)]
+    contexto = SimpleNamespace(bot=bot, args=[])
+    return await _carga(args, lambda i: comando_fogos(updates[i], contexto))
+
+async def cenario_fogos_paginas(bot, args) -> dict:
+    """Utilizadores a percorrer as páginas e os filtros do /fogos (servidos da mesma fotografia)."""
+    from fogos import FiltroFogos, NIVEIS_OPERACIONAIS, mensagem_fogos
+    from handlers import callback_fogos
+
+    fotografia = await mensagem_fogos.obter_renderizado()
+    distritos = ["", *fotografia.distritos]
+    estados = ["", *fotografia.estados]
+    updates = [
+        _update_callback(bot, i, FiltroFogos(
+            distritos[i % len(distritos)], estados[(i // 3) % len(estados)], NIVEIS_OPERACIONAIS[i % len(NIVEIS_OPERACIONAIS)],
+        ).callback(pagina=i % 5))
+        for i in range(args.utilizadores)
+    ]
+    contexto = SimpleNamespace(bot=bot, args=None)
+    return await _carga(args, lambda i: callback_fogos(updates[i], contexto))
+
+async def cenario_sismos(bot, args) -> dict:
+    from sismos import sismos
+
+    updates = [_update_comando(bot, i, "/sismos") for i in range(args.utilizadores)]
+    contexto = SimpleNamespace(bot=bot, args=[])
+    return await _carga(args, lambda i: sismos(updates[i], contexto))
+
+async def cenario_sismos_filtros(bot, args) -> dict:
+    """/sismos com filtros variados (histórico local ou API, conforme o período pedido)."""
+    from sismos import sismos
+    from sismos_alerta import verificar_historico_sismos
+
+    # Como no bot em funcionamento, o job do histórico já correu pelo menos uma vez
+    await verificar_historico_sismos(SimpleNamespace(bot=bot, job=None))
+
+    filtros = (["24h"], ["12h", "4"], ["7d", "5"], ["48h", "3.5"])
+    updates = [_update_comando(bot, i, "/sismos") for i in range(args.utilizadores)]
+    contextos = [SimpleNamespace(bot=bot, args=filtros[i % len(filtros)]) for i in range(args.utilizadores)]
+    return await _carga(args, lambda i: sismos(updates[i], contextos[i]))
+
+async def cenario_alertas(bot, args, apis: APIsSimuladas) -> dict:
+    """
+    Rajada de `--eventos` sismos graves: deteção pela verificação periódica,
+    fila persistente e envio para todos os canais. A latência é a de cada
+    alerta, da deteção até o Telegram (falso) confirmar o envio.
+    """
+    from fila_alertas import drenar_fila, obter_fila
+    from sismos_alerta import _verificar_sismos_graves
+
+    apis.sismos = [_gerar_sismo(900000 + i, 6.0 + (i % 20) / 10, i) for i in range(args.eventos)]
+    inicio = time.perf_counter()
+    await _verificar_sismos_graves(bot)
+    await drenar_fila(bot)
+    duracao = time.perf_counter() - inicio
+
+    latencias = [
+        latencia for (latencia,) in obter_fila()._ligacao.execute(
+            "SELECT entregue - criado FROM fila_alertas WHERE estado = 'entregue'"
+        )
+    ]
+    (falhados,) = obter_fila()._ligacao.execute(
+        "SELECT COUNT(*) FROM fila_alertas WHERE estado != 'entregue'"
+    ).fetchone()
+    return {
+        "pedidos": len(latencias) + falhados,
+        "erros": falhados,
+        "duracao": round(duracao, 4),
+        "debito": round(len(latencias) / duracao, 1) if duracao else 0.0,
+        "p50": round(_percentil(latencias, 0.50), 6),
+        "p99": round(_percentil(latencias, 0.99), 6),
+        "memoria_mb": round(_memoria_mb(), 1),
+    }
+
+# ------------------------- COMPARAÇÃO COM A REFERÊNCIA --------------------
+
+def comparar(resultados: dict, base: dict, tolerancia: float) -> list:
+    """Devolve as regressões: p99 acima ou débito abaixo da referência por mais de `tolerancia`."""
+    regressoes = []
+    for nome, atual in resultados["cenarios"].items():
+        anterior = base.get("cenarios", {}).get(nome)
+        if not anterior:
+            continue
+        if anterior["p99"] and atual["p99"] > anterior["p99"] * (1 + tolerancia):
+            regressoes.append(f"{nome}: p99 {atual['p99'] * 1000:.1f} ms (referência {anterior['p99'] * 1000:.1f} ms)")
+        if anterior["debito"] and atual["debito"] < anterior["debito"] * (1 - tolerancia):
+            regressoes.append(f"{nome}: débito {atual['debito']}/s (referência {anterior['debito']}/s)")
+        if atual["erros"] > anterior["erros"]:
+            regressoes.append(f"{nome}: {atual['erros']} erros (referência {anterior['erros']})")
+    return regressoes
+
+def _imprimir(resultados: dict) -> None:
+    print(f"\n{'cenário':<16}{'pedidos':>9}{'erros':>7}{'débito/s':>11}{'p50 ms':>10}{'p99 ms':>10}{'mem MB':>9}")
+    for nome, r in resultados["cenarios"].items():
+        print(
+            f"{nome:<16}{r['pedidos']:>9}{r['erros']:>7}{r['debito']:>11}"
+            f"{r['p50'] * 1000:>10.2f}{r['p99'] * 1000:>10.2f}{r['memoria_mb']:>9}"
+        )
+    for nome, motivo in resultados.get("ignorados", {}).items():
+        print(f"{nome:<16}ignorado ({motivo})")
+    print(f"\nPedidos às APIs simuladas: {resultados['pedidos_apis']}")
+    print(f"Chamadas à API do Telegram: {resultados['chamadas_telegram']}")
+
+# ------------------------- EXECUÇÃO ---------------------------------------
+
+def _preparar_ambiente(args, porta_apis: int, pasta: str) -> None:
+    # Tem de ser feito antes de importar os módulos do bot (lêem a configuração ao importar)
+    base = f"http://127.0.0.1:{porta_apis}"
+    canais = ",".join(str(-1000000000000 - i) for i in range(args.canais))
+    os.environ.update({
+        "BOT_TOKEN": "123456:BENCHMARK",
+        "IPMA_API": f"{base}/ipma/",
+        "FOGOS_API": f"{base}/fogos",
+        "SISMOS_API": f"{base}/sismos",
+        "ALERTA_SISMOS_CHANNEL_IDS": canais,
+        "BASE_DADOS": os.path.join(pasta, "benchmark.db"),
+        "METRICAS_PORTA": "0",
+    })
+    # Sem os limites do Telegram: mede-se o bot, não o balde de tokens
+    for variavel, valor in (
+        ("ENTREGA_TAXA_GLOBAL", "100000"),
+        ("ENTREGA_TAXA_POR_CHAT", "100000"),
+        ("ENTREGA_RAJADA_POR_CHAT", "1000"),
+        ("ENTREGA_CONCORRENCIA", "100"),
+    ):
+        os.environ.setdefault(variavel, valor)
+    os.chdir(pasta)  # ficheiros de estado (marcas, fotografias) ficam na pasta temporária
+
+async def executar(args) -> dict:
+    apis = APIsSimuladas(args.atraso, args.erros, args.fogos, args.sismos)
+    runner_apis, porta_apis = await _servir(apis.aplicacao())
+
+    pasta = tempfile.mkdtemp(prefix="ra_benchmark_")
+    _preparar_ambiente(args, porta_apis, pasta)
+
+    from telegram import Bot
+    http_cliente = importlib.import_module("http_cliente")
+
+    telegram_falso = _criar_telegram_falso(args.atraso_telegram)
+    bot = Bot(os.environ["BOT_TOKEN"], request=telegram_falso)
+    await bot.initialize()
+    await http_cliente.iniciar_cliente_http()
+
+    cenarios = {
+        "previsao": lambda: cenario_previsao(bot, args),
+        "fogos": lambda: cenario_fogos(bot, args),
+        "fogos_paginas": lambda: cenario_fogos_paginas(bot, args),
+        "sismos": lambda: cenario_sismos(bot, args),
+        "sismos_filtros": lambda: cenario_sismos_filtros(bot, args),
+        "alertas": lambda: cenario_alertas(bot, args, apis),
+    }
+    resultados = {"parametros": vars(args).copy(), "cenarios": {}, "ignorados": {}}
+    try:
+        for nome in args.cenarios:
+            print(f"A correr o cenário {nome}...", file=sys.stderr)
+            ajudas = telegram_falso.respostas_ajuda
+            try:
+                resultados["cenarios"][nome] = await cenarios[nome]()
+            except ImportError as erro:
+                # Ex.: o mapeamento das localidades (locais.py) não está nesta instalação; os outros cenários correm
+                print(f"Cenário {nome} ignorado: {erro}", file=sys.stderr)
+                resultados["ignorados"][nome] = str(erro)
+                continue
+            if telegram_falso.respostas_ajuda > ajudas:
+                raise RuntimeError(
+                    f"O cenário {nome} recebeu {telegram_falso.respostas_ajuda - ajudas} respostas com o texto"
+                    " de ajuda: os argumentos simulados não são aceites pelo comando"
+                )
+    finally:
+        await http_cliente.fechar_cliente_http()
+        await bot.shutdown()
+        await runner_apis.cleanup()
+
+    resultados["pedidos_apis"] = apis.pedidos
+    resultados["chamadas_telegram"] = telegram_falso.chamadas
+    return resultados
+
+def _argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do bot (APIs e Telegram simulados).")
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=list(CENARIOS))
+    parser.add_argument("--utilizadores", type=int, default=5000, help="pedidos simulados por cenário")
+    parser.add_argument("--aquecimento", type=int, default=50, help="pedidos não medidos antes de cada cenário")
+    parser.add_argument("--concorrencia", type=int, default=500, help="utilizadores em simultâneo")
+    parser.add_argument("--eventos", type=int, default=200, help="sismos graves na rajada de alertas")
+    parser.add_argument("--canais", type=int, default=20, help="canais de alerta de sismos")
+    parser.add_argument("--atraso", type=float, default=0.05, help="latência média das APIs (s)")
+    parser.add_argument("--atraso-telegram", type=float, default=0.0, help="latência da API do Telegram (s)")
+    parser.add_argument("--erros", type=float, default=0.0, help="fração de respostas 500 das APIs")
+    parser.add_argument("--fogos", type=int, default=500, help="incêndios na resposta da API")
+    parser.add_argument("--sismos", type=int, default=2000, help="sismos disponíveis na API")
+    parser.add_argument("--semente", type=int, default=1234)
+    parser.add_argument("--base", help="ficheiro de referência para detetar regressões")
+    parser.add_argument("--guardar-base", nargs="?", const=ARQUIVO_BASE, help="grava os resultados como referência")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="margem antes de contar como regressão")
+    parser.add_argument("--saida", help="grava os resultados completos em JSON")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = _argumentos(argv)
+    random.seed(args.semente)
+    diretorio = os.getcwd()
+    # Os módulos do bot são importados da pasta deste ficheiro, mesmo depois do chdir
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    resultados = asyncio.run(executar(args))
+    os.chdir(diretorio)
+    _imprimir(resultados)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+    if args.guardar_base:
+        with open(args.guardar_base, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"Referência guardada em {args.guardar_base}")
+
+    if args.base:
+        if not os.path.exists(args.base):
+            print(f"\n❌ Referência {args.base} não encontrada: grava-a primeiro com --guardar-base nesta máquina.")
+            return 1
+        with open(args.base, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        regressoes = comparar(resultados, base, args.tolerancia)
+        if regressoes:
+            print("\n❌ Regressões em relação à referência:")
+            for regressao in regressoes:
+                print(f"   - {regressao}")
+            return 1
+        print("\n✅ Sem regressões em relação à referência.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+# Ficheiro: cache.py
+# Cache em memória com TTL, limite LRU e stale-while-revalidate
+
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import weakref
+import dataclasses
+from collections import OrderedDict
+
+from config import CONFIG
+from estado_partilhado import obter_estado
+from metricas import registar_coletor
+from resiliencia import UpstreamIndisponivel, aviso_dados_antigos
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+_caches = weakref.WeakSet()  # todas as caches criadas (para as métricas)
+
+# ------------------------- CACHE TTL --------------------------------------
+
+class CacheTTL:
+    """
+    Cache de respostas já processadas, indexada por chave.
+
+    - Dentro do `ttl` a entrada é devolvida diretamente.
+    - Entre `ttl` e `ttl + tempo_stale` a entrada (desatualizada) é devolvida
+      e é lançada uma única atualização em segundo plano.
+    - Depois disso a entrada é descarregada de novo, com o pedido à espera.
+      Se o carregamento falhar, a última entrada boa continua a ser servida
+      e `dados_de` indica de quando é (para avisar o utilizador).
+    - Com mais de `max_entradas` é removida a entrada usada há mais tempo.
+
+    Com `partilhada` (e ESTADO_BACKEND diferente de local) a cache tem um 2º
+    nível partilhado pelos processos: cada valor carregado é publicado lá e
+    os outros processos usam-no em vez de o descarregarem de novo. Cada
+    entrada em memória é comparada com a partilhada a cada ESTADO_VERIFICAR
+    segundos, para apanhar atualizações e invalidações de outros processos.
+    `serializar`/`desserializar` convertem os valores de e para JSON.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entradas: int,
+        tempo_stale: float = 0,
+        nome: str = "cache",
+        partilhada: str = None,
+        serializar=None,
+        desserializar=None,
+    ):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.tempo_stale = tempo_stale
+        self.nome = nome
+        self.partilhada = partilhada if obter_estado() is not None else None
+        self._serializar = serializar or (lambda valor: valor)
+        self._desserializar = desserializar or (lambda valor: valor)
+        self._verificadas = {}  # chave -> time.monotonic() da última comparação com a cache partilhada
+        self._escritas = set()  # publicações na cache partilhada em curso
+        self._entradas = OrderedDict()  # chave -> (valor, guardado_em)
+        self._em_curso = {}  # chave -> asyncio.Task do carregamento
+        self._degradadas = set()  # chaves cujo último carregamento falhou
+        self._expiradas = set()  # chaves a carregar de novo antes do fim do TTL
+        self._contadores = {"hits": 0, "stale": 0, "misses": 0, "degradados": 0, "partilhados": 0}
+        _caches.add(self)
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    async def obter(self, chave, carregar):
+        """
+        Devolve o valor da chave, usando `carregar` (corrotina sem argumentos)
+        quando é preciso descarregar. Valores `None` não são guardados.
+        """
+        entrada = self._entradas.get(chave)
+        if self.partilhada is not None and (
+            entrada is None
+            or chave in self._expiradas
+            or time.monotonic() - self._verificadas.get(chave, 0) >= CONFIG.estado_verificar
+        ):
+            entrada = await self._ler_partilhada(chave, entrada)
+        if entrada is not None and chave not in self._expiradas:
+            valor, guardado_em = entrada
+            idade = time.time() - guardado_em
+            if idade < self.ttl:
+                self._contadores["hits"] += 1
+                self._entradas.move_to_end(chave)
+                return valor
+            if idade < self.ttl + self.tempo_stale:
+                self._contadores["stale"] += 1
+                self._entradas.move_to_end(chave)
+                self._iniciar_carregamento(chave, carregar)
+                return valor
+
+        self._contadores["misses"] += 1
+        try:
+            valor = await asyncio.shield(self._iniciar_carregamento(chave, carregar))
+        except Exception:
+            if entrada is None:
+                raise
+            valor = None
+        if valor is None and entrada is not None:
+            # API em baixo: a última entrada boa é melhor do que nenhuma
+            self._contadores["degradados"] += 1
+            self._entradas.move_to_end(chave)
+            return entrada[0]
+        return valor
+
+    async def atualizar(self, chave, carregar):
+        """Força o carregamento da chave (reaproveita um carregamento já em curso)."""
+        return await asyncio.shield(self._iniciar_carregamento(chave, carregar))
+
+    def definir(self, chave, valor) -> None:
+        guardado_em = time.time()
+        self._guardar(chave, valor, guardado_em)
+        if self.partilhada is not None:
+            self._agendar_escrita(self._publicar(chave, valor, guardado_em))
+
+    def _guardar(self, chave, valor, guardado_em: float) -> None:
+        self._entradas[chave] = (valor, guardado_em)
+        self._expiradas.discard(chave)
+        self._degradadas.discard(chave)
+        self._entradas.move_to_end(chave)
+        while len(self._entradas) > self.max_entradas:
+            antiga, _ = self._entradas.popitem(last=False)
+            self._verificadas.pop(antiga, None)
+
+    def expirar(self, chave=None) -> None:
+        """
+        Força um novo carregamento no próximo pedido, mantendo a entrada caso
+        este falhe. Na cache partilhada a entrada é apagada, para que os
+        outros processos também a carreguem de novo.
+        """
+        chaves = list(self._entradas) if chave is None else [chave] if chave in self._entradas else []
+        self._expiradas.update(chaves)
+        if self.partilhada is not None:
+            for expirada in chaves:
+                self._agendar_escrita(self._apagar_partilhada(expirada))
+
+    def dados_de(self, chave=None) -> float | None:
+        """Hora (time.time()) da entrada servida se o último carregamento falhou, senão None."""
+        entrada = self._entradas.get(chave)
+        if entrada is None or chave not in self._degradadas:
+            return None
+        return entrada[1]
+
+    def invalidar(self, chave=None) -> None:
+        """Remove uma chave, ou todas se `chave` for None."""
+        if chave is None:
+            self._entradas.clear()
+            self._expiradas.clear()
+            self._verificadas.clear()
+        else:
+            self._entradas.pop(chave, None)
+            self._expiradas.discard(chave)
+            self._verificadas.pop(chave, None)
+
+    def estatisticas(self) -> dict:
+        return {**self._contadores, "entradas": len(self._entradas)}
+
+    # ------------------------- CARREGAMENTO -------------------------------
+
+    def _iniciar_carregamento(self, chave, carregar) -> asyncio.Task:
+        # Um único carregamento por chave, partilhado por todos os pedidos
+        tarefa = self._em_curso.get(chave)
+        if tarefa is None:
+            tarefa = asyncio.create_task(self._carregar(chave, carregar))
+            self._em_curso[chave] = tarefa
+            tarefa.add_done_callback(self._registar_erro)
+        return tarefa
+
+    async def _carregar(self, chave, carregar):
+        try:
+            valor = await carregar()
+        except Exception:
+            self._degradadas.add(chave)
+            raise
+        else:
+            if valor is None:
+                self._degradadas.add(chave)
+            else:
+                self.definir(chave, valor)
+            return valor
+        finally:
+            self._em_curso.pop(chave, None)
+
+    def _registar_erro(self, tarefa: asyncio.Task) -> None:
+        if tarefa.cancelled() or tarefa.exception() is None:
+            return
+        if isinstance(tarefa.exception(), UpstreamIndisponivel):
+            # Já registado pelo disjuntor quando abriu
+            logger.debug("%s não atualizada: %s", self.nome, tarefa.exception())
+        else:
+            logger.error("Erro ao atualizar %s: %s", self.nome, tarefa.exception())
+
+    # ------------------------- CACHE PARTILHADA ---------------------------
+
+    def _chave_partilhada(self, chave) -> str:
+        return f"cache:{self.partilhada}:{'' if chave is None else chave}"
+
+    async def _ler_partilhada(self, chave, entrada):
+        """
+        Compara a entrada em memória com a partilhada: adota a partilhada se
+        for mais recente e marca a local como expirada se a partilhada tiver
+        sido apagada (invalidada noutro processo). Devolve a entrada a usar.
+        """
+        self._verificadas[chave] = time.monotonic()
+        try:
+            texto = await obter_estado().obter(self._chave_partilhada(chave))
+            if texto is None:
+                if entrada is not None:
+                    self._expiradas.add(chave)
+                return entrada
+            dados = json.loads(texto)
+            if entrada is not None and dados["guardado_em"] <= entrada[1]:
+                return entrada
+            self._guardar(chave, self._desserializar(dados["valor"]), dados["guardado_em"])
+        except Exception as erro:
+            # A cache partilhada é só uma otimização: sem ela, cada processo carrega os seus dados
+            logger.warning("Erro ao ler %s da cache partilhada: %s", self.nome, erro)
+            return entrada
+        self._contadores["partilhados"] += 1
+        return self._entradas[chave]
+
+    async def _publicar(self, chave, valor, guardado_em: float) -> None:
+        texto = json.dumps({"guardado_em": guardado_em, "valor": self._serializar(valor)}, ensure_ascii=False)
+        await obter_estado().definir(self._chave_partilhada(chave), texto, self.ttl + self.tempo_stale)
+        self._verificadas[chave] = time.monotonic()
+
+    async def _apagar_partilhada(self, chave) -> None:
+        await obter_estado().apagar(self._chave_partilhada(chave))
+
+    def _agendar_escrita(self, escrita) -> None:
+        try:
+            tarefa = asyncio.get_running_loop().create_task(escrita)
+        except RuntimeError:
+            # Sem ciclo de eventos (ex.: scripts síncronos): só a cache em memória é atualizada
+            escrita.close()
+            return
+        self._escritas.add(tarefa)
+        tarefa.add_done_callback(self._fim_escrita)
+
+    def _fim_escrita(self, tarefa: asyncio.Task) -> None:
+        self._escritas.discard(tarefa)
+        if not tarefa.cancelled() and tarefa.exception() is not None:
+            logger.warning("Erro ao escrever %s na cache partilhada: %s", self.nome, tarefa.exception())
+
+def _coletor_caches() -> list:
+    caches = sorted(_caches, key=lambda cache: cache.nome)
+    pedidos, taxas, entradas = [], [], []
+    for cache in caches:
+        contadores = cache.estatisticas()
+        for resultado in ("hits", "stale", "misses", "degradados", "partilhados"):
+            pedidos.append(({"cache": cache.nome, "resultado": resultado}, contadores[resultado]))
+        total = contadores["hits"] + contadores["stale"] + contadores["misses"]
+        taxas.append(({"cache": cache.nome}, (contadores["hits"] + contadores["stale"]) / total if total else 0.0))
+        entradas.append(({"cache": cache.nome}, contadores["entradas"]))
+    return [
+        ("ra_cache_pedidos_total", "counter", "Pedidos às caches, por resultado", pedidos),
+        ("ra_cache_taxa_acertos", "gauge", "Fração dos pedidos servidos da cache (hits + stale)", taxas),
+        ("ra_cache_entradas", "gauge", "Entradas em cada cache", entradas),
+    ]
+
+registar_coletor(_coletor_caches)
+
+# ------------------------- MENSAGENS PRÉ-RENDERIZADAS ---------------------
+
+def _serializar(valor):
+    # Registos de modelos.py (dataclasses) entram no hash pelos seus campos
+    if dataclasses.is_dataclass(valor):
+        return dataclasses.astuple(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+def calcular_versao(dados) -> str:
+    """Hash dos dados: muda sempre que o conteúdo muda, independentemente da ordem das chaves."""
+    serializado = json.dumps(dados, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_serializar)
+    return hashlib.blake2b(serializado.encode("utf-8"), digest_size=16).hexdigest()
+
+class CacheMensagem:
+    """
+    Mensagem gerada a partir dos dados de uma API e partilhada por todos os
+    utilizadores. O texto só é gerado de novo quando a versão dos dados
+    muda; os jobs que já descarregaram os dados usam `publicar` para
+    atualizar a mensagem sem mais pedidos, ou `invalidar` para forçar um
+    novo carregamento no pedido seguinte.
+
+    `renderizar` pode devolver outro objeto que não texto (ex.: as páginas
+    do /fogos); nesse caso usa-se `obter_renderizado` e `aviso`, e com
+    `partilhada` são precisos `serializar`/`desserializar`.
+    """
+
+    def __init__(
+        self,
+        descarregar,
+        renderizar,
+        ttl: float,
+        tempo_stale: float = 0,
+        nome: str = "mensagem",
+        partilhada: str = None,
+        serializar=None,
+        desserializar=None,
+    ):
+        self._descarregar = descarregar
+        self._renderizar = renderizar
+        self._cache = CacheTTL(ttl, 1, tempo_stale, nome, partilhada, serializar, desserializar)
+        self.versao = None
+        self._texto = None
+        self._renderizacoes = 0
+
+    async def obter(self) -> str:
+        """Texto da mensagem, com um aviso se a API está em baixo e os dados são antigos."""
+        return await self.obter_renderizado() + self.aviso()
+
+    async def obter_renderizado(self):
+        """O que `renderizar` gerou para a versão atual dos dados (sem o aviso)."""
+        return await self._cache.obter(None, self._carregar)
+
+    def aviso(self) -> str:
+        """Aviso a juntar à mensagem se a API está em baixo e os dados são antigos."""
+        return aviso_dados_antigos(self._cache.dados_de(None))
+
+    def publicar(self, dados) -> str:
+        versao = calcular_versao(dados)
+        if versao != self.versao:
+            self._texto = self._renderizar(dados)
+            self.versao = versao
+            self._renderizacoes += 1
+        self._cache.definir(None, self._texto)
+        return self._texto
+
+    def invalidar(self) -> None:
+        self._cache.expirar()
+
+    def estatisticas(self) -> dict:
+        return {**self._cache.estatisticas(), "renderizacoes": self._renderizacoes, "versao": self.versao}
+
+    async def _carregar(self) -> str:
+        return self.publicar(await self._descarregar())
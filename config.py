@@ -1,44 +1,345 @@
 # Ficheiro: config.py
-# Carrega variáveis de ambiente e valida configurações
+# Configuração do bot: lida uma única vez do ambiente (.env), validada e imutável
 
 import os
+import re
+from dataclasses import dataclass
+from types import MappingProxyType
 from dotenv import load_dotenv
 
-# Carregar variáveis do .env
-load_dotenv()
-
-# Telegram
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-
-# Configurações dos sismos
-SEISMIC_LIMIT = int(os.getenv("SEISMIC_LIMIT", "10"))
-SEISMIC_START = os.getenv("SEISMIC_START", "2025-01-01")
-SEISMIC_END = os.getenv("SEISMIC_END")  # Pode ser None (opcional)
-SEISMIC_FORMAT = os.getenv("SEISMIC_FORMAT", "json")
-SEISMIC_MINMAG = float(os.getenv("SEISMIC_MINMAG", "2"))
-
-# Canal para alertas sismos e configurações de alerta
-ALERTA_SISMOS_CHANNEL_IDS = os.getenv("ALERTA_SISMOS_CHANNEL_IDS", "")
-#CANAIS_ALERTA_SISMOS = [canal.strip() for canal in ALERTA_SISMOS_CHANNEL_IDS.split(",") if canal.strip()]
-CANAIS_ALERTA_SISMOS = [int(canal.strip()) for canal in ALERTA_SISMOS_CHANNEL_IDS.split(",") if canal.strip()]
-
-MIN_MAGNITUDE_ALERTA = float(os.getenv("MIN_MAGNITUDE_ALERTA", "6"))
-INTERVALO_VERIFICACAO = int(os.getenv("INTERVALO_VERIFICACAO", "1800"))  # 30 minutos
-
-# Endpoints das APIs (se quiseres usar diretamente no código)
-IPMA_API = os.getenv("IPMA_API")
-FOGOS_API = os.getenv("FOGOS_API")
-SISMOS_API = os.getenv("SISMOS_API")
-    
-    
-# Verificações de segurança
-if not BOT_TOKEN:
-    raise EnvironmentError("BOT_TOKEN não definido no ficheiro .env")
-if not ALERTA_SISMOS_CHANNEL_IDS:
-    raise EnvironmentError("ALERTA_SISMOS_CHANNEL_IDS não definido no ficheiro .env")
-if not IPMA_API:
-    raise EnvironmentError("IPMA_API não definido no ficheiro .env")
-if not FOGOS_API:
-    raise EnvironmentError("FOGOS_API não definido no ficheiro .env")
-if not SISMOS_API:
-    raise EnvironmentError("SISMOS_API não definido no ficheiro .env")
\ No newline at end of file
+# Sufixos das variáveis por região (ex.: MIN_MAGNITUDE_PORTUGAL_ACORES)
+REGIOES_PORTUGAL = ("continente", "acores", "madeira")
+
+# ------------------------- LEITURA DAS VARIÁVEIS --------------------------
+
+class _Leitor:
+    """Lê as variáveis de um ambiente e junta os erros, para os mostrar todos de uma vez."""
+
+    def __init__(self, ambiente):
+        self.ambiente = ambiente
+        self.erros = []
+
+    def texto(self, nome: str, omissao: str = None) -> str | None:
+        valor = self.ambiente.get(nome)
+        return omissao if valor is None or valor.strip() == "" else valor.strip()
+
+    def _converter(self, nome: str, omissao, tipo):
+        valor = self.texto(nome)
+        if valor is None:
+            return omissao
+        try:
+            return tipo(valor)
+        except ValueError:
+            self.erros.append(f"{nome} inválido: {valor!r}")
+            return omissao
+
+    def inteiro(self, nome: str, omissao: int) -> int:
+        return self._converter(nome, omissao, int)
+
+    def decimal(self, nome: str, omissao: float) -> float:
+        return self._converter(nome, omissao, float)
+
+    def booleano(self, nome: str, omissao: bool = False) -> bool:
+        valor = self.texto(nome)
+        return omissao if valor is None else valor.lower() in ("1", "true", "sim")
+
+    def lista(self, nome: str, omissao: str = "") -> tuple:
+        return tuple(parte.strip() for parte in self.texto(nome, omissao).split(",") if parte.strip())
+
+    def canais(self, nome: str) -> tuple:
+        try:
+            return tuple(int(canal) for canal in self.lista(nome))
+        except ValueError:
+            self.erros.append(f"{nome} deve ser uma lista de IDs numéricos separados por vírgulas")
+            return ()
+
+# ------------------------- CONFIGURAÇÃO -----------------------------------
+
+@dataclass(frozen=True, slots=True)
+class Configuracao:
+    # Telegram
+    bot_token: str
+
+    # Sismos (/sismos)
+    seismic_limit: int
+    seismic_start: str
+    seismic_end: str | None
+    seismic_format: str
+    seismic_minmag: float
+    sismos_cache_ttl: float  # em segundos
+    sismos_cache_stale: float  # em segundos
+
+    # Alertas de sismos graves
+    canais_alerta_sismos: tuple
+    min_magnitude_alerta: float
+    intervalo_verificacao: int  # em segundos
+    sismos_modo: str  # "polling" (verificação periódica) ou "stream" (WebSocket)
+    sismos_pagina: int
+    sismos_max_paginas: int
+    sismos_janela_inicial: float  # em horas, 1ª execução
+    sismos_margem_revisao: float  # em horas
+    sismos_ws_url: str
+    sismos_ws_heartbeat: float  # em segundos
+    sismos_ws_espera_max: float  # em segundos
+
+    # Alertas de sismos em Portugal (continente, Açores e Madeira), com valores por região
+    canais_alerta_portugal: tuple
+    min_magnitude_portugal: float
+    canais_alerta_portugal_regiao: MappingProxyType  # região -> canais (só as definidas)
+    min_magnitude_portugal_regiao: MappingProxyType  # região -> magnitude (só as definidas)
+
+    # Alertas de incêndios (apenas as alterações: novos, mudança de estado, reforço de meios)
+    canais_alerta_fogos: tuple
+    intervalo_fogos: int  # em segundos
+    fogos_salto_operacionais: int
+    fogos_salto_veiculos: int
+    fogos_salto_aereos: int
+    fogos_cache_ttl: float  # em segundos
+    fogos_cache_stale: float  # em segundos
+    fogos_por_pagina: int
+
+    # Endpoints das APIs
+    ipma_api: str
+    fogos_api: str
+    sismos_api: str
+
+    # Previsões do IPMA em cache
+    ipma_cache_ttl: int  # em segundos
+    ipma_cache_stale: int  # em segundos
+    ipma_cache_max: int  # nº de locais
+
+    # Cliente HTTP partilhado (pool de ligações)
+    http_timeout_total: float  # em segundos
+    http_timeout_ligacao: float  # em segundos
+    http_timeout_leitura: float  # em segundos, sem receber dados
+    http_limite_ligacoes: int
+    http_limite_por_host: int
+    http_dns_ttl: int  # em segundos
+    http_keepalive: float  # em segundos
+
+    # Disjuntores das APIs: falhas seguidas até deixar de fazer pedidos e espera até voltar a testar
+    disjuntor_falhas: int
+    disjuntor_espera: float  # em segundos
+    disjuntor_espera_max: float  # em segundos
+
+    # Métricas (Prometheus) num servidor HTTP local; metricas_porta=0 desliga-o
+    metricas_host: str
+    metricas_porta: int
+
+    # Modo webhook (servidor aiohttp em vez de long-polling)
+    webhook_url: str | None  # URL público (ex.: https://bot.exemplo.pt); sem ele o bot usa polling
+    webhook_caminho: str
+    webhook_host: str
+    webhook_porta: int  # o processo N usa webhook_porta + N
+    webhook_segredo: str | None
+    webhook_max_em_curso: int  # updates a processar em simultâneo
+    webhook_espera: float  # em segundos, à espera de vaga antes de recusar
+    webhook_max_ligacoes: int  # ligações simultâneas do Telegram
+    webhook_trabalhadores: int
+    trabalhador: int  # índice deste processo (definido por webhook.py)
+
+    # Estado partilhado entre processos (caches e liderança dos jobs de alertas)
+    estado_backend: str  # local | sqlite | redis
+    estado_redis_url: str
+    estado_prefixo: str
+    estado_verificar: float  # em segundos, entre leituras da cache partilhada
+    lider_duracao: float  # em segundos, validade da liderança sem renovação
+    lider_renovar: float  # em segundos
+
+    # Base de dados local (SQLite) e registo de alertas já enviados
+    base_dados: str
+    dedup_max_dias: float
+
+    # Histórico local de sismos (respostas do /sismos com filtros)
+    historico_min_magnitude: float
+    historico_intervalo: int  # em segundos
+    historico_max_dias: float
+
+    # Subscrições dos utilizadores
+    subscricoes_max_por_chat: int
+    subscricoes_raio_max: float  # em km
+
+    # Envio de alertas (limites da API do Telegram)
+    entrega_concorrencia: int
+    entrega_taxa_global: float  # mensagens/segundo
+    entrega_taxa_por_chat: float  # mensagens/segundo (20/min)
+    entrega_rajada_por_chat: int
+    entrega_tentativas: int
+
+    # Fila persistente de alertas por enviar
+    fila_intervalo: float  # em segundos
+    fila_lote: int
+    fila_max_tentativas: int
+
+    # Pré-carregamento das previsões (horas de publicação do IPMA, hora de Lisboa)
+    prefetch_horas: tuple
+    prefetch_todas_localidades: bool
+    prefetch_concorrencia: int
+    prefetch_jitter: float  # em segundos
+
+    # Resumo das previsões das localidades guardadas (/resumo e envio diário)
+    resumo_max_locais: int
+    resumo_hora: str  # hora de Lisboa
+    resumo_concorrencia: int
+    resumo_cache_ttl: float  # em segundos
+    resumo_cache_max: int
+
+def _ler(leitor: _Leitor) -> Configuracao:
+    canais_alerta_sismos = leitor.canais("ALERTA_SISMOS_CHANNEL_IDS")
+    webhook_trabalhadores = leitor.inteiro("WEBHOOK_TRABALHADORES", 1)
+
+    canais_regiao, magnitude_regiao = {}, {}
+    for regiao in REGIOES_PORTUGAL:
+        canais = leitor.canais(f"ALERTA_PORTUGAL_CHANNEL_IDS_{regiao.upper()}")
+        if canais:
+            canais_regiao[regiao] = canais
+        magnitude = leitor.decimal(f"MIN_MAGNITUDE_PORTUGAL_{regiao.upper()}", None)
+        if magnitude is not None:
+            magnitude_regiao[regiao] = magnitude
+
+    return Configuracao(
+        bot_token=leitor.texto("BOT_TOKEN"),
+        seismic_limit=leitor.inteiro("SEISMIC_LIMIT", 10),
+        seismic_start=leitor.texto("SEISMIC_START", "2025-01-01"),
+        seismic_end=leitor.texto("SEISMIC_END"),
+        seismic_format=leitor.texto("SEISMIC_FORMAT", "json"),
+        seismic_minmag=leitor.decimal("SEISMIC_MINMAG", 2.0),
+        sismos_cache_ttl=leitor.decimal("SISMOS_CACHE_TTL", 120.0),
+        sismos_cache_stale=leitor.decimal("SISMOS_CACHE_STALE", 600.0),
+        canais_alerta_sismos=canais_alerta_sismos,
+        min_magnitude_alerta=leitor.decimal("MIN_MAGNITUDE_ALERTA", 6.0),
+        intervalo_verificacao=leitor.inteiro("INTERVALO_VERIFICACAO", 1800),
+        sismos_modo=leitor.texto("SISMOS_MODO", "polling").lower(),
+        sismos_pagina=leitor.inteiro("SISMOS_PAGINA", 100),
+        sismos_max_paginas=leitor.inteiro("SISMOS_MAX_PAGINAS", 20),
+        sismos_janela_inicial=leitor.decimal("SISMOS_JANELA_INICIAL", 24.0),
+        sismos_margem_revisao=leitor.decimal("SISMOS_MARGEM_REVISAO", 6.0),
+        sismos_ws_url=leitor.texto("SISMOS_WS_URL", "wss://www.seismicportal.eu/standing_order/websocket"),
+        sismos_ws_heartbeat=leitor.decimal("SISMOS_WS_HEARTBEAT", 30.0),
+        sismos_ws_espera_max=leitor.decimal("SISMOS_WS_ESPERA_MAX", 300.0),
+        canais_alerta_portugal=leitor.canais("ALERTA_PORTUGAL_CHANNEL_IDS") or canais_alerta_sismos,
+        min_magnitude_portugal=leitor.decimal("MIN_MAGNITUDE_PORTUGAL", 0.0),
+        canais_alerta_portugal_regiao=MappingProxyType(canais_regiao),
+        min_magnitude_portugal_regiao=MappingProxyType(magnitude_regiao),
+        canais_alerta_fogos=leitor.canais("ALERTA_FOGOS_CHANNEL_IDS"),
+        intervalo_fogos=leitor.inteiro("INTERVALO_FOGOS", 300),
+        fogos_salto_operacionais=leitor.inteiro("FOGOS_SALTO_OPERACIONAIS", 50),
+        fogos_salto_veiculos=leitor.inteiro("FOGOS_SALTO_VEICULOS", 15),
+        fogos_salto_aereos=leitor.inteiro("FOGOS_SALTO_AEREOS", 2),
+        fogos_cache_ttl=leitor.decimal("FOGOS_CACHE_TTL", 120.0),
+        fogos_cache_stale=leitor.decimal("FOGOS_CACHE_STALE", 600.0),
+        fogos_por_pagina=leitor.inteiro("FOGOS_POR_PAGINA", 10),
+        ipma_api=leitor.texto("IPMA_API"),
+        fogos_api=leitor.texto("FOGOS_API"),
+        sismos_api=leitor.texto("SISMOS_API"),
+        ipma_cache_ttl=leitor.inteiro("IPMA_CACHE_TTL", 1800),
+        ipma_cache_stale=leitor.inteiro("IPMA_CACHE_STALE", 21600),
+        ipma_cache_max=leitor.inteiro("IPMA_CACHE_MAX", 1000),
+        http_timeout_total=leitor.decimal("HTTP_TIMEOUT_TOTAL", 20.0),
+        http_timeout_ligacao=leitor.decimal("HTTP_TIMEOUT_LIGACAO", 5.0),
+        http_timeout_leitura=leitor.decimal("HTTP_TIMEOUT_LEITURA", 10.0),
+        http_limite_ligacoes=leitor.inteiro("HTTP_LIMITE_LIGACOES", 100),
+        http_limite_por_host=leitor.inteiro("HTTP_LIMITE_POR_HOST", 20),
+        http_dns_ttl=leitor.inteiro("HTTP_DNS_TTL", 300),
+        http_keepalive=leitor.decimal("HTTP_KEEPALIVE", 30.0),
+        disjuntor_falhas=leitor.inteiro("DISJUNTOR_FALHAS", 3),
+        disjuntor_espera=leitor.decimal("DISJUNTOR_ESPERA", 30.0),
+        disjuntor_espera_max=leitor.decimal("DISJUNTOR_ESPERA_MAX", 600.0),
+        metricas_host=leitor.texto("METRICAS_HOST", "127.0.0.1"),
+        metricas_porta=leitor.inteiro("METRICAS_PORTA", 9100),
+        webhook_url=leitor.texto("WEBHOOK_URL"),
+        webhook_caminho=leitor.texto("WEBHOOK_CAMINHO", "/telegram"),
+        webhook_host=leitor.texto("WEBHOOK_HOST", "127.0.0.1"),
+        webhook_porta=leitor.inteiro("WEBHOOK_PORTA", 8080),
+        webhook_segredo=leitor.texto("WEBHOOK_SEGREDO"),
+        webhook_max_em_curso=leitor.inteiro("WEBHOOK_MAX_EM_CURSO", 256),
+        webhook_espera=leitor.decimal("WEBHOOK_ESPERA", 5.0),
+        webhook_max_ligacoes=leitor.inteiro("WEBHOOK_MAX_LIGACOES", 40),
+        webhook_trabalhadores=webhook_trabalhadores,
+        trabalhador=leitor.inteiro("TRABALHADOR", 0),
+        estado_backend=leitor.texto("ESTADO_BACKEND", "sqlite" if webhook_trabalhadores > 1 else "local").lower(),
+        estado_redis_url=leitor.texto("ESTADO_REDIS_URL", "redis://127.0.0.1:6379/0"),
+        estado_prefixo=leitor.texto("ESTADO_PREFIXO", "ra_alertas:"),
+        estado_verificar=leitor.decimal("ESTADO_VERIFICAR", 15.0),
+        lider_duracao=leitor.decimal("LIDER_DURACAO", 30.0),
+        lider_renovar=leitor.decimal("LIDER_RENOVAR", 10.0),
+        base_dados=leitor.texto("BASE_DADOS", "ra_alertas.db"),
+        dedup_max_dias=leitor.decimal("DEDUP_MAX_DIAS", 30.0),
+        historico_min_magnitude=leitor.decimal("HISTORICO_MIN_MAGNITUDE", 2.0),
+        historico_intervalo=leitor.inteiro("HISTORICO_INTERVALO", 600),
+        historico_max_dias=leitor.decimal("HISTORICO_MAX_DIAS", 30.0),
+        subscricoes_max_por_chat=leitor.inteiro("SUBSCRICOES_MAX_POR_CHAT", 20),
+        subscricoes_raio_max=leitor.decimal("SUBSCRICOES_RAIO_MAX", 1000.0),
+        entrega_concorrencia=leitor.inteiro("ENTREGA_CONCORRENCIA", 20),
+        entrega_taxa_global=leitor.decimal("ENTREGA_TAXA_GLOBAL", 25.0),
+        entrega_taxa_por_chat=leitor.decimal("ENTREGA_TAXA_POR_CHAT", 0.33),
+        entrega_rajada_por_chat=leitor.inteiro("ENTREGA_RAJADA_POR_CHAT", 3),
+        entrega_tentativas=leitor.inteiro("ENTREGA_TENTATIVAS", 5),
+        fila_intervalo=leitor.decimal("FILA_INTERVALO", 15.0),
+        fila_lote=leitor.inteiro("FILA_LOTE", 100),
+        fila_max_tentativas=leitor.inteiro("FILA_MAX_TENTATIVAS", 20),
+        prefetch_horas=leitor.lista("PREFETCH_HORAS", "00:15,06:15,10:15,18:15"),
+        prefetch_todas_localidades=leitor.booleano("PREFETCH_TODAS_LOCALIDADES"),
+        prefetch_concorrencia=leitor.inteiro("PREFETCH_CONCORRENCIA", 4),
+        prefetch_jitter=leitor.decimal("PREFETCH_JITTER", 2.0),
+        resumo_max_locais=leitor.inteiro("RESUMO_MAX_LOCAIS", 10),
+        resumo_hora=leitor.texto("RESUMO_HORA", "07:30"),
+        resumo_concorrencia=leitor.inteiro("RESUMO_CONCORRENCIA", 4),
+        resumo_cache_ttl=leitor.decimal("RESUMO_CACHE_TTL", 300.0),
+        resumo_cache_max=leitor.inteiro("RESUMO_CACHE_MAX", 1000),
+    )
+
+# ------------------------- VALIDAÇÃO --------------------------------------
+
+def _validar(config: Configuracao) -> list:
+    erros = []
+    for nome, valor in (
+        ("BOT_TOKEN", config.bot_token),
+        ("IPMA_API", config.ipma_api),
+        ("FOGOS_API", config.fogos_api),
+        ("SISMOS_API", config.sismos_api),
+    ):
+        if not valor:
+            erros.append(f"{nome} não definido no ficheiro .env")
+    if not config.canais_alerta_sismos:
+        erros.append("ALERTA_SISMOS_CHANNEL_IDS não definido no ficheiro .env")
+    if config.sismos_modo not in ("polling", "stream"):
+        erros.append("SISMOS_MODO deve ser 'polling' ou 'stream'")
+    for hora in config.prefetch_horas:
+        if not re.fullmatch(r"([01]?\d|2[0-3]):[0-5]\d", hora):
+            erros.append(f"PREFETCH_HORAS inválido: {hora!r} (formato HH:MM)")
+    if not re.fullmatch(r"([01]?\d|2[0-3]):[0-5]\d", config.resumo_hora):
+        erros.append(f"RESUMO_HORA inválido: {config.resumo_hora!r} (formato HH:MM)")
+    if config.webhook_url and not config.webhook_segredo:
+        erros.append("WEBHOOK_SEGREDO é obrigatório quando WEBHOOK_URL está definido")
+    if config.webhook_segredo and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", config.webhook_segredo):
+        erros.append("WEBHOOK_SEGREDO só pode ter letras, números, '_' e '-' (até 256)")
+    if config.estado_backend not in ("local", "sqlite", "redis"):
+        erros.append("ESTADO_BACKEND deve ser 'local', 'sqlite' ou 'redis'")
+    if config.estado_backend == "local" and config.webhook_trabalhadores > 1:
+        erros.append("Com vários WEBHOOK_TRABALHADORES, ESTADO_BACKEND tem de ser 'sqlite' ou 'redis'")
+    if not 0 < config.subscricoes_raio_max <= 2000:
+        erros.append("SUBSCRICOES_RAIO_MAX tem de estar entre 0 e 2000 km")
+    if config.lider_renovar >= config.lider_duracao:
+        erros.append("LIDER_RENOVAR tem de ser menor do que LIDER_DURACAO")
+    return erros
+
+def carregar_configuracao(ambiente=None) -> Configuracao:
+    """
+    Lê e valida a configuração a partir de `ambiente` (por omissão, as
+    variáveis do processo mais as do .env). Levanta EnvironmentError com
+    todos os problemas encontrados.
+    """
+    if ambiente is None:
+        load_dotenv()
+        ambiente = os.environ
+
+    leitor = _Leitor(ambiente)
+    config = _ler(leitor)
+    erros = leitor.erros + _validar(config)
+    if erros:
+        raise EnvironmentError("Configuração inválida:\n- " + "\n- ".join(erros))
+    return config
+
+# Configuração partilhada por todos os módulos (lida uma única vez, no arranque)
+CONFIG = carregar_configuracao()
@@ -0,0 +1,117 @@
+# Ficheiro: dedup.py
+# Registo persistente dos eventos já notificados (evita alertas duplicados)
+
+import json
+import time
+import logging
+
+from base_dados import ligar
+from config import CONFIG
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- REGISTO DE NOTIFICADOS -------------------------
+
+MARGEM_SINCRONIZACAO = 60  # em segundos
+
+class RegistoNotificados:
+    """
+    Conjunto de IDs já notificados, mantido em memória e guardado em SQLite
+    (modo WAL). Cada novo ID é uma única inserção atómica: um crash nunca
+    apaga o histórico. IDs mais antigos do que `max_dias` são removidos.
+    As consultas são só em memória; os IDs registados por outros processos
+    chegam com `sincronizar()` (uma leitura pelo índice por data).
+    """
+
+    def __init__(self, nome: str, caminho: str = CONFIG.base_dados, max_dias: float = CONFIG.dedup_max_dias):
+        self.nome = nome
+        self.max_dias = max_dias
+        self._ligacao = ligar(caminho)
+        self._ligacao.execute(
+            "CREATE TABLE IF NOT EXISTS notificados ("
+            " registo TEXT NOT NULL, id TEXT NOT NULL, visto REAL NOT NULL,"
+            " PRIMARY KEY (registo, id))"
+        )
+        self._ligacao.execute("CREATE INDEX IF NOT EXISTS idx_notificados_visto ON notificados (registo, visto)")
+
+        self._ids = set()
+        self._visto = 0.0  # data mais recente já lida da base de dados
+        self.sincronizar()
+        self.expirar()
+
+    def sincronizar(self) -> None:
+        """Acrescenta os IDs registados por outros processos (ex.: o líder anterior dos alertas)."""
+        # Margem para as escritas de outros processos que esperaram pelo lock do SQLite
+        linhas = self._ligacao.execute(
+            "SELECT id, visto FROM notificados WHERE registo = ? AND visto >= ?",
+            (self.nome, self._visto - MARGEM_SINCRONIZACAO),
+        )
+        for evento_id, visto in linhas:
+            self._ids.add(evento_id)
+            self._visto = max(self._visto, visto)
+
+    def __contains__(self, evento_id) -> bool:
+        return evento_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def adicionar(self, evento_id: str) -> None:
+        if evento_id in self._ids:
+            return
+        self._ligacao.execute(
+            "INSERT OR IGNORE INTO notificados (registo, id, visto) VALUES (?, ?, ?)",
+            (self.nome, evento_id, time.time()),
+        )
+        self._ids.add(evento_id)
+
+    def expirar(self) -> None:
+        """Remove os IDs mais antigos do que `max_dias` (usa o índice por data)."""
+        limite = time.time() - self.max_dias * 86400
+        linhas = self._ligacao.execute(
+            "SELECT id FROM notificados WHERE registo = ? AND visto < ?", (self.nome, limite)
+        )
+        antigos = [evento_id for (evento_id,) in linhas]
+        if antigos:
+            self._ligacao.execute("DELETE FROM notificados WHERE registo = ? AND visto < ?", (self.nome, limite))
+            self._ids.difference_update(antigos)
+
+    def importar_json(self, arquivo: str) -> None:
+        """Importa uma lista de IDs de um ficheiro JSON antigo (ex.: sismos_notificados.json)."""
+        try:
+            with open(arquivo, "r", encoding="utf-8") as f:
+                ids = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        agora = time.time()
+        with self._ligacao:
+            self._ligacao.execute("BEGIN")
+            self._ligacao.executemany(
+                "INSERT OR IGNORE INTO notificados (registo, id, visto) VALUES (?, ?, ?)",
+                ((self.nome, str(evento_id), agora) for evento_id in ids),
+            )
+        self._ids.update(str(evento_id) for evento_id in ids)
+        logger.info("Importados %d IDs de %s para o registo '%s'", len(ids), arquivo, self.nome)
+
+# ------------------------- REGISTOS PARTILHADOS ---------------------------
+
+_registos = {}
+
+def obter_registo(nome: str, importar_de: str = None) -> RegistoNotificados:
+    """
+    Devolve o registo `nome` (um por processo). Na primeira abertura de um
+    registo vazio, importa os IDs do ficheiro JSON `importar_de`, se existir.
+    """
+    registo = _registos.get(nome)
+    if registo is None:
+        registo = RegistoNotificados(nome)
+        if importar_de and not len(registo):
+            registo.importar_json(importar_de)
+        _registos[nome] = registo
+    elif CONFIG.estado_backend != "local":
+        # Vários processos: o registo pode ter sido alterado noutro
+        registo.sincronizar()
+    return registo
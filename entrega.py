@@ -0,0 +1,152 @@
+# Ficheiro: entrega.py
+# Envio de mensagens para vários chats, em paralelo e dentro dos limites do Telegram
+
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from telegram.error import RetryAfter, TimedOut, NetworkError, Forbidden, BadRequest
+
+from config import CONFIG
+from metricas import ENVIOS, ENVIOS_REPETICOES
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- BALDE DE TOKENS --------------------------------
+
+class BaldeTokens:
+    """Limita a taxa de envio: `taxa` tokens por segundo, até `capacidade` de rajada."""
+
+    def __init__(self, taxa: float, capacidade: float):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._tokens = capacidade
+        self._ultimo = time.monotonic()
+
+    def _repor(self) -> None:
+        agora = time.monotonic()
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    async def consumir(self) -> None:
+        while True:
+            self._repor()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.taxa)
+
+    def bloquear(self, segundos: float) -> None:
+        """Esvazia o balde para que o próximo envio espere pelo menos `segundos`."""
+        self._repor()
+        self._tokens = min(self._tokens, 0) - segundos * self.taxa
+
+# ------------------------- MOTOR DE ENTREGA -------------------------------
+
+@dataclass(slots=True)
+class ResultadoEntrega:
+    chat_id: int
+    sucesso: bool
+    tentativas: int
+    latencia: float  # em segundos, desde o pedido até ao envio (ou à desistência)
+    erro: str | None = None
+    permanente: bool = False  # erro que não se resolve repetindo (ex.: bot removido do canal)
+
+class MotorEntrega:
+    """
+    Envia mensagens com um número limitado de envios em paralelo, um balde
+    de tokens global e outro por chat. Respeita o `RetryAfter` do Telegram e
+    repete os envios que falham por erros temporários.
+    """
+
+    def __init__(
+        self,
+        concorrencia: int = CONFIG.entrega_concorrencia,
+        taxa_global: float = CONFIG.entrega_taxa_global,
+        taxa_por_chat: float = CONFIG.entrega_taxa_por_chat,
+        rajada_por_chat: int = CONFIG.entrega_rajada_por_chat,
+        tentativas: int = CONFIG.entrega_tentativas,
+    ):
+        self.tentativas = tentativas
+        self.taxa_por_chat = taxa_por_chat
+        self.rajada_por_chat = rajada_por_chat
+        self._semaforo = asyncio.Semaphore(concorrencia)
+        self._balde_global = BaldeTokens(taxa_global, taxa_global)
+        self._baldes_chat = {}
+        self._latencias = deque(maxlen=1000)
+        self._contadores = {"entregues": 0, "falhadas": 0, "repeticoes": 0, "retry_after": 0}
+
+    def _balde_chat(self, chat_id) -> BaldeTokens:
+        balde = self._baldes_chat.get(chat_id)
+        if balde is None:
+            balde = BaldeTokens(self.taxa_por_chat, self.rajada_por_chat)
+            self._baldes_chat[chat_id] = balde
+        return balde
+
+    async def enviar(self, bot, chat_id, texto: str, **opcoes) -> ResultadoEntrega:
+        """Envia uma mensagem para um chat; nunca levanta exceções."""
+        inicio = time.monotonic()
+        balde_chat = self._balde_chat(chat_id)
+        erro = None
+        permanente = False
+        tentativa = 0
+
+        while tentativa < self.tentativas:
+            tentativa += 1
+            await balde_chat.consumir()
+            await self._balde_global.consumir()
+            try:
+                async with self._semaforo:
+                    await bot.send_message(chat_id=chat_id, text=texto, **opcoes)
+                return self._registar(ResultadoEntrega(chat_id, True, tentativa, time.monotonic() - inicio))
+            except RetryAfter as e:
+                # Limite do Telegram: o próximo envio para este chat espera o tempo indicado
+                self._contadores["retry_after"] += 1
+                ENVIOS_REPETICOES.inc(motivo="retry_after")
+                balde_chat.bloquear(e.retry_after)
+                erro = str(e)
+            except (Forbidden, BadRequest) as e:
+                # Erros permanentes (bot removido do canal, chat inválido, ...)
+                erro = str(e)
+                permanente = True
+                break
+            except (TimedOut, NetworkError) as e:
+                erro = str(e)
+                self._contadores["repeticoes"] += 1
+                ENVIOS_REPETICOES.inc(motivo="rede")
+                await asyncio.sleep(min(2 ** (tentativa - 1), 30))
+            except Exception as e:
+                erro = str(e)
+                break
+
+        logger.error("Falha ao enviar para o chat %s após %d tentativas: %s", chat_id, tentativa, erro)
+        return self._registar(ResultadoEntrega(chat_id, False, tentativa, time.monotonic() - inicio, erro, permanente))
+
+    async def enviar_para_varios(self, bot, chat_ids, texto: str, **opcoes) -> list:
+        """Envia a mesma mensagem para vários chats em paralelo."""
+        return await asyncio.gather(*(self.enviar(bot, chat_id, texto, **opcoes) for chat_id in chat_ids))
+
+    def _registar(self, resultado: ResultadoEntrega) -> ResultadoEntrega:
+        self._contadores["entregues" if resultado.sucesso else "falhadas"] += 1
+        if resultado.sucesso:
+            ENVIOS.inc(resultado="entregue")
+        else:
+            ENVIOS.inc(resultado="falha_permanente" if resultado.permanente else "falha")
+        self._latencias.append(resultado.latencia)
+        return resultado
+
+    def estatisticas(self) -> dict:
+        """Contadores e latências (p50/p99, em segundos) das últimas entregas."""
+        latencias = sorted(self._latencias)
+        if latencias:
+            p50 = latencias[len(latencias) // 2]
+            p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        else:
+            p50 = p99 = None
+        return {**self._contadores, "latencia_p50": p50, "latencia_p99": p99}
+
+# Motor partilhado por todos os alertas
+motor_entrega = MotorEntrega()
@@ -0,0 +1,280 @@
+# Ficheiro: estado_partilhado.py
+# Estado partilhado entre processos: cache de 2º nível e liderança dos jobs de alertas
+
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from base_dados import ligar
+from config import CONFIG
+from metricas import registar_coletor
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- ARMAZENAMENTO EM SQLITE ------------------------
+
+class EstadoSQLite:
+    """
+    Chaves com validade e liderança numa tabela SQLite (modo WAL), para
+    vários processos na mesma máquina. As escritas concorrentes esperam pelo
+    lock do SQLite (`busy_timeout`) em vez de falharem; as consultas correm
+    numa thread própria, para que essa espera não pare o event loop.
+    """
+
+    def __init__(self, caminho: str = CONFIG.base_dados):
+        # Uma só thread usa a ligação, pela ordem dos pedidos
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="estado_sqlite")
+        self._ligacao = ligar(caminho, outra_thread=True)
+        self._ligacao.execute(
+            "CREATE TABLE IF NOT EXISTS estado_partilhado ("
+            " chave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL)"
+        )
+        self._ligacao.execute(
+            "CREATE TABLE IF NOT EXISTS liderancas ("
+            " nome TEXT PRIMARY KEY, dono TEXT NOT NULL, expira REAL NOT NULL)"
+        )
+
+    async def _executar(self, funcao, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, funcao, *args)
+
+    def _obter(self, chave: str) -> str | None:
+        linha = self._ligacao.execute(
+            "SELECT valor FROM estado_partilhado WHERE chave = ? AND expira > ?", (chave, time.time())
+        ).fetchone()
+        return linha[0] if linha else None
+
+    def _definir(self, chave: str, valor: str, ttl: float) -> None:
+        agora = time.time()
+        self._ligacao.execute(
+            "INSERT OR REPLACE INTO estado_partilhado (chave, valor, expira) VALUES (?, ?, ?)",
+            (chave, valor, agora + ttl),
+        )
+        # Sem isto a tabela só cresceria: cada escrita leva as entradas já expiradas
+        self._ligacao.execute("DELETE FROM estado_partilhado WHERE expira <= ?", (agora,))
+
+    def _apagar(self, chave: str) -> None:
+        self._ligacao.execute("DELETE FROM estado_partilhado WHERE chave = ?", (chave,))
+
+    def _adquirir(self, nome: str, dono: str, duracao: float) -> bool:
+        agora = time.time()
+        self._ligacao.execute(
+            "INSERT INTO liderancas (nome, dono, expira) VALUES (?, ?, ?)"
+            " ON CONFLICT (nome) DO UPDATE SET dono = excluded.dono, expira = excluded.expira"
+            " WHERE liderancas.dono = excluded.dono OR liderancas.expira <= ?",
+            (nome, dono, agora + duracao, agora),
+        )
+        (atual,) = self._ligacao.execute("SELECT dono FROM liderancas WHERE nome = ?", (nome,)).fetchone()
+        return atual == dono
+
+    def _libertar(self, nome: str, dono: str) -> None:
+        self._ligacao.execute("DELETE FROM liderancas WHERE nome = ? AND dono = ?", (nome, dono))
+
+    async def obter(self, chave: str) -> str | None:
+        return await self._executar(self._obter, chave)
+
+    async def definir(self, chave: str, valor: str, ttl: float) -> None:
+        await self._executar(self._definir, chave, valor, ttl)
+
+    async def apagar(self, chave: str) -> None:
+        await self._executar(self._apagar, chave)
+
+    async def adquirir(self, nome: str, dono: str, duracao: float) -> bool:
+        """Fica com a liderança `nome` (ou renova-a) se estiver livre, expirada ou já for de `dono`."""
+        return await self._executar(self._adquirir, nome, dono, duracao)
+
+    async def libertar(self, nome: str, dono: str) -> None:
+        await self._executar(self._libertar, nome, dono)
+
+    async def fechar(self) -> None:
+        await self._executar(self._ligacao.close)
+        self._executor.shutdown(wait=False)
+
+# ------------------------- ARMAZENAMENTO EM REDIS -------------------------
+
+# Renova só se a liderança for do mesmo dono; a operação é atómica no servidor
+_SCRIPT_ADQUIRIR = """
+local dono = redis.call('GET', KEYS[1])
+if not dono then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+if dono == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_SCRIPT_LIBERTAR = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class EstadoRedis:
+    """
+    O mesmo que EstadoSQLite num servidor Redis (ou compatível, ex.:
+    Valkey, KeyDB, ou um servidor local de testes). O pacote `redis` só é
+    necessário com ESTADO_BACKEND=redis.
+
+    Só as caches e a liderança ficam no Redis: o registo de alertas
+    enviados, a fila e as marcas são de cada máquina, pelo que os processos
+    têm de correr todos na mesma máquina (várias máquinas não são suportadas).
+    """
+
+    def __init__(self, url: str = CONFIG.estado_redis_url, prefixo: str = CONFIG.estado_prefixo):
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as erro:
+            raise EnvironmentError("ESTADO_BACKEND=redis precisa do pacote 'redis' (pip install redis)") from erro
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+        self._prefixo = prefixo
+        self._adquirir = self._redis.register_script(_SCRIPT_ADQUIRIR)
+        self._libertar = self._redis.register_script(_SCRIPT_LIBERTAR)
+        logger.warning(
+            "ESTADO_BACKEND=redis: os alertas enviados, a fila e as marcas ficam em %s e nos ficheiros locais;"
+            " todos os processos têm de correr nesta máquina, senão os alertas podem ser repetidos",
+            CONFIG.base_dados,
+        )
+
+    async def obter(self, chave: str) -> str | None:
+        return await self._redis.get(self._prefixo + chave)
+
+    async def definir(self, chave: str, valor: str, ttl: float) -> None:
+        await self._redis.set(self._prefixo + chave, valor, px=max(1, int(ttl * 1000)))
+
+    async def apagar(self, chave: str) -> None:
+        await self._redis.delete(self._prefixo + chave)
+
+    async def adquirir(self, nome: str, dono: str, duracao: float) -> bool:
+        chave = f"{self._prefixo}lider:{nome}"
+        return bool(await self._adquirir(keys=[chave], args=[dono, max(1, int(duracao * 1000))]))
+
+    async def libertar(self, nome: str, dono: str) -> None:
+        await self._libertar(keys=[f"{self._prefixo}lider:{nome}"], args=[dono])
+
+    async def fechar(self) -> None:
+        await self._redis.aclose()
+
+# ------------------------- ESTADO DO PROCESSO -----------------------------
+
+_estado = None
+
+def obter_estado():
+    """Armazenamento partilhado configurado (ESTADO_BACKEND), ou None em modo local."""
+    global _estado
+    if _estado is None and CONFIG.estado_backend != "local":
+        _estado = EstadoRedis() if CONFIG.estado_backend == "redis" else EstadoSQLite()
+    return _estado
+
+# ------------------------- LIDERANÇA --------------------------------------
+
+class Lideranca:
+    """
+    Eleição de um líder entre os processos por arrendamento (lease): o
+    líder renova a liderança a cada `renovar` segundos e, se deixar de o
+    fazer (crash, processo parado), outro processo fica com ela ao fim de
+    `duracao` segundos. Localmente, o processo deixa de se considerar líder
+    um pouco antes de o arrendamento expirar, para nunca haver dois líderes.
+    Sem armazenamento partilhado (modo local) o processo é sempre o líder.
+    """
+
+    def __init__(self, nome: str, duracao: float = CONFIG.lider_duracao, renovar: float = CONFIG.lider_renovar):
+        self.nome = nome
+        self.duracao = duracao
+        self.renovar = renovar
+        self.dono = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._valida_ate = 0.0  # time.monotonic() até ao qual a liderança é garantida
+        self._ultima_tentativa = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def lider(self) -> bool:
+        return obter_estado() is None or time.monotonic() < self._valida_ate
+
+    async def atualizar(self) -> bool:
+        """Tenta ficar com a liderança (ou renová-la). Devolve se este processo é o líder."""
+        estado = obter_estado()
+        if estado is None:
+            return True
+        async with self._lock:
+            era_lider = self.lider
+            inicio = time.monotonic()
+            self._ultima_tentativa = inicio
+            try:
+                sucesso = await estado.adquirir(self.nome, self.dono, self.duracao)
+            except Exception as erro:
+                # Sem acesso ao armazenamento não há garantias: deixa de ser líder
+                logger.warning("Erro ao renovar a liderança '%s': %s", self.nome, erro)
+                sucesso = False
+            # Margem para o tempo do pedido e diferenças de relógio entre máquinas
+            self._valida_ate = inicio + self.duracao - self.renovar if sucesso else 0.0
+
+        if sucesso and not era_lider:
+            logger.info("Este processo (%s) passou a ser o líder de '%s'", self.dono, self.nome)
+        elif era_lider and not sucesso:
+            logger.warning("Este processo (%s) deixou de ser o líder de '%s'", self.dono, self.nome)
+        return sucesso
+
+    async def confirmar(self) -> bool:
+        """Se é o líder, renovando primeiro a liderança se a última tentativa for antiga."""
+        if obter_estado() is None:
+            return True
+        if self._ultima_tentativa is None or time.monotonic() - self._ultima_tentativa >= self.renovar:
+            return await self.atualizar()
+        return self.lider
+
+    async def libertar(self) -> None:
+        """Entrega a liderança (ao parar), para outro processo a assumir de imediato."""
+        estado = obter_estado()
+        if estado is None or not self.lider:
+            return
+        self._valida_ate = 0.0
+        try:
+            await estado.libertar(self.nome, self.dono)
+        except Exception as erro:
+            logger.warning("Erro ao libertar a liderança '%s': %s", self.nome, erro)
+
+# Liderança dos jobs de alertas (um só processo verifica as APIs e envia os alertas)
+lideranca_alertas = Lideranca("alertas")
+
+def apenas_lider(job):
+    """Decorador de jobs: só corre no processo que é o líder dos alertas."""
+
+    @functools.wraps(job)
+    async def envolvido(context=None, *args, **kwargs):
+        if not await lideranca_alertas.confirmar():
+            return None
+        return await job(context, *args, **kwargs)
+
+    return envolvido
+
+async def renovar_lideranca(context=None) -> None:
+    await lideranca_alertas.atualizar()
+
+def agendar_lideranca(job_queue) -> None:
+    """Renova a liderança periodicamente (em todos os processos) para não expirar entre jobs."""
+    if obter_estado() is not None:
+        job_queue.run_repeating(renovar_lideranca, interval=CONFIG.lider_renovar, first=0, name="lideranca")
+
+async def parar_estado(application=None) -> None:
+    """Liberta a liderança e fecha a ligação ao armazenamento partilhado."""
+    global _estado
+    await lideranca_alertas.libertar()
+    if _estado is not None:
+        await _estado.fechar()
+        _estado = None
+
+def _coletor_lideranca() -> list:
+    return [("ra_lider", "gauge", "1 se este processo é o líder dos jobs de alertas",
+             [({"lideranca": lideranca_alertas.nome}, int(lideranca_alertas.lider))])]
+
+registar_coletor(_coletor_lideranca)
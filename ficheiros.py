@@ -0,0 +1,16 @@
+# Ficheiro: ficheiros.py
+# Ficheiros de estado em JSON (marcas das consultas, fotografia dos incêndios)
+
+import os
+import json
+
+def guardar_json(dados, arquivo: str, **opcoes) -> None:
+    """
+    Escrita atómica: escreve num ficheiro temporário e substitui o original
+    de uma só vez, pelo que um crash a meio nunca deixa o ficheiro corrompido.
+    `opcoes` são passadas a `json.dump`.
+    """
+    temporario = f"{arquivo}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, **opcoes)
+    os.replace(temporario, arquivo)
@@ -0,0 +1,173 @@
+# Ficheiro: fila_alertas.py
+# Fila persistente (SQLite) entre a deteção de eventos e o envio dos alertas
+
+import json
+import time
+import asyncio
+import logging
+
+from base_dados import ligar
+from config import CONFIG
+from entrega import motor_entrega
+from estado_partilhado import apenas_lider
+from metricas import ALERTA_LATENCIA, medir_job, registar_coletor
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- FILA DE ALERTAS --------------------------------
+
+class FilaAlertas:
+    """
+    Guarda cada alerta por enviar como uma linha (evento, chat). A chave
+    "evento:chat" torna o enfileiramento idempotente e cada linha só sai da
+    fila quando o Telegram confirma o envio (entrega pelo menos uma vez).
+    """
+
+    def __init__(self, caminho: str = CONFIG.base_dados, max_tentativas: int = CONFIG.fila_max_tentativas):
+        self.max_tentativas = max_tentativas
+        self._ligacao = ligar(caminho)
+        self._ligacao.execute(
+            "CREATE TABLE IF NOT EXISTS fila_alertas ("
+            " chave TEXT PRIMARY KEY, chat_id INTEGER NOT NULL, texto TEXT NOT NULL,"
+            " opcoes TEXT NOT NULL, criado REAL NOT NULL, estado TEXT NOT NULL DEFAULT 'pendente',"
+            " tentativas INTEGER NOT NULL DEFAULT 0, proxima REAL NOT NULL, entregue REAL, erro TEXT)"
+        )
+        self._ligacao.execute("CREATE INDEX IF NOT EXISTS idx_fila_estado ON fila_alertas (estado, proxima)")
+        self._contadores = {"enfileirados": 0, "entregues": 0, "falhados": 0}
+
+    def enfileirar(self, evento_id: str, chat_ids, texto: str, **opcoes) -> int:
+        """Acrescenta o alerta para cada chat (numa só transação). Devolve quantos eram novos."""
+        agora = time.time()
+        opcoes_json = json.dumps(opcoes)
+        with self._ligacao:
+            self._ligacao.execute("BEGIN")
+            antes = self._ligacao.total_changes
+            self._ligacao.executemany(
+                "INSERT OR IGNORE INTO fila_alertas (chave, chat_id, texto, opcoes, criado, proxima)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                ((f"{evento_id}:{chat_id}", chat_id, texto, opcoes_json, agora, agora) for chat_id in chat_ids),
+            )
+            novos = self._ligacao.total_changes - antes
+        self._contadores["enfileirados"] += novos
+        return novos
+
+    def pendentes(self, limite: int = CONFIG.fila_lote) -> list:
+        return self._ligacao.execute(
+            "SELECT chave, chat_id, texto, opcoes, criado, tentativas FROM fila_alertas"
+            " WHERE estado = 'pendente' AND proxima <= ? ORDER BY criado LIMIT ?",
+            (time.time(), limite),
+        ).fetchall()
+
+    def marcar_entregue(self, chave: str) -> None:
+        self._ligacao.execute(
+            "UPDATE fila_alertas SET estado = 'entregue', entregue = ?, erro = NULL WHERE chave = ?",
+            (time.time(), chave),
+        )
+        self._contadores["entregues"] += 1
+
+    def reagendar(self, chave: str, tentativas: int, erro: str, permanente: bool = False) -> None:
+        # Backoff exponencial até 1 hora; desiste ao fim de `max_tentativas` ou se o erro for permanente
+        if permanente or tentativas >= self.max_tentativas:
+            estado = "falhado"
+            self._contadores["falhados"] += 1
+        else:
+            estado = "pendente"
+        proxima = time.time() + min(2 ** tentativas, 3600)
+        self._ligacao.execute(
+            "UPDATE fila_alertas SET estado = ?, tentativas = ?, proxima = ?, erro = ? WHERE chave = ?",
+            (estado, tentativas, proxima, erro, chave),
+        )
+
+    def limpar(self, max_dias: float = 7) -> None:
+        """Remove os alertas entregues ou falhados há mais de `max_dias`."""
+        limite = time.time() - max_dias * 86400
+        self._ligacao.execute("DELETE FROM fila_alertas WHERE estado != 'pendente' AND criado < ?", (limite,))
+
+    def profundidade(self) -> int:
+        (total,) = self._ligacao.execute("SELECT COUNT(*) FROM fila_alertas WHERE estado = 'pendente'").fetchone()
+        return total
+
+    def idade_mais_antiga(self) -> float:
+        """Idade (em segundos) do alerta pendente mais antigo, ou 0 se a fila estiver vazia."""
+        (criado,) = self._ligacao.execute("SELECT MIN(criado) FROM fila_alertas WHERE estado = 'pendente'").fetchone()
+        return time.time() - criado if criado else 0.0
+
+    def estatisticas(self) -> dict:
+        return {
+            **self._contadores,
+            "profundidade": self.profundidade(),
+            "idade_mais_antiga": self.idade_mais_antiga(),
+        }
+
+# ------------------------- FILA PARTILHADA --------------------------------
+
+_fila = None
+_a_drenar = asyncio.Lock()
+
+def obter_fila() -> FilaAlertas:
+    global _fila
+    if _fila is None:
+        _fila = FilaAlertas()
+    return _fila
+
+def _coletor_fila() -> list:
+    if _fila is None:
+        return []
+    return [
+        ("ra_fila_profundidade", "gauge", "Alertas pendentes na fila", [({}, _fila.profundidade())]),
+        ("ra_fila_idade_mais_antiga_segundos", "gauge", "Idade do alerta pendente mais antigo",
+         [({}, _fila.idade_mais_antiga())]),
+    ]
+
+registar_coletor(_coletor_fila)
+
+# ------------------------- ENVIO (DRENAGEM) -------------------------------
+
+async def _entregar(bot, fila: FilaAlertas, linha) -> None:
+    chave, chat_id, texto, opcoes, criado, tentativas = linha
+    resultado = await motor_entrega.enviar(bot, chat_id, texto, **json.loads(opcoes))
+    if resultado.sucesso:
+        fila.marcar_entregue(chave)
+        ALERTA_LATENCIA.observar(time.time() - criado)
+        logger.info("Alerta %s entregue %.1fs após a deteção", chave, time.time() - criado)
+    else:
+        fila.reagendar(chave, tentativas + 1, resultado.erro, resultado.permanente)
+
+async def drenar_fila(bot) -> int:
+    """Envia os alertas pendentes, lote a lote, até a fila estar vazia. Devolve quantos tentou."""
+    fila = obter_fila()
+    total = 0
+    async with _a_drenar:
+        while True:
+            lote = fila.pendentes()
+            if not lote:
+                break
+            await asyncio.gather(*(_entregar(bot, fila, linha) for linha in lote))
+            total += len(lote)
+    return total
+
+@apenas_lider
+@medir_job
+async def drenar_fila_alertas(context):
+    """Job periódico: envia os alertas pendentes (incluindo os que ficaram de antes de um reinício)."""
+    try:
+        await drenar_fila(context.bot)
+        obter_fila().limpar()
+    except Exception:
+        logger.exception("Erro ao enviar os alertas da fila")
+
+# O event loop só guarda referências fracas às tarefas: sem esta, uma drenagem podia ser apagada a meio
+_drenagens = set()
+
+def _terminar_drenagem(tarefa: asyncio.Task) -> None:
+    _drenagens.discard(tarefa)
+    if not tarefa.cancelled() and tarefa.exception() is not None:
+        logger.error("Erro ao enviar os alertas da fila: %s", tarefa.exception())
+
+def agendar_drenagem(bot) -> None:
+    """Lança o envio em segundo plano, sem bloquear quem detetou os eventos."""
+    tarefa = asyncio.create_task(drenar_fila(bot))
+    _drenagens.add(tarefa)
+    tarefa.add_done_callback(_terminar_drenagem)
@@ -1,32 +1,219 @@
 # fogos.py
 
-import os
-import aiohttp
 import logging
-from dotenv import load_dotenv
+import aiohttp
+from dataclasses import astuple, dataclass, replace
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from cache import CacheMensagem
+from config import CONFIG
+from http_cliente import recolher_json
+from indice_locais import distritos, normalizar
+from modelos import Fogo, formatar_numero
 
 # ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
 
 logger = logging.getLogger(__name__)
 
-# ------------------------- CARREGAR VARIÁVEIS DE AMBIENTE -----------------
-
-load_dotenv()
-
-FOGOS_API = os.getenv("FOGOS_API")
-
 # ------------------------- OBTER FOGOS DO API -----------------------------
 
+async def descarregar_fogos() -> list:
+    """
+    Lista dos incêndios ativos (registos `Fogo`), lida em streaming; ao
+    contrário de `obter_fogos_ativos`, levanta as exceções.
+    """
+    return await recolher_json(CONFIG.fogos_api, chave="data", projetar=Fogo.de_api)
+
 async def obter_fogos_ativos():
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(FOGOS_API) as response:
-                if response.status != 200:
-                    logger.warning("Erro ao obter dados dos fogos: HTTP %d", response.status)
-                    return []
-
-                dados = await response.json()
-                return dados.get("data", [])
+        return await descarregar_fogos()
+    except aiohttp.ClientResponseError as e:
+        logger.warning("Erro ao obter dados dos fogos: HTTP %d", e.status)
+        return []
     except Exception as e:
         logger.exception("Erro ao obter dados dos fogos")
         return []
+
+# ------------------------- FORMATAÇÃO DAS MENSAGENS -----------------------
+
+def _descrever_fogo(fogo: Fogo) -> str:
+    return (
+        f"📍 *{fogo.local}* - _{fogo.estado}_\n"
+        f"🕓 Início: {fogo.data} | {fogo.hora}\n"
+        f"🔥 Tipo de incêndio: {fogo.natureza}\n"
+        f"\nNeste momento, estão mobilizados:\n"
+        f"     👨‍🚒 {formatar_numero(fogo.operacionais)} operacionais\n"
+        f"     🚒 {formatar_numero(fogo.veiculos)} veículos\n"
+        f"     🚁 {formatar_numero(fogo.aereos)} aéreos\n"
+    )
+
+def formatar_alerta_fogo(fogo: Fogo, titulo: str = "🔥 *Novo incêndio*") -> str:
+    return f"{titulo}\n\n{_descrever_fogo(fogo)}"
+
+def formatar_mensagem_fogos(fogos: list, total: int = None, filtros: str = "", pagina: int = 0, paginas: int = 1) -> str:
+    """Uma página do /fogos: `fogos` são os incêndios da página, `total` os que passam nos filtros."""
+    total = len(fogos) if total is None else total
+    if not total:
+        if filtros:
+            return f"✅ Sem incêndios ativos com estes filtros ({filtros})."
+        return "✅ Sem incêndios ativos de momento em Portugal."
+
+    partes = [f"🔥 *Incêndios Ativos em Portugal:* _{total}_\n"]
+    if filtros:
+        partes.append(f"🔎 {filtros}\n")
+    if paginas > 1:
+        partes.append(f"📄 Página {pagina + 1} de {paginas}\n")
+    for fogo in fogos:
+        partes.append("\n───────────────────\n\n")  # Separador visual
+        partes.append(_descrever_fogo(fogo))
+    return "".join(partes)
+
+# ------------------------- PÁGINAS E FILTROS (/fogos) ---------------------
+
+# Valores do botão de operacionais mínimos (cada toque passa ao seguinte)
+NIVEIS_OPERACIONAIS = (0, 10, 50, 100)
+
+# Estados dos incêndios na API do fogos.pt: um filtro por um estado sem incêndios de momento mostra a lista vazia
+ESTADOS_FOGOS = (
+    "Despacho", "Despacho de 1º Alerta", "Chegada ao TO", "Em Curso", "Em Resolução",
+    "Conclusão", "Vigilância", "Encerrada", "Falso Alarme", "Falso Alerta",
+)
+ESTADOS_CONHECIDOS = {normalizar(estado): estado for estado in ESTADOS_FOGOS}
+
+@dataclass(frozen=True, slots=True)
+class FiltroFogos:
+    distrito: str = ""  # normalizado
+    estado: str = ""  # normalizado
+    min_operacionais: int = 0
+
+    def callback(self, vista: str = "p", pagina: int = 0) -> str:
+        # vista: "p" = página, "d" = escolher distrito, "e" = escolher estado. Os nomes vão no fim,
+        # com o tamanho do estado antes, para poderem ter qualquer caracter (incluindo "_")
+        return f"fogos_{vista}_{pagina}_{self.min_operacionais}_{len(self.estado)}_{self.estado}{self.distrito}"
+
+    @classmethod
+    def de_callback(cls, dados: str) -> tuple:
+        """Devolve (vista, página, filtro) de um callback_data criado por `callback`; ValueError se não for."""
+        _, vista, pagina, min_operacionais, tamanho, nomes = dados.split("_", 5)
+        tamanho = int(tamanho)
+        if not 0 <= tamanho <= len(nomes):
+            raise ValueError(dados)
+        return vista, int(pagina), cls(nomes[tamanho:], nomes[:tamanho], int(min_operacionais))
+
+class FotografiaFogos:
+    """
+    Incêndios de uma versão dos dados, indexados por distrito e por estado.
+    Todas as páginas e filtros do /fogos são servidos daqui, sem pedidos à
+    API; as listas filtradas e as páginas já geradas ficam guardadas até
+    chegar uma versão nova (que cria outra fotografia).
+    """
+
+    def __init__(self, fogos):
+        self.fogos = tuple(fogos)
+        self.distritos = {}  # nome normalizado -> nome
+        self.estados = {}  # nome normalizado -> nome
+        self._por_distrito = {}  # nome normalizado -> posições em self.fogos
+        self._por_estado = {}
+        for posicao, fogo in enumerate(self.fogos):
+            distrito, estado = normalizar(fogo.distrito), normalizar(fogo.estado)
+            # "" quer dizer "todos" nos filtros: incêndios sem distrito só aparecem sem filtro de distrito
+            if distrito:
+                self.distritos.setdefault(distrito, fogo.distrito)
+                self._por_distrito.setdefault(distrito, []).append(posicao)
+            if estado:
+                self.estados.setdefault(estado, fogo.estado)
+                self._por_estado.setdefault(estado, []).append(posicao)
+        self._filtrados = {}  # FiltroFogos -> tuple(Fogo)
+        self._paginas = {}  # (FiltroFogos, página) -> (texto, teclado)
+
+    def filtrar(self, filtro: FiltroFogos) -> tuple:
+        resultado = self._filtrados.get(filtro)
+        if resultado is None:
+            posicoes = None
+            if filtro.distrito:
+                posicoes = self._por_distrito.get(filtro.distrito, [])
+            if filtro.estado:
+                do_estado = self._por_estado.get(filtro.estado, [])
+                posicoes = do_estado if posicoes is None else sorted(set(posicoes).intersection(do_estado))
+            candidatos = self.fogos if posicoes is None else (self.fogos[posicao] for posicao in posicoes)
+            resultado = tuple(fogo for fogo in candidatos if (fogo.operacionais or 0) >= filtro.min_operacionais)
+            self._filtrados[filtro] = resultado
+        return resultado
+
+    def nome_estado(self, estado: str) -> str:
+        return self.estados.get(estado) or ESTADOS_CONHECIDOS.get(estado, estado)
+
+    def descrever(self, filtro: FiltroFogos) -> str:
+        partes = []
+        if filtro.distrito:
+            partes.append(f"distrito: {self.distritos.get(filtro.distrito) or distritos().get(filtro.distrito, filtro.distrito)}")
+        if filtro.estado:
+            partes.append(f"estado: {self.nome_estado(filtro.estado)}")
+        if filtro.min_operacionais:
+            partes.append(f"≥ {filtro.min_operacionais} operacionais")
+        return " · ".join(partes)
+
+    def pagina(self, filtro: FiltroFogos = FiltroFogos(), numero: int = 0) -> tuple:
+        """Texto e teclado (ou None) da página `numero` (a partir de 0) dos incêndios filtrados."""
+        fogos = self.filtrar(filtro)
+        paginas = max(1, -(-len(fogos) // CONFIG.fogos_por_pagina))
+        numero = min(max(numero, 0), paginas - 1)
+        chave = (filtro, numero)
+        if chave not in self._paginas:
+            inicio = numero * CONFIG.fogos_por_pagina
+            texto = formatar_mensagem_fogos(
+                fogos[inicio:inicio + CONFIG.fogos_por_pagina], len(fogos), self.descrever(filtro), numero, paginas
+            )
+            self._paginas[chave] = (texto, self._teclado(filtro, numero, paginas))
+        return self._paginas[chave]
+
+    # ------------------------- TECLADOS -----------------------------------
+
+    def _teclado(self, filtro: FiltroFogos, numero: int, paginas: int) -> InlineKeyboardMarkup | None:
+        if not self.fogos:
+            return None
+        linhas = []
+        if paginas > 1:
+            linhas.append([
+                InlineKeyboardButton("◀️", callback_data=filtro.callback(pagina=(numero - 1) % paginas)),
+                InlineKeyboardButton(f"{numero + 1}/{paginas}", callback_data="fogos_n"),
+                InlineKeyboardButton("▶️", callback_data=filtro.callback(pagina=(numero + 1) % paginas)),
+            ])
+        nivel = NIVEIS_OPERACIONAIS.index(filtro.min_operacionais) if filtro.min_operacionais in NIVEIS_OPERACIONAIS else 0
+        seguinte = replace(filtro, min_operacionais=NIVEIS_OPERACIONAIS[(nivel + 1) % len(NIVEIS_OPERACIONAIS)])
+        linhas.append([
+            InlineKeyboardButton(f"📍 {self.distritos.get(filtro.distrito, filtro.distrito) or 'Distrito'}", callback_data=filtro.callback("d")),
+            InlineKeyboardButton(f"📊 {self.nome_estado(filtro.estado) or 'Estado'}", callback_data=filtro.callback("e")),
+            InlineKeyboardButton(
+                f"👨‍🚒 ≥ {filtro.min_operacionais}" if filtro.min_operacionais else "👨‍🚒 Todos",
+                callback_data=seguinte.callback(),
+            ),
+        ])
+        if filtro != FiltroFogos():
+            linhas.append([InlineKeyboardButton("✖️ Limpar filtros", callback_data=FiltroFogos().callback())])
+        return InlineKeyboardMarkup(linhas)
+
+    def teclado_escolha(self, filtro: FiltroFogos, campo: str) -> InlineKeyboardMarkup:
+        """Teclado para escolher o distrito (`campo` = "distrito") ou o estado ("estado"), com o nº de incêndios."""
+        indice = self._por_distrito if campo == "distrito" else self._por_estado
+        nomes = self.distritos if campo == "distrito" else self.estados
+        botoes = [InlineKeyboardButton("Todos", callback_data=replace(filtro, **{campo: ""}).callback())]
+        for chave in sorted(nomes, key=lambda chave: nomes[chave]):
+            botoes.append(InlineKeyboardButton(
+                f"{nomes[chave]} ({len(indice[chave])})", callback_data=replace(filtro, **{campo: chave}).callback()
+            ))
+        return InlineKeyboardMarkup([botoes[i:i + 2] for i in range(0, len(botoes), 2)])
+
+# ------------------------- MENSAGEM PARTILHADA (/fogos) -------------------
+
+# Gerada uma vez por versão dos dados; o job dos alertas publica cada lista nova
+mensagem_fogos = CacheMensagem(
+    descarregar_fogos,
+    FotografiaFogos,
+    CONFIG.fogos_cache_ttl,
+    CONFIG.fogos_cache_stale,
+    nome="mensagem /fogos",
+    partilhada="fogos",
+    serializar=lambda fotografia: [astuple(fogo) for fogo in fotografia.fogos],
+    desserializar=lambda linhas: FotografiaFogos(Fogo(*linha) for linha in linhas),
+)
@@ -0,0 +1,164 @@
+# Ficheiro: fogos_alerta.py
+# Alertas automáticos de incêndios: só são enviadas as alterações entre verificações
+
+import json
+import logging
+from dataclasses import dataclass, asdict
+from telegram.ext import ContextTypes
+
+from config import CONFIG
+from estado_partilhado import apenas_lider
+from ficheiros import guardar_json
+from fila_alertas import obter_fila, agendar_drenagem
+from fogos import descarregar_fogos, formatar_alerta_fogo, mensagem_fogos
+from metricas import medir_job
+from modelos import Fogo
+from resiliencia import saltar_se_indisponivel
+from subscricoes import obter_motor
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_FOTOGRAFIA = "fogos_fotografia.json"
+
+# Meios comparados entre verificações: (campo do Fogo, nome, aumento mínimo para alertar)
+MEIOS = (
+    ("operacionais", "operacionais", CONFIG.fogos_salto_operacionais),
+    ("veiculos", "veículos", CONFIG.fogos_salto_veiculos),
+    ("aereos", "aéreos", CONFIG.fogos_salto_aereos),
+)
+
+# ------------------------- FOTOGRAFIA (ESTADO ANTERIOR) -------------------
+
+def _meios(fogo) -> list:
+    # Aceita um Fogo ou uma entrada da fotografia (dicionário com os mesmos campos)
+    obter = fogo.get if isinstance(fogo, dict) else lambda campo: getattr(fogo, campo)
+    return [obter(campo) or 0 for campo, _, _ in MEIOS]
+
+def carregar_fotografia(arquivo: str = ARQUIVO_FOTOGRAFIA):
+    """Devolve o estado guardado (id -> incêndio), ou None se ainda não existir."""
+    try:
+        with open(arquivo, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def guardar_fotografia(fotografia: dict, arquivo: str = ARQUIVO_FOTOGRAFIA):
+    guardar_json(fotografia, arquivo, ensure_ascii=False)
+
+# ------------------------- DIFERENÇAS ---------------------------------------
+
+@dataclass(slots=True)
+class Alteracao:
+    fogo_id: str
+    fogo: Fogo
+    titulo: str
+    chave: str  # identifica a alteração na fila (não é enviada duas vezes)
+
+def calcular_diferencas(anterior: dict, fogos: list):
+    """
+    Compara os incêndios ativos com a fotografia anterior. Devolve
+    (alterações, nova fotografia): incêndios novos, mudanças de estado e
+    reforços de meios acima dos limiares (em relação ao último alerta).
+
+    Cada incêndio guarda o nº de alertas de atualização já dados: a chave
+    de cada alerta usa esse nº, para que um incêndio que volta a um estado
+    ou a meios anteriores seja alertado de novo, e a mesma comparação
+    repetida (crash antes de guardar a fotografia) dê a mesma chave.
+    """
+    alteracoes = []
+    fotografia = {}
+
+    for fogo in fogos:
+        fogo_id = fogo.id
+        atual = asdict(fogo)
+        antigo = anterior.get(fogo_id)
+
+        if antigo is None:
+            atual["alertado"] = _meios(fogo)
+            atual["alertas"] = 0
+            alteracoes.append(Alteracao(fogo_id, fogo, "🔥 *Novo incêndio*", f"fogo:{fogo_id}:novo"))
+            fotografia[fogo_id] = atual
+            continue
+
+        # Meios de referência: os do último alerta, para que vários pequenos aumentos também contem
+        alertado = antigo.get("alertado") or _meios(antigo)
+        atual["alertado"] = alertado
+        atual["alertas"] = antigo.get("alertas") or 0
+        motivos = []
+
+        if fogo.estado != antigo.get("estado"):
+            motivos.append(f"{antigo.get('estado') or '?'} → {fogo.estado}")
+
+        reforcos = []
+        for (_, nome, limiar), valor, referencia in zip(MEIOS, _meios(fogo), alertado):
+            diferenca = valor - referencia
+            if limiar > 0 and diferenca >= limiar:
+                reforcos.append(f"+{diferenca} {nome}")
+        if reforcos:
+            motivos.append("reforço de " + ", ".join(reforcos))
+
+        if motivos:
+            atual["alertado"] = _meios(fogo)
+            atual["alertas"] += 1
+            alteracoes.append(Alteracao(
+                fogo_id, fogo, f"🔄 *Incêndio atualizado* ({'; '.join(motivos)})", f"fogo:{fogo_id}:{atual['alertas']}",
+            ))
+
+        fotografia[fogo_id] = atual
+
+    return alteracoes, fotografia
+
+# ------------------------- FUNÇÃO PRINCIPAL DE ALERTA ---------------------
+
+async def processar_alteracoes(bot, alteracoes: list) -> int:
+    """Coloca na fila um alerta por alteração, para os canais e subscritores do distrito."""
+    motor = obter_motor()
+    fila = obter_fila()
+    novos = 0
+
+    for alteracao in alteracoes:
+        chats = set(CONFIG.canais_alerta_fogos) | motor.corresponder_fogo(alteracao.fogo.distrito)
+        if chats:
+            novos += fila.enfileirar(
+                alteracao.chave, chats, formatar_alerta_fogo(alteracao.fogo, titulo=alteracao.titulo),
+                parse_mode="Markdown",
+            )
+
+    if novos:
+        agendar_drenagem(bot)
+    return novos
+
+@apenas_lider
+@medir_job
+@saltar_se_indisponivel(CONFIG.fogos_api)
+async def verificar_fogos(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        fogos = await descarregar_fogos()
+    except Exception as erro:
+        # Sem dados não há comparação possível: a fotografia anterior mantém-se
+        logger.warning("Erro ao obter os incêndios ativos: %s", erro)
+        return
+
+    # A mesma lista serve a mensagem do /fogos (só é gerada de novo se os dados mudaram)
+    mensagem_fogos.publicar(fogos)
+
+    try:
+        anterior = carregar_fotografia()
+        alteracoes, fotografia = calcular_diferencas(anterior or {}, fogos)
+
+        if anterior is None:
+            # Primeira execução: guarda o estado atual sem alertar os incêndios que já existiam
+            logger.info("Fotografia inicial dos incêndios: %d ativos", len(fotografia))
+        elif alteracoes:
+            logger.info("%d alterações em %d incêndios ativos", len(alteracoes), len(fotografia))
+            await processar_alteracoes(context.bot, alteracoes)
+
+        # Só depois de os alertas estarem na fila (um crash antes disto repete a comparação)
+        guardar_fotografia(fotografia)
+    except Exception:
+        logger.exception("Erro ao verificar alterações nos incêndios")
+
+def agendar_alertas_fogos(job_queue) -> None:
+    job_queue.run_repeating(verificar_fogos, interval=CONFIG.intervalo_fogos, first=40, name="alerta_fogos")
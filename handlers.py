@@ -1,41 +1,82 @@
 # Ficheiro: handlers.py
 
+import functools
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
-from locais import ID_LOCAL_TO_NAME, LOCAIS_POR_DISTRITO
+from indice_locais import (
+    distritos,
+    normalizar,
+    nome_localidade,
+    procurar_localidades,
+    teclado_distritos,
+    teclado_localidades,
+)
 from ipma_utils import (
     obter_previsao_ipma,
-    formatar_mensagem_previsao_multidias
+    obter_previsao_multidias_ipma,
+    formatar_mensagem_previsao_multidias,
+    aviso_previsao,
 )
-from fogos import obter_fogos_ativos
-from sismos import sismos, magnitude_sismica
+from metricas import medir_handler
+from modelos import formatar_numero
+
+# ------------------------- MÓDULOS CARREGADOS NO PRIMEIRO USO -------------
+
+# Os incêndios e os sismos só são importados no primeiro pedido que precisa deles
+@functools.cache
+def _fogos():
+    import fogos
+    return fogos
+
+@functools.cache
+def _sismos():
+    import sismos
+    return sismos
 
 # ------------------------- COMANDOS DO BOT --------------------------------
 
-# Comando /previsao - mostra lista de distritos
+# Comando /previsao - mostra lista de distritos (ou pesquisa com /previsao <nome>)
+@medir_handler
 async def comando_lista_distritos(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keyboard = []
-    row = []
-    count = 0
-
-    for local_id, nome in ID_LOCAL_TO_NAME.items():
-        row.append(InlineKeyboardButton(nome, callback_data=f"distrito_{local_id}"))
-        count += 1
-        if count % 3 == 0:
-            keyboard.append(row)
-            row = []
-    if row:
-        keyboard.append(row)
+    if update.message and context.args:
+        await previsao_por_nome(update, " ".join(context.args))
+        return
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = teclado_distritos("distrito_")
     if update.message:
         await update.message.reply_text("Escolhe um distrito:", reply_markup=reply_markup)
     elif update.callback_query:
         await update.callback_query.message.reply_text("Escolhe um distrito:", reply_markup=reply_markup)
 
 
+# Pesquisa de localidade por nome - mostra a previsão ou os resultados encontrados
+async def previsao_por_nome(update: Update, texto: str):
+    resultados = procurar_localidades(texto)
+
+    if not resultados:
+        await update.message.reply_text(f"❌ Nenhuma localidade encontrada para \"{texto}\".")
+        return
+
+    if len(resultados) == 1:
+        mensagem = await texto_previsao_multidias(resultados[0].id)
+        if not mensagem:
+            await update.message.reply_text("⚠️ Erro ao obter a previsão para esta localidade.")
+            return
+        await update.message.reply_text(mensagem, parse_mode="Markdown")
+        return
+
+    keyboard = [
+        [InlineKeyboardButton(f"{loc.nome} ({loc.distrito})", callback_data=f"local_{loc.id}")]
+        for loc in resultados
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text("Escolhe a localidade:", reply_markup=reply_markup)
+
+
 # Callback para distrito - mostra lista de localidades desse distrito
+@medir_handler
 async def callback_distrito(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -45,29 +86,22 @@ async def callback_distrito(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     local_id_distrito = int(data.split("_")[1])
 
-    localidades = LOCAIS_POR_DISTRITO.get(local_id_distrito)
-    if not localidades:
+    reply_markup = teclado_localidades("local_", local_id_distrito)
+    if not reply_markup:
         await query.edit_message_text("Nenhuma localidade encontrada para este distrito.")
         return
 
-    keyboard = []
-    row = []
-    count = 0
-    for local in localidades:
-        nome_local = local["local"]
-        id_local = local["globalIdLocal"]
-        row.append(InlineKeyboardButton(nome_local, callback_data=f"local_{id_local}"))
-        count += 1
-        if count % 2 == 0:
-            keyboard.append(row)
-            row = []
-    if row:
-        keyboard.append(row)
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text("Agora escolhe a localidade:", reply_markup=reply_markup)
 
+# Texto da previsão de 5 dias de uma localidade (None em caso de erro)
+async def texto_previsao_multidias(local_id: int):
+    previsoes = await obter_previsao_multidias_ipma(local_id)
+    if not previsoes:
+        return None
+    return formatar_mensagem_previsao_multidias(previsoes, nome_localidade(local_id)) + aviso_previsao(local_id)
+
 # Callback para localidade - mostra previsão 5 dias e remove botões
+@medir_handler
 async def callback_localidade(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -77,51 +111,26 @@ async def callback_localidade(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     local_id = int(data.split("_")[1])
 
-    # Descobre o nome da localidade para mostrar na mensagem
-    nome_local = None
-    for lista in LOCAIS_POR_DISTRITO.values():
-        for loc in lista:
-            if loc["globalIdLocal"] == local_id:
-                nome_local = loc["local"]
-                break
-        if nome_local:
-            break
-    if not nome_local:
-        nome_local = "Desconhecido"
-
-    from ipma_utils import obter_previsao_multidias_ipma  # importa a nova função
-    previsoes = await obter_previsao_multidias_ipma(local_id)
+    mensagem = await texto_previsao_multidias(local_id)
 
-    if not previsoes:
+    if not mensagem:
         await query.edit_message_text("⚠️ Erro ao obter a previsão para esta localidade.")
         return
 
-    mensagem = formatar_mensagem_previsao_multidias(previsoes, nome_local)
     await query.edit_message_text(mensagem, parse_mode="Markdown")
 
 
 # Comando /temperatura - Mostra a previsão do tempo para hoje pelo local escolhido   
+@medir_handler
 async def temperatura(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    keyboard = []
-    row = []
-    count = 0
-
-    for local_id, nome in ID_LOCAL_TO_NAME.items():
-        row.append(InlineKeyboardButton(nome, callback_data=f"temp_dist_{local_id}"))
-        count += 1
-        if count % 3 == 0:
-            keyboard.append(row)
-            row = []
-    if row:
-        keyboard.append(row)
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = teclado_distritos("temp_dist_")
     if update.message:
         await update.message.reply_text("Escolhe um distrito:", reply_markup=reply_markup)
     elif update.callback_query:
         await update.callback_query.message.reply_text("Escolhe um distrito:", reply_markup=reply_markup)
     
 # Callback distrito para mostrar cidades do distrito
+@medir_handler
 async def callback_temperatura_distrito(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -131,29 +140,17 @@ async def callback_temperatura_distrito(update: Update, context: ContextTypes.DE
         return
     distrito_id = int(data.split("_")[-1])
 
-    cidades_do_distrito = LOCAIS_POR_DISTRITO.get(distrito_id, [])
+    reply_markup = teclado_localidades("temp_cidade_", distrito_id)
 
-    if not cidades_do_distrito:
+    if not reply_markup:
         await query.edit_message_text("Não foram encontradas cidades para este distrito.")
         return
 
-    keyboard = []
-    row = []
-    count = 0
-    for cidade in cidades_do_distrito:
-        row.append(InlineKeyboardButton(cidade["local"], callback_data=f"temp_cidade_{cidade['globalIdLocal']}"))
-        count += 1
-        if count % 2 == 0:
-            keyboard.append(row)
-            row = []
-    if row:
-        keyboard.append(row)
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text("Escolhe uma cidade:", reply_markup=reply_markup)
 
 
 # Callback cidade para mostrar previsão e remover botões
+@medir_handler
 async def callback_temperatura_cidade(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -163,14 +160,7 @@ async def callback_temperatura_cidade(update: Update, context: ContextTypes.DEFA
         return
     cidade_id = int(data.split("_")[-1])
 
-    nome_cidade = "Desconhecido"
-    for lista in LOCAIS_POR_DISTRITO.values():
-        for loc in lista:
-            if loc["globalIdLocal"] == cidade_id:
-                nome_cidade = loc["local"]
-                break
-        if nome_cidade != "Desconhecido":
-            break
+    nome_cidade = nome_localidade(cidade_id)
 
     previsao = await obter_previsao_ipma(cidade_id)
 
@@ -178,58 +168,108 @@ async def callback_temperatura_cidade(update: Update, context: ContextTypes.DEFA
         await query.edit_message_text("⚠️ Erro ao obter a previsão para esta localidade.")
         return
 
-    hoje = next((p for p in previsao if p.get("dataPrev", "").endswith("T00:00:00")), previsao[0])
+    hoje = next((p for p in previsao if p.data.endswith("T00:00:00")), previsao[0])
 
     mensagem = (
         f"🌤️ Temperaturas para *{nome_cidade}* (Hoje)\n\n"
-        f"🗓️ Data: {hoje.get('dataPrev', 'Desconhecida').split('T')[0]}\n"
-        f"🌡️ Temperatura Mínima: {hoje.get('tMin', '?')}°C\n"
-        f"🌡️ Temperatura Máxima: {hoje.get('tMax', '?')}°C\n"
-        f"🔆 Índice UV: {hoje.get('iUv', '?')}\n"
-        f"🌦️ Prob. de precipitação: {hoje.get('probabilidadePrecipita', '?')}%\n"
+        f"🗓️ Data: {hoje.dia}\n"
+        f"🌡️ Temperatura Mínima: {formatar_numero(hoje.tmin)}°C\n"
+        f"🌡️ Temperatura Máxima: {formatar_numero(hoje.tmax)}°C\n"
+        f"🔆 Índice UV: {formatar_numero(hoje.iuv)}\n"
+        f"🌦️ Prob. de precipitação: {formatar_numero(hoje.prob_precipitacao)}%\n"
+        f"{aviso_previsao(cidade_id)}"
     )
 
     # Remove os botões da mensagem
     await query.edit_message_text(text=mensagem, parse_mode="Markdown")
 
-def formatar_mensagem_fogos(fogos):
-    if not fogos:
-        return "✅ Sem incêndios ativos de momento em Portugal."
-
-    mensagem = f"🔥 *Incêndios Ativos em Portugal:* _{len(fogos)}_\n"
-    for fogo in fogos[:10]:  # Limitar aos 10 primeiros para evitar mensagens grandes
-        local = fogo.get("location", "Local desconhecido")
-        concelho = fogo.get("concelho", "Concelho desconhecido")
-        distrito = fogo.get("district", "Distrito desconhecido")
-        freguesia = fogo.get("freguesia", "Distrito desconhecido")
-        natureza = fogo.get("natureza", "Distrito desconhecido")
-        operacionais = fogo.get("man", "Operacionais desconhecido")
-        terrestres = fogo.get("terrain", "Terrestres desconhecido")
-        aereos = fogo.get("aerial", "Aéreos desconhecido")
-        hora = fogo.get("hour", "Aéreos desconhecido")
-        data = fogo.get("date", "Aéreos desconhecido")
-        status = fogo.get("status", "Estado desconhecido")
-        mensagem += (
-            f"\n───────────────────\n"  # Separador visual
-            f"\n📍 *{local}* - _{status}_\n"
-            f"🕓 Início: {data} | {hora}\n"
-            f"🔥 Tipo de incêndio: {natureza}\n"
-            f"\nNeste momento, estão mobilizados:\n"
-            f"     👨‍🚒 {operacionais} operacionais\n"
-            f"     🚒 {terrestres} veículos\n"
-            f"     🚁 {aereos} aéreos\n"
-        )
-    return mensagem
-
+ERRO_FOGOS = "⚠️ Erro ao obter dados dos incêndios. Tenta novamente dentro de alguns minutos."
+
+# Filtro pedido em /fogos [distrito ou estado] [operacionais mínimos] (None se o nome não for conhecido).
+# Um distrito ou um estado válidos sem incêndios de momento dão um filtro com a lista vazia.
+def filtro_fogos(fotografia, args: list):
+    fogos = _fogos()
+    min_operacionais = 0
+    palavras = []
+    for arg in args:
+        # isdecimal(): isdigit() também aceita algarismos como "²", que int() recusa
+        if arg.isdecimal():
+            min_operacionais = int(arg)
+        else:
+            palavras.append(arg)
+
+    texto = normalizar(" ".join(palavras))
+    if not texto:
+        return fogos.FiltroFogos(min_operacionais=min_operacionais)
+    if texto in fotografia.distritos or texto in distritos():
+        return fogos.FiltroFogos(distrito=texto, min_operacionais=min_operacionais)
+    if texto in fotografia.estados or texto in fogos.ESTADOS_CONHECIDOS:
+        return fogos.FiltroFogos(estado=texto, min_operacionais=min_operacionais)
+    return None
+
+# Comando /fogos - 1ª página da fotografia partilhada dos incêndios (com botões de páginas e filtros)
+@medir_handler
 async def comando_fogos(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    fogos = await obter_fogos_ativos()
-    mensagem = formatar_mensagem_fogos(fogos)
-    
+    mensagem_fogos = _fogos().mensagem_fogos
+    teclado = None
+    try:
+        fotografia = await mensagem_fogos.obter_renderizado()
+    except Exception:
+        mensagem = ERRO_FOGOS
+    else:
+        filtro = filtro_fogos(fotografia, context.args or [])
+        if filtro is None:
+            mensagem = "❌ Distrito ou estado desconhecido. Ex.: `/fogos Braga`, `/fogos em curso 50`"
+        else:
+            mensagem, teclado = fotografia.pagina(filtro)
+            mensagem += mensagem_fogos.aviso()
+
     if update.message:
-        await update.message.reply_text(mensagem, parse_mode="Markdown")
+        await update.message.reply_text(mensagem, parse_mode="Markdown", reply_markup=teclado)
     elif update.callback_query:
-        await update.callback_query.message.reply_text(mensagem, parse_mode="Markdown")
+        await update.callback_query.message.reply_text(mensagem, parse_mode="Markdown", reply_markup=teclado)
+
+# Callback dos botões do /fogos - muda de página ou de filtro sem novos pedidos à API
+@medir_handler
+async def callback_fogos(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    if query.data == "fogos_n":  # botão com o nº da página
+        return
+    fogos = _fogos()
+    mensagem_fogos = fogos.mensagem_fogos
+    try:
+        vista, pagina, filtro = fogos.FiltroFogos.de_callback(query.data)
+    except ValueError:
+        return
+
+    try:
+        fotografia = await mensagem_fogos.obter_renderizado()
+    except Exception:
+        await query.edit_message_text(ERRO_FOGOS)
+        return
 
+    try:
+        if vista == "p":
+            mensagem, teclado = fotografia.pagina(filtro, pagina)
+            await query.edit_message_text(mensagem + mensagem_fogos.aviso(), parse_mode="Markdown", reply_markup=teclado)
+        else:
+            campo = "distrito" if vista == "d" else "estado"
+            await query.edit_message_reply_markup(reply_markup=fotografia.teclado_escolha(filtro, campo))
+    except BadRequest as erro:
+        # Mesma página e mesmos botões (ex.: escolher o filtro que já estava ativo)
+        if "not modified" not in str(erro).lower():
+            raise
+
+# /sismos e /magnitude_sismica: os handlers (já medidos) estão no sismos.py
+async def sismos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await _sismos().sismos(update, context)
+
+async def magnitude_sismica(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await _sismos().magnitude_sismica(update, context)
+
+@medir_handler
 async def menu_principal(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
         [InlineKeyboardButton("📍 Ver previsão temperatura (5 dias)", callback_data="menu_previsao")],
@@ -243,6 +283,7 @@ async def menu_principal(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text("🧭 Escolhe uma opção abaixo:", reply_markup=reply_markup)       
 
+@medir_handler
 async def callback_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -278,15 +319,18 @@ async def callback_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
        
 # Comando /ajuda - Mostra lista de comandos disponiveis
+@medir_handler
 async def ajuda(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Envia mensagem de ajuda com a lista de comandos disponíveis."""
     mensagem = (
         "🤖 *Explicação dos comandos disponíveis:*\n\n"
-        "📍 *Ver previsão (5 dias)*\n - Mostra a previsão meteorológica para os próximos 5 dias.\n\n"
+        "📍 *Ver previsão (5 dias)*\n - Mostra a previsão meteorológica para os próximos 5 dias. Também podes usar `/previsao <nome>` para procurar uma localidade.\n\n"
         "⚠️ *Temperatura (hoje)*\n – Mostra a previsão do tempo para hoje.\n\n"
-        "🔥 *Incêndios ativos*\n – Lista os incêndios ativos em Portugal.\n\n"
-        "🌍 *Sismos recentes*\n – Mostra os 10 sismos mais recentes registados.\n\n"
+        "📋 *Resumo*\n – `/resumo` mostra a previsão de hoje para as tuas localidades guardadas (`/resumo adicionar <nome>`); com `/resumo diario sim` recebê-lo todas as manhãs.\n\n"
+        "🔥 *Incêndios ativos*\n – Lista os incêndios ativos em Portugal, com botões para mudar de página e filtrar por distrito, estado ou operacionais. Também podes usar, ex.: `/fogos Braga` ou `/fogos em curso 50`.\n\n"
+        "🌍 *Sismos recentes*\n – Mostra os 10 sismos mais recentes registados. Também podes filtrar, ex.: `/sismos 24h 3.0 acores`.\n\n"
         "📈 *Magnitude sísmica*\n – Explica os diferentes tipos de magnitude (Richter, Momento, etc) usados para medir sismos.\n\n"
+        "🔔 *Subscrições*\n – `/subscrever` para receber alertas de sismos perto de uma localidade ou de incêndios num distrito; `/subscricoes` para as ver e `/cancelar_subscricao <número>` para cancelar.\n\n"
         "ℹ️ `/menu` – Voltas ao menu inicial."
     )
     if update.message:
@@ -0,0 +1,197 @@
+# Ficheiro: historico.py
+# Histórico local dos sismos (SQLite), preenchido pelos jobs de verificação
+
+import time
+import logging
+
+from base_dados import ligar
+from config import CONFIG
+from modelos import Sismo
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- GEOHASH ----------------------------------------
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISAO_GEOHASH = 5  # ~5 x 5 km
+
+def geohash(lat: float, lon: float, precisao: int = PRECISAO_GEOHASH) -> str:
+    intervalo_lat = [-90.0, 90.0]
+    intervalo_lon = [-180.0, 180.0]
+    caracteres = []
+    bits = 0
+    valor = 0
+    longitude = True
+    while len(caracteres) < precisao:
+        intervalo, coordenada = (intervalo_lon, lon) if longitude else (intervalo_lat, lat)
+        meio = (intervalo[0] + intervalo[1]) / 2
+        valor <<= 1
+        if coordenada >= meio:
+            valor |= 1
+            intervalo[0] = meio
+        else:
+            intervalo[1] = meio
+        longitude = not longitude
+        bits += 1
+        if bits == 5:
+            caracteres.append(_BASE32[valor])
+            bits = 0
+            valor = 0
+    return "".join(caracteres)
+
+def _tamanho_celula(precisao: int) -> tuple:
+    # Graus de (latitude, longitude) de uma célula com `precisao` caracteres
+    bits = 5 * precisao
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+def prefixos_caixa(min_lat: float, max_lat: float, min_lon: float, max_lon: float, max_prefixos: int = 16) -> list:
+    """
+    Prefixos geohash cujas células cobrem a caixa: a maior precisão com no
+    máximo `max_prefixos` células (cada prefixo é um intervalo no índice).
+    """
+    escolhidos = [""]
+    for precisao in range(1, PRECISAO_GEOHASH + 1):
+        passo_lat, passo_lon = _tamanho_celula(precisao)
+        celulas_lat = int((max_lat - min_lat) // passo_lat) + 2
+        celulas_lon = int((max_lon - min_lon) // passo_lon) + 2
+        if celulas_lat * celulas_lon > max_prefixos * 4:
+            break
+        prefixos = {
+            geohash(min(min_lat + i * passo_lat, max_lat), min(min_lon + j * passo_lon, max_lon), precisao)
+            for i in range(celulas_lat)
+            for j in range(celulas_lon)
+        }
+        if len(prefixos) > max_prefixos:
+            break
+        escolhidos = sorted(prefixos)
+    return escolhidos
+
+# ------------------------- HISTÓRICO --------------------------------------
+
+class HistoricoSismos:
+    """
+    Sismos já vistos pelos jobs, com índices por hora, magnitude e geohash.
+    Guarda também o intervalo de tempo que está completo (a partir de
+    `HISTORICO_MIN_MAGNITUDE`), para saber quando é preciso recorrer à API.
+    """
+
+    def __init__(self, caminho: str = CONFIG.base_dados):
+        self._ligacao = ligar(caminho)
+        self._ligacao.execute(
+            "CREATE TABLE IF NOT EXISTS historico_sismos ("
+            " id TEXT PRIMARY KEY, instante REAL NOT NULL, data TEXT NOT NULL, atualizado TEXT,"
+            " magnitude REAL, tipo_magnitude TEXT, profundidade REAL, regiao TEXT,"
+            " latitude REAL, longitude REAL, geohash TEXT)"
+        )
+        self._ligacao.execute("CREATE INDEX IF NOT EXISTS idx_historico_instante ON historico_sismos (instante)")
+        self._ligacao.execute("CREATE INDEX IF NOT EXISTS idx_historico_magnitude ON historico_sismos (magnitude)")
+        self._ligacao.execute("CREATE INDEX IF NOT EXISTS idx_historico_geohash ON historico_sismos (geohash)")
+        self._ligacao.execute(
+            "CREATE TABLE IF NOT EXISTS historico_cobertura (chave TEXT PRIMARY KEY, valor REAL NOT NULL)"
+        )
+
+    # ------------------------- ESCRITA ------------------------------------
+
+    def guardar(self, sismos: list) -> None:
+        """Insere ou atualiza (sismos revistos) os sismos, numa só transação."""
+        linhas = []
+        for sismo in sismos:
+            instante = sismo.instante
+            if instante is None:
+                continue
+            celula = (
+                geohash(sismo.latitude, sismo.longitude)
+                if sismo.latitude is not None and sismo.longitude is not None else None
+            )
+            linhas.append((
+                sismo.id, instante, sismo.data, sismo.atualizado, sismo.magnitude, sismo.tipo_magnitude,
+                sismo.profundidade, sismo.regiao, sismo.latitude, sismo.longitude, celula,
+            ))
+        if not linhas:
+            return
+        with self._ligacao:
+            self._ligacao.execute("BEGIN")
+            self._ligacao.executemany(
+                "INSERT OR REPLACE INTO historico_sismos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", linhas
+            )
+
+    def registar_cobertura(self, inicio: float, fim: float) -> None:
+        """Regista que o histórico está completo de `inicio` (se ainda não houver) até `fim`."""
+        with self._ligacao:
+            self._ligacao.execute("BEGIN")
+            self._ligacao.execute(
+                "INSERT OR IGNORE INTO historico_cobertura (chave, valor) VALUES ('inicio', ?)", (inicio,)
+            )
+            self._ligacao.execute(
+                "INSERT OR REPLACE INTO historico_cobertura (chave, valor) VALUES ('fim', ?)", (fim,)
+            )
+
+    def limpar(self, max_dias: float = CONFIG.historico_max_dias) -> None:
+        """Remove os sismos com mais de `max_dias` (e o início da cobertura avança com eles)."""
+        limite = time.time() - max_dias * 86400
+        with self._ligacao:
+            self._ligacao.execute("BEGIN")
+            self._ligacao.execute("DELETE FROM historico_sismos WHERE instante < ?", (limite,))
+            self._ligacao.execute(
+                "UPDATE historico_cobertura SET valor = ? WHERE chave = 'inicio' AND valor < ?", (limite, limite)
+            )
+
+    # ------------------------- CONSULTA -----------------------------------
+
+    def intervalo_coberto(self, desde: float, min_magnitude: float):
+        """
+        Parte do período de `desde` até agora em que o histórico tem todos os
+        sismos com magnitude >= `min_magnitude`: (início, fim), com fim None
+        se chega até agora; None se não cobre nada desse período.
+        """
+        if min_magnitude < CONFIG.historico_min_magnitude:
+            return None
+        cobertura = dict(self._ligacao.execute("SELECT chave, valor FROM historico_cobertura"))
+        if "inicio" not in cobertura or "fim" not in cobertura:
+            return None
+        inicio = max(desde, cobertura["inicio"])
+        # O job tem de ter corrido há pouco (até dois intervalos), senão faltam os sismos mais recentes
+        fim = None if time.time() - cobertura["fim"] <= 2 * CONFIG.historico_intervalo else cobertura["fim"]
+        if fim is not None and fim <= inicio:
+            return None
+        return inicio, fim
+
+    def consultar(self, desde: float, min_magnitude: float = None, caixa: dict = None, limite: int = 10, ate: float = None) -> list:
+        """Sismos de `desde` até `ate` (mais recentes primeiro), filtrados por magnitude e caixa geográfica."""
+        condicoes = ["instante >= ?"]
+        valores = [desde]
+        if ate is not None:
+            condicoes.append("instante <= ?")
+            valores.append(ate)
+        if min_magnitude is not None:
+            condicoes.append("magnitude >= ?")
+            valores.append(min_magnitude)
+        if caixa is not None:
+            prefixos = prefixos_caixa(caixa["minlat"], caixa["maxlat"], caixa["minlon"], caixa["maxlon"])
+            if prefixos != [""]:
+                condicoes.append("(" + " OR ".join("geohash BETWEEN ? AND ?" for _ in prefixos) + ")")
+                for prefixo in prefixos:
+                    valores.extend((prefixo, prefixo + "~"))
+            condicoes.append("latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?")
+            valores.extend((caixa["minlat"], caixa["maxlat"], caixa["minlon"], caixa["maxlon"]))
+
+        linhas = self._ligacao.execute(
+            "SELECT id, data, atualizado, magnitude, tipo_magnitude, profundidade, regiao, latitude, longitude"
+            f" FROM historico_sismos WHERE {' AND '.join(condicoes)} ORDER BY instante DESC LIMIT ?",
+            (*valores, limite),
+        )
+        return [Sismo(*linha) for linha in linhas]
+
+    def __len__(self) -> int:
+        (total,) = self._ligacao.execute("SELECT COUNT(*) FROM historico_sismos").fetchone()
+        return total
+
+_historico = None
+
+def obter_historico() -> HistoricoSismos:
+    global _historico
+    if _historico is None:
+        _historico = HistoricoSismos()
+    return _historico
@@ -0,0 +1,342 @@
+# Ficheiro: http_cliente.py
+# Cliente HTTP partilhado por todos os módulos que consultam APIs externas
+
+import json
+import time
+import codecs
+import asyncio
+import logging
+import aiohttp
+from contextlib import aclosing, asynccontextmanager
+
+from config import CONFIG
+from metricas import UPSTREAM_DURACAO, registar_coletor
+from resiliencia import obter_disjuntor
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- ESTADO DO CLIENTE ------------------------------
+
+_sessao = None
+
+# Pedidos JSON em curso, partilhados por pedidos idênticos (single-flight)
+_em_curso = {}
+
+# Contadores do pool de ligações (reutilizadas = hits, novas = misses)
+_contadores = {
+    "pool_hits": 0,
+    "pool_misses": 0,
+    "dns_hits": 0,
+    "dns_misses": 0,
+    "pedidos_json": 0,
+    "pedidos_coalescidos": 0,
+    "pedidos_stream": 0,
+    "streams_interrompidos": 0,
+}
+
+TAMANHO_BLOCO = 64 * 1024  # bytes lidos de cada vez nas respostas em streaming
+
+# ------------------------- CONTADORES (TRACE) -----------------------------
+
+async def _ligacao_reutilizada(session, ctx, params):
+    _contadores["pool_hits"] += 1
+
+async def _ligacao_criada(session, ctx, params):
+    _contadores["pool_misses"] += 1
+
+async def _dns_cache_hit(session, ctx, params):
+    _contadores["dns_hits"] += 1
+
+async def _dns_cache_miss(session, ctx, params):
+    _contadores["dns_misses"] += 1
+
+def _criar_trace_config() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_reuseconn.append(_ligacao_reutilizada)
+    trace.on_connection_create_end.append(_ligacao_criada)
+    trace.on_dns_cache_hit.append(_dns_cache_hit)
+    trace.on_dns_cache_miss.append(_dns_cache_miss)
+    return trace
+
+# ------------------------- CICLO DE VIDA ----------------------------------
+
+def _criar_sessao() -> aiohttp.ClientSession:
+    conector = aiohttp.TCPConnector(
+        limit=CONFIG.http_limite_ligacoes,
+        limit_per_host=CONFIG.http_limite_por_host,
+        ttl_dns_cache=CONFIG.http_dns_ttl,
+        keepalive_timeout=CONFIG.http_keepalive,
+    )
+    # sock_read: uma API que deixa de enviar dados a meio da resposta também conta como falha
+    timeout = aiohttp.ClientTimeout(
+        total=CONFIG.http_timeout_total, sock_connect=CONFIG.http_timeout_ligacao, sock_read=CONFIG.http_timeout_leitura,
+    )
+    return aiohttp.ClientSession(
+        connector=conector,
+        timeout=timeout,
+        trace_configs=[_criar_trace_config()],
+    )
+
+def obter_sessao() -> aiohttp.ClientSession:
+    """
+    Devolve a sessão HTTP partilhada, criando-a se ainda não existir.
+    Deve ser chamada dentro do event loop do bot.
+    """
+    global _sessao
+    if _sessao is None or _sessao.closed:
+        _sessao = _criar_sessao()
+        logger.info("Sessão HTTP partilhada criada")
+    return _sessao
+
+async def iniciar_cliente_http(application=None) -> None:
+    """Cria a sessão partilhada. Pode ser usada como `post_init` da Application."""
+    obter_sessao()
+
+async def fechar_cliente_http(application=None) -> None:
+    """Fecha a sessão partilhada. Pode ser usada como `post_shutdown` da Application."""
+    global _sessao
+    if _sessao is not None and not _sessao.closed:
+        await _sessao.close()
+        logger.info("Sessão HTTP partilhada fechada")
+    _sessao = None
+
+# ------------------------- DISJUNTOR --------------------------------------
+
+def _falha_da_api(erro: Exception) -> bool:
+    # Erros 4xx (exceto 429) são do pedido, não da API: não abrem o disjuntor
+    if isinstance(erro, aiohttp.ContentTypeError):
+        return True
+    if isinstance(erro, aiohttp.ClientResponseError):
+        return erro.status >= 500 or erro.status == 429
+    return isinstance(erro, (aiohttp.ClientError, asyncio.TimeoutError, ValueError))
+
+@asynccontextmanager
+async def _protegido(url: str):
+    """
+    Pedido protegido pelo disjuntor da API: levanta `UpstreamIndisponivel`
+    sem fazer o pedido enquanto a API está em baixo, e regista o resultado.
+    """
+    disjuntor = obter_disjuntor(url)
+    disjuntor.permitir()
+    inicio = time.perf_counter()
+    resultado = "ok"
+    try:
+        yield
+    except GeneratorExit:
+        # Streaming interrompido por quem lê: a API estava a responder
+        disjuntor.sucesso()
+        raise
+    except asyncio.CancelledError:
+        resultado = "cancelado"
+        disjuntor.cancelado()
+        raise
+    except Exception as erro:
+        if _falha_da_api(erro):
+            resultado = "erro"
+            disjuntor.falha()
+        else:
+            resultado = "erro_pedido"
+            disjuntor.sucesso()
+        raise
+    else:
+        disjuntor.sucesso()
+    finally:
+        UPSTREAM_DURACAO.observar(time.perf_counter() - inicio, api=disjuntor.nome, resultado=resultado)
+
+# ------------------------- PEDIDOS JSON (SINGLE-FLIGHT) -------------------
+
+def _chave_pedido(url: str, params: dict = None) -> tuple:
+    if not params:
+        return (url, ())
+    normalizados = ((str(k), str(v)) for k, v in params.items() if v is not None)
+    return (url, tuple(sorted(normalizados)))
+
+async def _descarregar_json(url: str, params: tuple):
+    session = obter_sessao()
+    async with _protegido(url), session.get(url, params=params or None) as response:
+        response.raise_for_status()
+        if response.status == 204:  # sem resultados (ex.: FDSN sem eventos)
+            return None
+        return await response.json()
+
+def _partilhar(chave: tuple, criar):
+    """Devolve a tarefa em curso para `chave`, ou cria-a com `criar()` (corrotina)."""
+    tarefa = _em_curso.get(chave)
+    if tarefa is None:
+        tarefa = asyncio.create_task(criar())
+        _em_curso[chave] = tarefa
+        tarefa.add_done_callback(lambda _: _em_curso.pop(chave, None))
+    else:
+        _contadores["pedidos_coalescidos"] += 1
+    return tarefa
+
+async def obter_json(url: str, params: dict = None):
+    """
+    Faz um GET e devolve o JSON da resposta.
+
+    Pedidos simultâneos ao mesmo URL com os mesmos parâmetros partilham um
+    único pedido à API e recebem o mesmo objeto (que não deve ser alterado).
+    Devolve None para respostas 204, levanta `aiohttp.ClientResponseError`
+    se a resposta não for 2xx e `UpstreamIndisponivel` se a API estiver em
+    baixo (disjuntor aberto).
+    """
+    chave = _chave_pedido(url, params)
+    _contadores["pedidos_json"] += 1
+    return await asyncio.shield(_partilhar(chave, lambda: _descarregar_json(*chave)))
+
+# ------------------------- PEDIDOS JSON EM STREAMING ----------------------
+
+_descodificador = json.JSONDecoder()
+_ESPACOS = " \t\r\n"
+_FIM_NUMERO = _ESPACOS + ",]}"
+
+class _LeitorJSON:
+    """
+    Lê um documento JSON de um stream de bytes, um valor de cada vez, sem
+    guardar nem descodificar o documento inteiro.
+    """
+
+    def __init__(self, conteudo: aiohttp.StreamReader):
+        self._conteudo = conteudo
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._fim = False
+
+    async def _ler_mais(self) -> bool:
+        if self._fim:
+            return False
+        bloco = await self._conteudo.read(TAMANHO_BLOCO)
+        self._fim = not bloco
+        self._buffer = self._buffer[self._pos:] + self._utf8.decode(bloco, final=self._fim)
+        self._pos = 0
+        return True
+
+    async def espreitar(self) -> str:
+        """Próximo caracter que não seja espaço, sem o consumir ("" no fim do documento)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _ESPACOS:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not await self._ler_mais():
+                return ""
+
+    def avancar(self) -> None:
+        self._pos += 1
+
+    async def valor(self):
+        """Descodifica o próximo valor completo (objeto, lista, texto, número, ...)."""
+        await self.espreitar()
+        while True:
+            try:
+                valor, fim = _descodificador.raw_decode(self._buffer, self._pos)
+                # Um número só está completo antes de um separador: "1", "1." ou "-4.5e"
+                # no fim do buffer podem ainda continuar no bloco seguinte
+                numero = isinstance(valor, (int, float)) and not isinstance(valor, bool)
+                if self._fim or not numero or (fim < len(self._buffer) and self._buffer[fim] in _FIM_NUMERO):
+                    self._pos = fim
+                    return valor
+            except json.JSONDecodeError:
+                if self._fim:
+                    raise
+            await self._ler_mais()
+
+async def _iterar_lista(leitor: _LeitorJSON, chave: str = None):
+    # Sem `chave`, o documento é a própria lista; com `chave`, é a lista nesse campo do objeto
+    if chave is not None:
+        if await leitor.espreitar() != "{":
+            return
+        leitor.avancar()
+        while True:
+            caracter = await leitor.espreitar()
+            if caracter in ("}", ""):
+                return
+            if caracter == ",":
+                leitor.avancar()
+                continue
+            nome = await leitor.valor()
+            if await leitor.espreitar() != ":":
+                raise ValueError("JSON inválido: esperava ':'")
+            leitor.avancar()
+            if nome == chave and await leitor.espreitar() == "[":
+                break
+            await leitor.valor()  # campo que não interessa
+
+    if await leitor.espreitar() != "[":
+        return
+    leitor.avancar()
+    while True:
+        caracter = await leitor.espreitar()
+        if caracter == "]":
+            return
+        if caracter == "":
+            raise ValueError("JSON inválido: lista incompleta")
+        if caracter == ",":
+            leitor.avancar()
+            continue
+        yield await leitor.valor()
+
+async def iterar_json(url: str, params: dict = None, chave: str = None):
+    """
+    Faz um GET e devolve, um a um, os elementos da lista `chave` da resposta
+    (ex.: "features" no GeoJSON), à medida que chegam. Sair do ciclo antes
+    do fim fecha a resposta sem ler o resto.
+    """
+    _contadores["pedidos_stream"] += 1
+    session = obter_sessao()
+    completo = False
+    async with _protegido(url), session.get(url, params=params or None) as response:
+        response.raise_for_status()
+        if response.status == 204:
+            return
+        try:
+            async for elemento in _iterar_lista(_LeitorJSON(response.content), chave):
+                yield elemento
+            completo = True
+        finally:
+            if not completo:
+                _contadores["streams_interrompidos"] += 1
+
+async def _recolher(url: str, params: tuple, chave: str, projetar, limite: int):
+    elementos = []
+    async with aclosing(iterar_json(url, params, chave)) as stream:
+        async for elemento in stream:
+            if projetar is not None:
+                elemento = projetar(elemento)
+                if elemento is None:
+                    continue
+            elementos.append(elemento)
+            if limite is not None and len(elementos) >= limite:
+                break
+    return elementos
+
+async def recolher_json(url: str, params: dict = None, chave: str = None, projetar=None, limite: int = None) -> list:
+    """
+    Lê em streaming a lista `chave` da resposta e devolve os elementos já
+    convertidos por `projetar` (os que dão None são ignorados), parando
+    assim que houver `limite` elementos. Pedidos idênticos simultâneos
+    partilham o mesmo pedido e a mesma lista (que não deve ser alterada).
+    """
+    url, params_normalizados = _chave_pedido(url, params)
+    _contadores["pedidos_json"] += 1
+    chave_pedido = (url, params_normalizados, chave, projetar, limite)
+    return await asyncio.shield(
+        _partilhar(chave_pedido, lambda: _recolher(url, params_normalizados, chave, projetar, limite))
+    )
+
+# ------------------------- ESTATÍSTICAS -----------------------------------
+
+def estatisticas_http() -> dict:
+    """Devolve uma cópia dos contadores do pool de ligações e dos pedidos coalescidos."""
+    return dict(_contadores)
+
+def _coletor_http() -> list:
+    return [
+        (f"ra_http_{nome}_total", "counter", f"Cliente HTTP: {nome.replace('_', ' ')}", [({}, valor)])
+        for nome, valor in _contadores.items()
+    ]
+
+registar_coletor(_coletor_http)
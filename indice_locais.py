@@ -0,0 +1,165 @@
+# Ficheiro: indice_locais.py
+# Índice das localidades, construído uma única vez (no primeiro uso)
+
+import bisect
+import functools
+import itertools
+import unicodedata
+from dataclasses import dataclass
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# ------------------------- MODELO -----------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class Localidade:
+    id: int
+    nome: str
+    distrito_id: int
+    distrito: str
+    latitude: float | None
+    longitude: float | None
+
+# ------------------------- FUNÇÕES AUXILIARES -----------------------------
+
+def normalizar(texto: str) -> str:
+    """Minúsculas e sem acentos, para pesquisas ("Évora" -> "evora")."""
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).lower().strip()
+
+def _coordenada(valor) -> float | None:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+def _construir_teclado(botoes: list, colunas: int) -> InlineKeyboardMarkup:
+    linhas = [botoes[i:i + colunas] for i in range(0, len(botoes), colunas)]
+    return InlineKeyboardMarkup(linhas)
+
+# ------------------------- CONSTRUÇÃO DO ÍNDICE ---------------------------
+
+@dataclass(frozen=True, slots=True)
+class _Indice:
+    localidades: dict  # globalIdLocal -> Localidade
+    distritos: dict  # nome normalizado -> nome do distrito
+    capitais: tuple  # globalIdLocal das capitais de distrito
+    chaves_pesquisa: list
+    chaves: list
+    teclados_distritos: dict
+    teclados_localidades: dict
+
+def _construir_localidades(locais_por_distrito: dict, nomes_distritos: dict) -> dict:
+    localidades = {}
+    for distrito_id, lista in locais_por_distrito.items():
+        for loc in lista:
+            localidades.setdefault(loc["globalIdLocal"], Localidade(
+                id=loc["globalIdLocal"],
+                nome=loc["local"],
+                distrito_id=distrito_id,
+                distrito=nomes_distritos.get(distrito_id, ""),
+                latitude=_coordenada(loc.get("latitude")),
+                longitude=_coordenada(loc.get("longitude")),
+            ))
+    return localidades
+
+@functools.cache
+def _indice() -> _Indice:
+    """Constrói o índice no primeiro uso (e não no import), para não atrasar o arranque."""
+    from locais import ID_LOCAL_TO_NAME, LOCAIS_POR_DISTRITO
+
+    localidades = _construir_localidades(LOCAIS_POR_DISTRITO, ID_LOCAL_TO_NAME)
+
+    # Chaves de pesquisa ordenadas: nome completo e cada palavra em diante
+    # ("armacao de pera", "de pera", "pera"), para pesquisa por prefixo com bisect
+    chaves_pesquisa = sorted(
+        (" ".join(palavras[i:]), i, local_id)
+        for local_id, localidade in localidades.items()
+        for palavras in [normalizar(localidade.nome).split()]
+        for i in range(len(palavras))
+    )
+
+    # Teclados pré-construídos (os InlineKeyboardMarkup são imutáveis e reutilizáveis)
+    teclados_distritos = {
+        prefixo: _construir_teclado(
+            [InlineKeyboardButton(nome, callback_data=f"{prefixo}{local_id}") for local_id, nome in ID_LOCAL_TO_NAME.items()],
+            colunas=3,
+        )
+        for prefixo in ("distrito_", "temp_dist_")
+    }
+    teclados_localidades = {
+        prefixo: {
+            distrito_id: _construir_teclado(
+                [InlineKeyboardButton(loc["local"], callback_data=f"{prefixo}{loc['globalIdLocal']}") for loc in lista],
+                colunas=2,
+            )
+            for distrito_id, lista in LOCAIS_POR_DISTRITO.items()
+            if lista
+        }
+        for prefixo in ("local_", "temp_cidade_")
+    }
+
+    return _Indice(
+        localidades=localidades,
+        distritos={normalizar(loc.distrito): loc.distrito for loc in localidades.values() if loc.distrito},
+        capitais=tuple(ID_LOCAL_TO_NAME),
+        chaves_pesquisa=chaves_pesquisa,
+        chaves=[chave for chave, _, _ in chaves_pesquisa],
+        teclados_distritos=teclados_distritos,
+        teclados_localidades=teclados_localidades,
+    )
+
+# ------------------------- CONSULTAS --------------------------------------
+
+def localidades() -> dict:
+    """Todas as localidades (globalIdLocal -> Localidade)."""
+    return _indice().localidades
+
+def distritos() -> dict:
+    """Distritos conhecidos (nome normalizado -> nome)."""
+    return _indice().distritos
+
+def capitais_distrito() -> tuple:
+    """IDs (globalIdLocal) das capitais de distrito."""
+    return _indice().capitais
+
+def obter_localidade(local_id: int) -> Localidade | None:
+    return _indice().localidades.get(local_id)
+
+def nome_localidade(local_id: int, omissao: str = "Desconhecido") -> str:
+    localidade = _indice().localidades.get(local_id)
+    return localidade.nome if localidade else omissao
+
+def teclado_distritos(prefixo: str) -> InlineKeyboardMarkup:
+    """Teclado com todos os distritos (`prefixo` = "distrito_" ou "temp_dist_")."""
+    return _indice().teclados_distritos[prefixo]
+
+def teclado_localidades(prefixo: str, distrito_id: int) -> InlineKeyboardMarkup | None:
+    """Teclado com as localidades de um distrito (`prefixo` = "local_" ou "temp_cidade_")."""
+    return _indice().teclados_localidades[prefixo].get(distrito_id)
+
+def procurar_localidades(texto: str, limite: int = 10) -> list:
+    """
+    Pesquisa por prefixo, sem distinguir acentos nem maiúsculas, no início
+    do nome ou de qualquer palavra do nome. Um nome igual ao texto vem primeiro.
+    """
+    termo = normalizar(texto)
+    if not termo:
+        return []
+
+    indice = _indice()
+    inicio = bisect.bisect_left(indice.chaves, termo)
+    candidatos = []
+    for chave, posicao, local_id in itertools.islice(indice.chaves_pesquisa, inicio, None):
+        if not chave.startswith(termo):
+            break
+        candidatos.append((chave != termo or posicao != 0, posicao, local_id))
+
+    resultado = []
+    vistos = set()
+    for _, _, local_id in sorted(candidatos):
+        if local_id not in vistos:
+            vistos.add(local_id)
+            resultado.append(indice.localidades[local_id])
+            if len(resultado) == limite:
+                break
+    return resultado
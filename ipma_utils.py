@@ -1,17 +1,16 @@
 # Ficheiro: ipma_utils.py
 
-import os
-import aiohttp
+import asyncio
 import logging
-from dotenv import load_dotenv
-from datetime import datetime, timezone, timedelta
-
-
-# ------------------------- CARREGAR VARIÁVEIS DE AMBIENTE -----------------
+import aiohttp
+from dataclasses import astuple
 
-load_dotenv()
+from cache import CacheTTL
+from config import CONFIG
+from http_cliente import obter_json
+from modelos import Previsao, data_de_hoje, formatar_numero
+from resiliencia import UpstreamIndisponivel, aviso_dados_antigos
 
-IPMA_API = os.getenv("IPMA_API")
 
 # ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
 
@@ -20,70 +19,102 @@ logging.basicConfig(
 )
 logger = logging.getLogger("ipma_utils")
 
+# ------------------------- CACHE DAS PREVISÕES ---------------------------
+
+# O documento de cada local é partilhado pela previsão de hoje e pela de 5 dias
+_cache_previsoes = CacheTTL(
+    ttl=CONFIG.ipma_cache_ttl,
+    max_entradas=CONFIG.ipma_cache_max,
+    tempo_stale=CONFIG.ipma_cache_stale,
+    nome="previsões IPMA",
+    partilhada="ipma",
+    serializar=lambda previsoes: [astuple(previsao) for previsao in previsoes],
+    desserializar=lambda linhas: tuple(Previsao(*linha) for linha in linhas),
+)
+
+async def _descarregar_documento_ipma(local_id: int):
+    url = f"{CONFIG.ipma_api}{local_id}.json"
+
+    try:
+        registos = await obter_json(url)
+    except UpstreamIndisponivel:
+        # O disjuntor já registou a falha; a cache serve a última previsão boa
+        return None
+    except aiohttp.ClientResponseError as e:
+        logger.error(f"Erro HTTP {e.status} ao obter previsão para local {local_id}")
+        return None
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning(f"Sem resposta do IPMA para o local {local_id}: {e!r}")
+        return None
+    except Exception as e:
+        logger.exception(f"Erro ao obter previsão para local {local_id}: {e}")
+        return None
+
+    # Convertido uma única vez; a cache guarda só os registos compactos
+    previsoes = [previsao for previsao in map(Previsao.de_api, registos or []) if previsao is not None]
+    return tuple(previsoes) or None
+
+async def obter_documento_ipma(local_id: int):
+    """
+    Devolve as previsões (todos os registos `Previsao`) de um local,
+    servidas da cache sempre que possível.
+    """
+    return await _cache_previsoes.obter(local_id, lambda: _descarregar_documento_ipma(local_id))
+
+async def atualizar_documento_ipma(local_id: int):
+    """Descarrega de novo o documento de um local e guarda-o na cache."""
+    return await _cache_previsoes.atualizar(local_id, lambda: _descarregar_documento_ipma(local_id))
+
+def aviso_previsao(local_id: int) -> str:
+    """Aviso a juntar à previsão se o IPMA está em baixo e a previsão servida é antiga."""
+    return aviso_dados_antigos(_cache_previsoes.dados_de(local_id))
+
+def estatisticas_cache_ipma() -> dict:
+    return _cache_previsoes.estatisticas()
+
 # ------------------------- CONFIGURAÇÕES DE FUNÇÕES -----------------------
 
 # Função para obter previsão apenas para um local específico
-async def obter_previsao_ipma(local_id: int):
+async def obter_previsao_ipma(local_id: int, dia: str | None = None):
     """
-    Obtém a previsão meteorológica para o dia atual de um local específico,
-    garantindo que inclui temperatura mínima, máxima, índice UV e precipitação.
+    Obtém a previsão meteorológica para o dia atual (ou `dia`) de um local
+    específico, garantindo que inclui temperatura mínima, máxima, índice UV
+    e precipitação.
     """
-    url = f"{IPMA_API}{local_id}.json"
+    data = await obter_documento_ipma(local_id)
+    if not data:
+        return None
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    logger.error(f"Erro HTTP {response.status} ao obter previsão para local {local_id}")
-                    return None
-                data = await response.json()
-
-                # Obter data de hoje em Portugal continental
-                hoje = datetime.now(timezone(timedelta(hours=1))).date().isoformat()
-
-                # Filtrar registos do dia de hoje
-                previsoes_hoje = [p for p in data if p.get("dataPrev", "").startswith(hoje)]
-                if not previsoes_hoje:
-                    logger.warning(f"Sem previsões para hoje ({hoje}) para o local {local_id}")
-                    return None
-
-                # Selecionar os melhores registos disponíveis
-                tmin_reg = next((p for p in previsoes_hoje if p.get("tMin") is not None), None)
-                tmax_reg = next((p for p in previsoes_hoje if p.get("tMax") is not None), None)
-                iuv_reg  = next((p for p in previsoes_hoje if p.get("iUv") is not None), None)
-                prec_reg = next((p for p in previsoes_hoje if p.get("probabilidadePrecipita") is not None), None)
-
-                resultado = {
-                    "dataPrev": hoje + "T00:00:00",
-                    "tMin": tmin_reg.get("tMin") if tmin_reg else None,
-                    "tMax": tmax_reg.get("tMax") if tmax_reg else None,
-                    "iUv": iuv_reg.get("iUv") if iuv_reg else None,
-                    "probabilidadePrecipita": prec_reg.get("probabilidadePrecipita") if prec_reg else None,
-                }
-
-                return [resultado]  # mantém compatibilidade com a lógica do handler
+    # Data de hoje em Portugal continental (a mesma do resumo diário)
+    hoje = dia or data_de_hoje()
 
-    except Exception as e:
-        logger.exception(f"Erro ao obter previsão para local {local_id}: {e}")
+    # Filtrar registos do dia de hoje
+    previsoes_hoje = [p for p in data if p.dia == hoje]
+    if not previsoes_hoje:
+        logger.warning(f"Sem previsões para hoje ({hoje}) para o local {local_id}")
         return None
 
+    # Selecionar os melhores registos disponíveis
+    tmin_reg = next((p for p in previsoes_hoje if p.tmin is not None), None)
+    tmax_reg = next((p for p in previsoes_hoje if p.tmax is not None), None)
+    iuv_reg  = next((p for p in previsoes_hoje if p.iuv is not None), None)
+    prec_reg = next((p for p in previsoes_hoje if p.prob_precipitacao is not None), None)
+
+    resultado = Previsao(
+        data=hoje + "T00:00:00",
+        tmin=tmin_reg.tmin if tmin_reg else None,
+        tmax=tmax_reg.tmax if tmax_reg else None,
+        iuv=iuv_reg.iuv if iuv_reg else None,
+        prob_precipitacao=prec_reg.prob_precipitacao if prec_reg else None,
+    )
+
+    return [resultado]  # mantém compatibilidade com a lógica do handler
+
 async def obter_previsao_multidias_ipma(local_id: int):
     """
     Obtém a previsão meteorológica completa (vários dias) de um local específico.
     """
-    url = f"{IPMA_API}{local_id}.json"
-
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    logger.error(f"Erro HTTP {response.status} ao obter previsão para local {local_id}")
-                    return None
-                data = await response.json()
-                return data  # ← devolve todos os registos
-    except Exception as e:
-        logger.exception(f"Erro ao obter previsão multi-dias para local {local_id}: {e}")
-        return None
+    return await obter_documento_ipma(local_id)  # ← devolve todos os registos
 
 
 def formatar_mensagem_previsao_multidias(previsoes: list, nome_local: str) -> str:
@@ -93,9 +124,7 @@ def formatar_mensagem_previsao_multidias(previsoes: list, nome_local: str) -> st
     # Agrupar previsões por dia
     previsoes_por_dia = {}
     for prev in previsoes:
-        data_prev_completa = prev.get("dataPrev", "")
-        data_prev = data_prev_completa.split("T")[0]
-        previsoes_por_dia.setdefault(data_prev, []).append(prev)
+        previsoes_por_dia.setdefault(prev.dia, []).append(prev)
 
     # Iterar pelas datas em ordem
     for data_prev in sorted(previsoes_por_dia.keys()):
@@ -103,19 +132,19 @@ def formatar_mensagem_previsao_multidias(previsoes: list, nome_local: str) -> st
             continue
 
         grupo = previsoes_por_dia[data_prev]
-        registo_00h = next((p for p in grupo if p.get("dataPrev", "").endswith("T00:00:00")), None)
-        registo_com_temp = next((p for p in grupo if p.get("tMin") is not None and p.get("tMax") is not None), None)
-        registo_com_uv = next((p for p in grupo if p.get("iUv") is not None), None)
-
-        tmin = registo_com_temp.get("tMin") if registo_com_temp else None
-        tmax = registo_com_temp.get("tMax") if registo_com_temp else None
-        meteo = registo_00h.get("probabilidadePrecipita") if registo_00h else None
-        uv = registo_com_uv.get("iUv") if registo_com_uv else None
-
-        tmin_str = f"{tmin}°C" if tmin is not None else "?"
-        tmax_str = f"{tmax}°C" if tmax is not None else "?"
-        meteo_str = f"{meteo}" if meteo is not None else "?"
-        iuv_str = f"{uv}" if uv is not None else "Indisponível"
+        registo_00h = next((p for p in grupo if p.data.endswith("T00:00:00")), None)
+        registo_com_temp = next((p for p in grupo if p.tmin is not None and p.tmax is not None), None)
+        registo_com_uv = next((p for p in grupo if p.iuv is not None), None)
+
+        tmin = registo_com_temp.tmin if registo_com_temp else None
+        tmax = registo_com_temp.tmax if registo_com_temp else None
+        meteo = registo_00h.prob_precipitacao if registo_00h else None
+        uv = registo_com_uv.iuv if registo_com_uv else None
+
+        tmin_str = f"{formatar_numero(tmin)}°C" if tmin is not None else "?"
+        tmax_str = f"{formatar_numero(tmax)}°C" if tmax is not None else "?"
+        meteo_str = formatar_numero(meteo)
+        iuv_str = formatar_numero(uv, "Indisponível")
 
         mensagem += (
             f"\n📅 {data_prev}\n"
@@ -0,0 +1,258 @@
+# Ficheiro: metricas.py
+# Métricas no formato do Prometheus (histogramas de latência e contadores), servidas em /metrics
+
+import math
+import time
+import logging
+import functools
+from abc import ABC, abstractmethod
+
+from config import CONFIG
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) dos histogramas
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LIMITES_ENTREGA = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 900, 3600)
+
+_metricas = []  # métricas declaradas (pela ordem de criação)
+_coletores = []  # funções que devolvem métricas calculadas no momento da leitura
+
+# ------------------------- TIPOS DE MÉTRICAS ------------------------------
+
+class _Metrica(ABC):
+    tipo = "untyped"
+
+    def __init__(self, nome: str, ajuda: str, etiquetas: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.etiquetas = tuple(etiquetas)
+        _metricas.append(self)
+
+    def _chave(self, valores: dict) -> tuple:
+        return tuple(str(valores.get(etiqueta, "")) for etiqueta in self.etiquetas)
+
+    @abstractmethod
+    def amostras(self):
+        """Devolve (nome, etiquetas, valor) de cada série."""
+
+class Contador(_Metrica):
+    """Valor que só aumenta (pedidos, erros, ...), uma série por combinação de etiquetas."""
+
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, etiquetas: tuple = ()):
+        super().__init__(nome, ajuda, etiquetas)
+        self._valores = {}
+
+    def inc(self, valor: float = 1, **etiquetas) -> None:
+        chave = self._chave(etiquetas)
+        self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def amostras(self):
+        for chave, valor in self._valores.items():
+            yield self.nome, dict(zip(self.etiquetas, chave)), valor
+
+class Histograma(_Metrica):
+    """Distribuição de durações: contagens cumulativas por limite, soma e total."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, etiquetas: tuple = (), limites: tuple = LIMITES_LATENCIA):
+        super().__init__(nome, ajuda, etiquetas)
+        self.limites = tuple(sorted(limites))
+        self._series = {}  # chave -> [contagem por limite..., soma, total]
+
+    def observar(self, valor: float, **etiquetas) -> None:
+        chave = self._chave(etiquetas)
+        serie = self._series.get(chave)
+        if serie is None:
+            serie = self._series[chave] = [0] * len(self.limites) + [0.0, 0]
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                serie[i] += 1
+                break
+        serie[-2] += valor
+        serie[-1] += 1
+
+    def amostras(self):
+        for chave, serie in self._series.items():
+            etiquetas = dict(zip(self.etiquetas, chave))
+            acumulado = 0
+            for limite, contagem in zip(self.limites, serie):
+                acumulado += contagem
+                yield f"{self.nome}_bucket", {**etiquetas, "le": _formatar_valor(limite)}, acumulado
+            yield f"{self.nome}_bucket", {**etiquetas, "le": "+Inf"}, serie[-1]
+            yield f"{self.nome}_sum", etiquetas, serie[-2]
+            yield f"{self.nome}_count", etiquetas, serie[-1]
+
+def registar_coletor(coletor) -> None:
+    """
+    Regista uma função chamada a cada leitura de /metrics, que devolve uma
+    lista de (nome, tipo, ajuda, [(etiquetas, valor), ...]). Serve para
+    exportar contadores que já existem noutros módulos (caches, fila, ...).
+    """
+    _coletores.append(coletor)
+
+# ------------------------- MÉTRICAS DO BOT --------------------------------
+
+HANDLER_DURACAO = Histograma(
+    "ra_handler_duracao_segundos", "Duração dos comandos e callbacks do bot", ("handler",)
+)
+HANDLER_ERROS = Contador("ra_handler_erros_total", "Exceções nos comandos e callbacks do bot", ("handler",))
+UPSTREAM_DURACAO = Histograma(
+    "ra_upstream_duracao_segundos", "Duração dos pedidos às APIs externas", ("api", "resultado")
+)
+JOB_DURACAO = Histograma("ra_job_duracao_segundos", "Duração dos jobs periódicos", ("job",))
+JOB_ATRASO = Histograma(
+    "ra_job_atraso_segundos", "Atraso entre a hora agendada e o início dos jobs periódicos", ("job",)
+)
+JOB_ERROS = Contador("ra_job_erros_total", "Exceções não tratadas nos jobs periódicos", ("job",))
+ALERTA_LATENCIA = Histograma(
+    "ra_alerta_latencia_segundos", "Tempo entre a deteção de um evento e o envio do alerta", limites=LIMITES_ENTREGA
+)
+ENVIOS = Contador("ra_envios_total", "Mensagens de alerta enviadas ao Telegram, por resultado", ("resultado",))
+ENVIOS_REPETICOES = Contador(
+    "ra_envios_repeticoes_total", "Envios repetidos por limite do Telegram ou erro de rede", ("motivo",)
+)
+
+# ------------------------- DECORADORES ------------------------------------
+
+def medir_handler(handler):
+    """Mede a duração e as exceções de um comando ou callback (etiqueta: nome da função)."""
+    if getattr(handler, "_medido", False):
+        return handler
+    nome = handler.__name__
+
+    @functools.wraps(handler)
+    async def envolvido(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            HANDLER_ERROS.inc(handler=nome)
+            raise
+        finally:
+            HANDLER_DURACAO.observar(time.perf_counter() - inicio, handler=nome)
+
+    envolvido._medido = True
+    return envolvido
+
+def _atraso_job(context) -> float | None:
+    # Só para jobs repetidos: quando o callback corre, `next_t` já é a execução seguinte
+    job = getattr(context, "job", None)
+    intervalo = getattr(getattr(getattr(job, "job", None), "trigger", None), "interval", None)
+    if intervalo is None or job.next_t is None:
+        return None
+    return max(0.0, time.time() - (job.next_t.timestamp() - intervalo.total_seconds()))
+
+def medir_job(job):
+    """Mede a duração, o atraso e as exceções de um job da job_queue."""
+    nome = job.__name__
+
+    @functools.wraps(job)
+    async def envolvido(context=None, *args, **kwargs):
+        atraso = _atraso_job(context)
+        if atraso is not None:
+            JOB_ATRASO.observar(atraso, job=nome)
+        inicio = time.perf_counter()
+        try:
+            return await job(context, *args, **kwargs)
+        except Exception:
+            JOB_ERROS.inc(job=nome)
+            raise
+        finally:
+            JOB_DURACAO.observar(time.perf_counter() - inicio, job=nome)
+
+    return envolvido
+
+def instrumentar_handlers(application) -> int:
+    """
+    Aplica `medir_handler` a todos os handlers já registados na Application
+    (os que ainda não estão medidos). Devolve quantos foram instrumentados.
+    """
+    total = 0
+    for grupo in application.handlers.values():
+        for handler in grupo:
+            callback = getattr(handler, "callback", None)
+            if callback is not None and not getattr(callback, "_medido", False):
+                handler.callback = medir_handler(callback)
+                total += 1
+    return total
+
+# ------------------------- FORMATO DE EXPOSIÇÃO ---------------------------
+
+def _formatar_valor(valor) -> str:
+    if isinstance(valor, float):
+        if math.isinf(valor):
+            return "+Inf" if valor > 0 else "-Inf"
+        return repr(valor)
+    return str(valor)
+
+def _escapar(texto: str) -> str:
+    return str(texto).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _linha(nome: str, etiquetas: dict, valor) -> str:
+    if etiquetas:
+        pares = ",".join(f'{chave}="{_escapar(texto)}"' for chave, texto in etiquetas.items())
+        return f"{nome}{{{pares}}} {_formatar_valor(valor)}"
+    return f"{nome} {_formatar_valor(valor)}"
+
+def exportar() -> str:
+    """Texto de todas as métricas no formato de exposição do Prometheus."""
+    linhas = []
+    for metrica in _metricas:
+        linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+        linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        linhas.extend(_linha(nome, etiquetas, valor) for nome, etiquetas, valor in metrica.amostras())
+
+    for coletor in _coletores:
+        try:
+            familias = coletor()
+        except Exception:
+            logger.exception("Erro ao recolher métricas de %s", getattr(coletor, "__name__", coletor))
+            continue
+        for nome, tipo, ajuda, amostras in familias:
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            linhas.extend(_linha(nome, etiquetas, valor) for etiquetas, valor in amostras)
+    return "\n".join(linhas) + "\n"
+
+# ------------------------- SERVIDOR /metrics ------------------------------
+
+_servidor = None
+
+async def _responder_metricas(request):
+    from aiohttp import web
+
+    return web.Response(
+        body=exportar().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+async def iniciar_servidor_metricas(application=None) -> None:
+    """
+    Inicia o servidor local de /metrics (desligado com METRICAS_PORTA=0).
+    Com vários processos (modo webhook), o processo N usa METRICAS_PORTA + N.
+    """
+    global _servidor
+    if not CONFIG.metricas_porta or _servidor is not None:
+        return
+    # Importado só aqui: o servidor web do aiohttp pesa no arranque e só é usado com as métricas ligadas
+    from aiohttp import web
+
+    porta = CONFIG.metricas_porta + CONFIG.trabalhador
+    app = web.Application()
+    app.router.add_get("/metrics", _responder_metricas)
+    _servidor = web.AppRunner(app, access_log=None)
+    await _servidor.setup()
+    await web.TCPSite(_servidor, CONFIG.metricas_host, porta).start()
+    logger.info("Métricas disponíveis em http://%s:%d/metrics", CONFIG.metricas_host, porta)
+
+async def parar_servidor_metricas(application=None) -> None:
+    global _servidor
+    if _servidor is not None:
+        await _servidor.cleanup()
+        _servidor = None
@@ -0,0 +1,150 @@
+# Ficheiro: modelos.py
+# Registos compactos (só com os campos usados) dos dados das APIs
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+FORMATO_DATA = "%Y-%m-%dT%H:%M:%S"
+FUSO_HORARIO = ZoneInfo("Europe/Lisbon")  # Portugal continental (com a hora de verão)
+
+# ------------------------- FUNÇÕES AUXILIARES -----------------------------
+
+def _numero(valor) -> float | None:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+def _inteiro(valor) -> int | None:
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+def ler_data(texto: str | None) -> datetime | None:
+    # Formato do SeismicPortal: "2025-08-02T14:14:03.1Z" (UTC)
+    if not texto:
+        return None
+    try:
+        return datetime.strptime(texto[:19], FORMATO_DATA).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+def data_de_hoje() -> str:
+    """Data de hoje em Portugal continental (AAAA-MM-DD), a das previsões do IPMA."""
+    return datetime.now(FUSO_HORARIO).date().isoformat()
+
+def formatar_numero(valor: float | None, omissao: str = "?") -> str:
+    """Número sem casas decimais desnecessárias (15.0 -> "15", 15.5 -> "15.5")."""
+    return omissao if valor is None else f"{valor:g}"
+
+# ------------------------- SISMOS (SEISMICPORTAL) -------------------------
+
+@dataclass(frozen=True, slots=True)
+class Sismo:
+    id: str
+    data: str  # hora do sismo, ISO 8601 (UTC)
+    atualizado: str | None
+    magnitude: float | None
+    tipo_magnitude: str
+    profundidade: float | None
+    regiao: str
+    latitude: float | None
+    longitude: float | None
+
+    @property
+    def instante(self) -> float | None:
+        """Hora do sismo em segundos desde a época (UTC)."""
+        data = ler_data(self.data)
+        return data.timestamp() if data else None
+
+    @classmethod
+    def de_feature(cls, feature: dict):
+        """Converte uma Feature GeoJSON do SeismicPortal; devolve None se não tiver ID."""
+        props = feature.get("properties") or {}
+        sismo_id = props.get("unid") or feature.get("id")
+        if not sismo_id:
+            return None
+        coordenadas = (feature.get("geometry") or {}).get("coordinates") or ()
+        return cls(
+            id=str(sismo_id),
+            data=props.get("time") or "",
+            atualizado=props.get("lastupdate"),
+            magnitude=_numero(props.get("mag")),
+            tipo_magnitude=props.get("magtype") or "?",
+            profundidade=_numero(props.get("depth")),
+            regiao=props.get("flynn_region") or "Região desconhecida",
+            latitude=_numero(coordenadas[1]) if len(coordenadas) > 1 else None,
+            longitude=_numero(coordenadas[0]) if coordenadas else None,
+        )
+
+# ------------------------- INCÊNDIOS (FOGOS.PT) ---------------------------
+
+@dataclass(frozen=True, slots=True)
+class Fogo:
+    id: str
+    local: str
+    distrito: str
+    concelho: str
+    freguesia: str
+    estado: str
+    natureza: str
+    data: str
+    hora: str
+    operacionais: int | None
+    veiculos: int | None
+    aereos: int | None
+    latitude: float | None
+    longitude: float | None
+
+    @classmethod
+    def de_api(cls, dados: dict):
+        """Converte um incêndio da API dos fogos; devolve None se não tiver ID."""
+        fogo_id = dados.get("id")
+        if not fogo_id:
+            return None
+        return cls(
+            id=str(fogo_id),
+            local=dados.get("location") or "Local desconhecido",
+            distrito=dados.get("district") or "",
+            concelho=dados.get("concelho") or "",
+            freguesia=dados.get("freguesia") or "",
+            estado=dados.get("status") or "Estado desconhecido",
+            natureza=dados.get("natureza") or "?",
+            data=dados.get("date") or "?",
+            hora=dados.get("hour") or "?",
+            operacionais=_inteiro(dados.get("man")),
+            veiculos=_inteiro(dados.get("terrain")),
+            aereos=_inteiro(dados.get("aerial")),
+            latitude=_numero(dados.get("lat")),
+            longitude=_numero(dados.get("lng")),
+        )
+
+# ------------------------- PREVISÕES (IPMA) -------------------------------
+
+@dataclass(frozen=True, slots=True)
+class Previsao:
+    data: str  # "AAAA-MM-DDTHH:MM:SS"
+    tmin: float | None
+    tmax: float | None
+    iuv: float | None
+    prob_precipitacao: float | None
+
+    @property
+    def dia(self) -> str:
+        return self.data.split("T")[0]
+
+    @classmethod
+    def de_api(cls, dados: dict):
+        """Converte um registo de previsão do IPMA; devolve None se não tiver data."""
+        data = dados.get("dataPrev")
+        if not data:
+            return None
+        return cls(
+            data=data,
+            tmin=_numero(dados.get("tMin")),
+            tmax=_numero(dados.get("tMax")),
+            iuv=_numero(dados.get("iUv")),
+            prob_precipitacao=_numero(dados.get("probabilidadePrecipita")),
+        )
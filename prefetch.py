@@ -0,0 +1,59 @@
+# Ficheiro: prefetch.py
+# Pré-carrega as previsões do IPMA para a cache antes de serem pedidas
+
+import random
+import asyncio
+import logging
+from datetime import time
+from telegram.ext import ContextTypes, JobQueue
+
+from config import CONFIG
+from estado_partilhado import apenas_lider
+from indice_locais import capitais_distrito, localidades
+from ipma_utils import atualizar_documento_ipma
+from metricas import medir_job
+from modelos import FUSO_HORARIO
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- LOCAIS A PRÉ-CARREGAR --------------------------
+
+def _locais_a_pre_aquecer() -> list:
+    # Capitais de distrito primeiro, depois (opcionalmente) todas as localidades
+    ids = list(capitais_distrito())
+    if CONFIG.prefetch_todas_localidades:
+        vistos = set(ids)
+        ids.extend(local_id for local_id in localidades() if local_id not in vistos)
+    return ids
+
+# ------------------------- JOB DE PRÉ-CARREGAMENTO ------------------------
+
+@apenas_lider
+@medir_job
+async def pre_aquecer_previsoes(context: ContextTypes.DEFAULT_TYPE = None):
+    """Atualiza a cache das previsões de todos os locais, com concorrência limitada."""
+    ids = _locais_a_pre_aquecer()
+    semaforo = asyncio.Semaphore(CONFIG.prefetch_concorrencia)
+
+    async def atualizar(local_id: int) -> bool:
+        async with semaforo:
+            # Espalha os pedidos para não os enviar todos ao mesmo tempo
+            await asyncio.sleep(random.uniform(0, CONFIG.prefetch_jitter))
+            return await atualizar_documento_ipma(local_id) is not None
+
+    resultados = await asyncio.gather(*(atualizar(local_id) for local_id in ids), return_exceptions=True)
+    sucesso = sum(1 for r in resultados if r is True)
+    logger.info("Previsões pré-carregadas: %d/%d locais", sucesso, len(ids))
+
+def agendar_pre_aquecimento(job_queue: JobQueue) -> None:
+    """Agenda o pré-carregamento no arranque e nas horas de publicação do IPMA."""
+    job_queue.run_once(pre_aquecer_previsoes, when=5, name="prefetch_arranque")
+    for hora in CONFIG.prefetch_horas:
+        horas, minutos = (int(parte) for parte in hora.split(":"))
+        job_queue.run_daily(
+            pre_aquecer_previsoes,
+            time=time(horas, minutos, tzinfo=FUSO_HORARIO),
+            name=f"prefetch_{hora}",
+        )
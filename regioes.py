@@ -0,0 +1,80 @@
+# Ficheiro: regioes.py
+# Regiões de Portugal (continente, Açores e Madeira) e índice geográfico para as encontrar
+
+import math
+from dataclasses import dataclass
+
+from config import CONFIG
+from indice_locais import normalizar
+
+# ---------------------- REGIÕES ----------------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class Regiao:
+    chave: str
+    nome: str
+    min_lat: float
+    max_lat: float
+    min_lon: float
+    max_lon: float
+    min_magnitude: float
+    canais: tuple
+
+    def contem(self, lat: float, lon: float) -> bool:
+        return self.min_lat <= lat <= self.max_lat and self.min_lon <= lon <= self.max_lon
+
+    def caixa(self) -> dict:
+        """Caixa da região, nos parâmetros da API FDSN."""
+        return {"minlat": self.min_lat, "maxlat": self.max_lat, "minlon": self.min_lon, "maxlon": self.max_lon}
+
+def _regiao(chave: str, nome: str, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> Regiao:
+    # Magnitude mínima e canais podem ser definidos por região (ex.: MIN_MAGNITUDE_PORTUGAL_ACORES)
+    canais = CONFIG.canais_alerta_portugal_regiao.get(chave, CONFIG.canais_alerta_portugal)
+    min_magnitude = CONFIG.min_magnitude_portugal_regiao.get(chave, CONFIG.min_magnitude_portugal)
+    return Regiao(chave, nome, min_lat, max_lat, min_lon, max_lon, min_magnitude, tuple(canais))
+
+# Caixas aproximadas, com margem para sismos ao largo da costa
+REGIOES = (
+    _regiao("continente", "Portugal Continental", 36.0, 42.5, -10.5, -6.0),
+    _regiao("acores", "Açores", 36.5, 40.5, -32.0, -24.0),
+    _regiao("madeira", "Madeira", 29.8, 33.5, -17.8, -15.5),
+)
+
+class IndiceRegioes:
+    """
+    Grelha de células de `tamanho_celula` graus: cada célula guarda as regiões
+    que a intersetam, para que cada sismo só seja comparado com as regiões
+    da sua célula.
+    """
+
+    def __init__(self, regioes, tamanho_celula: float = 1.0):
+        self.regioes = tuple(regioes)
+        self.tamanho_celula = tamanho_celula
+        self._celulas = {}
+        for regiao in self.regioes:
+            for i in range(self._indice(regiao.min_lat), self._indice(regiao.max_lat) + 1):
+                for j in range(self._indice(regiao.min_lon), self._indice(regiao.max_lon) + 1):
+                    self._celulas.setdefault((i, j), []).append(regiao)
+
+    def _indice(self, grau: float) -> int:
+        return math.floor(grau / self.tamanho_celula)
+
+    def procurar(self, lat: float, lon: float) -> list:
+        candidatas = self._celulas.get((self._indice(lat), self._indice(lon)), ())
+        return [regiao for regiao in candidatas if regiao.contem(lat, lon)]
+
+    def caixa_total(self) -> dict:
+        """Caixa que envolve todas as regiões, nos parâmetros da API FDSN."""
+        return {
+            "minlat": min(r.min_lat for r in self.regioes),
+            "maxlat": max(r.max_lat for r in self.regioes),
+            "minlon": min(r.min_lon for r in self.regioes),
+            "maxlon": max(r.max_lon for r in self.regioes),
+        }
+
+INDICE_REGIOES = IndiceRegioes(REGIOES)
+
+def obter_regiao(nome: str) -> Regiao | None:
+    """Procura uma região pela chave ou pelo nome, sem distinguir acentos nem maiúsculas."""
+    procurado = normalizar(nome)
+    return next((regiao for regiao in REGIOES if procurado in (regiao.chave, normalizar(regiao.nome))), None)
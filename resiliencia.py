@@ -0,0 +1,159 @@
+# Ficheiro: resiliencia.py
+# Disjuntores (circuit breakers) por API externa e avisos de dados desatualizados
+
+import time
+import random
+import logging
+import functools
+from datetime import datetime
+from urllib.parse import urlsplit
+from zoneinfo import ZoneInfo
+
+from config import CONFIG
+from metricas import registar_coletor
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+FUSO_LISBOA = ZoneInfo("Europe/Lisbon")
+
+class UpstreamIndisponivel(Exception):
+    """A API está marcada como indisponível (disjuntor aberto): o pedido nem chega a ser feito."""
+
+# ------------------------- DISJUNTOR --------------------------------------
+
+class Disjuntor:
+    """
+    Circuit breaker de uma API:
+    - fechado: os pedidos passam; `falhas_max` falhas seguidas abrem-no.
+    - aberto: os pedidos falham de imediato durante `espera` segundos
+      (com jitter), que duplica a cada nova falha até `espera_max`.
+    - semi-aberto: passado esse tempo, um único pedido de teste decide se
+      volta a fechar ou se abre de novo.
+    """
+
+    FECHADO = "fechado"
+    ABERTO = "aberto"
+    SEMI_ABERTO = "semi-aberto"
+
+    def __init__(
+        self,
+        nome: str,
+        falhas_max: int = CONFIG.disjuntor_falhas,
+        espera: float = CONFIG.disjuntor_espera,
+        espera_max: float = CONFIG.disjuntor_espera_max,
+    ):
+        self.nome = nome
+        self.falhas_max = falhas_max
+        self.espera_inicial = espera
+        self.espera_max = espera_max
+        self.estado = self.FECHADO
+        self._falhas = 0
+        self._espera = espera
+        self._reabrir_em = 0.0
+        self._contadores = {"sucessos": 0, "falhas": 0, "rejeitados": 0, "aberturas": 0}
+
+    def disponivel(self) -> bool:
+        """True se um pedido agora seria feito (fechado, ou aberto há tempo suficiente para um teste)."""
+        if self.estado == self.FECHADO:
+            return True
+        return self.estado == self.ABERTO and time.monotonic() >= self._reabrir_em
+
+    def permitir(self) -> None:
+        """Levanta `UpstreamIndisponivel` se o pedido não deve ser feito."""
+        if self.estado == self.FECHADO:
+            return
+        if self.estado == self.ABERTO and time.monotonic() >= self._reabrir_em:
+            self.estado = self.SEMI_ABERTO
+            logger.info("API %s: a testar se já responde", self.nome)
+            return
+        self._contadores["rejeitados"] += 1
+        raise UpstreamIndisponivel(f"API {self.nome} indisponível")
+
+    def sucesso(self) -> None:
+        self._contadores["sucessos"] += 1
+        if self.estado != self.FECHADO:
+            logger.info("API %s voltou a responder", self.nome)
+        self.estado = self.FECHADO
+        self._falhas = 0
+        self._espera = self.espera_inicial
+
+    def falha(self) -> None:
+        self._contadores["falhas"] += 1
+        self._falhas += 1
+        if self.estado == self.SEMI_ABERTO:
+            self._espera = min(self._espera * 2, self.espera_max)
+            self._abrir()
+        elif self.estado == self.FECHADO and self._falhas >= self.falhas_max:
+            self._abrir()
+
+    def cancelado(self) -> None:
+        # Um pedido de teste cancelado não prova nada: volta a aberto para outro teste
+        if self.estado == self.SEMI_ABERTO:
+            self.estado = self.ABERTO
+            self._reabrir_em = time.monotonic()
+
+    def _abrir(self) -> None:
+        espera = self._espera * random.uniform(0.8, 1.2)
+        self.estado = self.ABERTO
+        self._reabrir_em = time.monotonic() + espera
+        self._contadores["aberturas"] += 1
+        logger.warning("API %s indisponível após %d falhas; novo teste dentro de %.0fs", self.nome, self._falhas, espera)
+
+    def estatisticas(self) -> dict:
+        return {**self._contadores, "estado": self.estado, "falhas_seguidas": self._falhas}
+
+# ------------------------- DISJUNTORES PARTILHADOS ------------------------
+
+_disjuntores = {}
+
+def obter_disjuntor(url: str) -> Disjuntor:
+    """Disjuntor da API (um por servidor) a que o URL pertence."""
+    nome = urlsplit(url).netloc or url
+    disjuntor = _disjuntores.get(nome)
+    if disjuntor is None:
+        disjuntor = _disjuntores[nome] = Disjuntor(nome)
+    return disjuntor
+
+def estatisticas_disjuntores() -> dict:
+    return {nome: disjuntor.estatisticas() for nome, disjuntor in _disjuntores.items()}
+
+def _coletor_disjuntores() -> list:
+    estados = (Disjuntor.FECHADO, Disjuntor.ABERTO, Disjuntor.SEMI_ABERTO)
+    return [
+        ("ra_disjuntor_estado", "gauge", "Estado do disjuntor de cada API (1 no estado atual)", [
+            ({"api": nome, "estado": estado}, int(disjuntor.estado == estado))
+            for nome, disjuntor in _disjuntores.items() for estado in estados
+        ]),
+        ("ra_disjuntor_rejeitados_total", "counter", "Pedidos não feitos por a API estar em baixo", [
+            ({"api": nome}, disjuntor.estatisticas()["rejeitados"]) for nome, disjuntor in _disjuntores.items()
+        ]),
+    ]
+
+registar_coletor(_coletor_disjuntores)
+
+def saltar_se_indisponivel(url: str):
+    """
+    Decorador para jobs periódicos: enquanto a API estiver em baixo, a
+    execução é saltada sem fazer pedidos. Como a espera do disjuntor cresce
+    exponencialmente (com jitter), o job também recua.
+    """
+    def decorador(job):
+        @functools.wraps(job)
+        async def envolvido(*args, **kwargs):
+            if url and not obter_disjuntor(url).disponivel():
+                logger.debug("%s saltado: API %s indisponível", job.__name__, obter_disjuntor(url).nome)
+                return None
+            return await job(*args, **kwargs)
+        return envolvido
+    return decorador
+
+# ------------------------- DADOS DESATUALIZADOS ---------------------------
+
+def aviso_dados_antigos(guardado_em: float | None) -> str:
+    """Aviso a acrescentar às respostas servidas da cache enquanto a API está em baixo."""
+    if guardado_em is None:
+        return ""
+    hora = datetime.fromtimestamp(guardado_em, FUSO_LISBOA).strftime("%H:%M")
+    return f"\n\n⚠️ _Serviço temporariamente indisponível: dados de {hora}_"
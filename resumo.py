@@ -0,0 +1,232 @@
+# Ficheiro: resumo.py
+# Resumo da previsão de hoje para as localidades guardadas de cada chat (/resumo e envio diário)
+
+import time
+import asyncio
+import logging
+from datetime import time as hora_do_dia
+from telegram import Update
+from telegram.ext import ContextTypes, JobQueue
+
+from base_dados import ligar
+from cache import CacheTTL, calcular_versao
+from config import CONFIG
+from estado_partilhado import apenas_lider
+from fila_alertas import obter_fila, agendar_drenagem
+from indice_locais import nome_localidade, normalizar, procurar_localidades
+from ipma_utils import obter_previsao_ipma, aviso_previsao
+from metricas import medir_handler, medir_job
+from modelos import FUSO_HORARIO, data_de_hoje, formatar_numero
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- LOCALIDADES GUARDADAS --------------------------
+
+class LocaisGuardados:
+    """
+    Localidades guardadas por cada chat e chats que pediram o resumo diário,
+    em SQLite. Não há índice em memória: as consultas são lidas da base de
+    dados, pelo que as alterações feitas noutro processo são vistas de imediato.
+    """
+
+    def __init__(self, caminho: str = CONFIG.base_dados):
+        self._ligacao = ligar(caminho)
+        self._ligacao.execute(
+            "CREATE TABLE IF NOT EXISTS resumo_locais ("
+            " chat_id INTEGER NOT NULL, local_id INTEGER NOT NULL, criado REAL NOT NULL,"
+            " PRIMARY KEY (chat_id, local_id))"
+        )
+        self._ligacao.execute("CREATE TABLE IF NOT EXISTS resumo_diario (chat_id INTEGER PRIMARY KEY, criado REAL NOT NULL)")
+
+    def do_chat(self, chat_id: int) -> tuple:
+        linhas = self._ligacao.execute("SELECT local_id FROM resumo_locais WHERE chat_id = ? ORDER BY local_id", (chat_id,))
+        return tuple(local_id for (local_id,) in linhas)
+
+    def adicionar(self, chat_id: int, local_id: int) -> bool:
+        cursor = self._ligacao.execute(
+            "INSERT OR IGNORE INTO resumo_locais (chat_id, local_id, criado) VALUES (?, ?, ?)",
+            (chat_id, local_id, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def remover(self, chat_id: int, local_id: int) -> bool:
+        cursor = self._ligacao.execute("DELETE FROM resumo_locais WHERE chat_id = ? AND local_id = ?", (chat_id, local_id))
+        return cursor.rowcount > 0
+
+    def definir_diario(self, chat_id: int, ativo: bool) -> None:
+        if ativo:
+            self._ligacao.execute(
+                "INSERT OR IGNORE INTO resumo_diario (chat_id, criado) VALUES (?, ?)", (chat_id, time.time())
+            )
+        else:
+            self._ligacao.execute("DELETE FROM resumo_diario WHERE chat_id = ?", (chat_id,))
+
+    def grupos_diarios(self) -> dict:
+        """Chats com o resumo diário agrupados pelo seu conjunto de localidades (ids ordenados -> [chat_id])."""
+        locais_por_chat = {}
+        linhas = self._ligacao.execute(
+            "SELECT l.chat_id, l.local_id FROM resumo_locais l JOIN resumo_diario d ON d.chat_id = l.chat_id"
+            " ORDER BY l.chat_id, l.local_id"
+        )
+        for chat_id, local_id in linhas:
+            locais_por_chat.setdefault(chat_id, []).append(local_id)
+
+        grupos = {}
+        for chat_id, ids in locais_por_chat.items():
+            grupos.setdefault(tuple(ids), []).append(chat_id)
+        return grupos
+
+_locais_guardados = None
+
+def obter_locais_guardados() -> LocaisGuardados:
+    global _locais_guardados
+    if _locais_guardados is None:
+        _locais_guardados = LocaisGuardados()
+    return _locais_guardados
+
+# ------------------------- GERAÇÃO DO RESUMO ------------------------------
+
+# Limita os pedidos simultâneos ao IPMA de todos os resumos em preparação
+_vagas_ipma = asyncio.Semaphore(CONFIG.resumo_concorrencia)
+
+# Resumos já gerados, por (dia, ids): partilhados pelos chats com as mesmas localidades
+_cache_resumos = CacheTTL(ttl=CONFIG.resumo_cache_ttl, max_entradas=CONFIG.resumo_cache_max, nome="resumos")
+
+async def _previsao_do_dia(local_id: int, dia: str):
+    async with _vagas_ipma:
+        previsoes = await obter_previsao_ipma(local_id, dia)
+    return previsoes[0] if previsoes else None
+
+def _linha_local(local_id: int, previsao) -> str:
+    nome = nome_localidade(local_id)
+    if previsao is None:
+        return f"📍 *{nome}*: ⚠️ previsão indisponível"
+    tmin = f"{formatar_numero(previsao.tmin)}°C"
+    tmax = f"{formatar_numero(previsao.tmax)}°C"
+    return (
+        f"📍 *{nome}*: 🌡️ {tmin} ~ {tmax} · 🌦️ {formatar_numero(previsao.prob_precipitacao)}%"
+        f" · 🔆 UV {formatar_numero(previsao.iuv, 'n/d')}"
+    )
+
+async def _gerar_resumo(dia: str, ids: tuple) -> str | None:
+    # Os documentos de cada local vêm da cache das previsões (pré-carregada pelo prefetch.py)
+    resultados = await asyncio.gather(*(_previsao_do_dia(local_id, dia) for local_id in ids), return_exceptions=True)
+    previsoes = {
+        local_id: None if isinstance(resultado, BaseException) else resultado
+        for local_id, resultado in zip(ids, resultados)
+    }
+    if not any(previsoes.values()):
+        return None  # não fica em cache: o próximo pedido tenta de novo
+
+    linhas = [_linha_local(local_id, previsoes[local_id]) for local_id in sorted(ids, key=nome_localidade)]
+    aviso = next((texto for texto in map(aviso_previsao, ids) if texto), "")
+    return f"📋 *Resumo da previsão para hoje* ({dia})\n\n" + "\n".join(linhas) + aviso
+
+async def obter_resumo(ids: tuple) -> str | None:
+    """Resumo de hoje para as localidades `ids` (ordenados), gerado uma vez para todos os chats que as têm."""
+    dia = data_de_hoje()
+    return await _cache_resumos.obter((dia, ids), lambda: _gerar_resumo(dia, ids))
+
+# ------------------------- COMANDOS DO BOT --------------------------------
+
+AJUDA_RESUMO = (
+    "Utilização:\n"
+    "• `/resumo` - previsão de hoje para as tuas localidades\n"
+    "• `/resumo adicionar <localidade>`\n"
+    "   ex.: `/resumo adicionar Braga`\n"
+    "• `/resumo remover <localidade>`\n"
+    "• `/resumo diario sim|nao` - recebe o resumo todos os dias às " + CONFIG.resumo_hora
+)
+
+def _procurar_guardada(nome: str, ids: tuple):
+    # Entre as localidades guardadas, a primeira que corresponde ao nome indicado
+    return next((loc for loc in procurar_localidades(nome, limite=50) if loc.id in ids), None)
+
+# Comando /resumo - previsão de hoje para as localidades guardadas (e gestão da lista)
+@medir_handler
+async def resumo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    args = context.args or []
+    chat_id = update.effective_chat.id
+    locais = obter_locais_guardados()
+    ids = locais.do_chat(chat_id)
+    acao = normalizar(args[0]) if args else ""
+
+    if not acao:
+        if not ids:
+            await update.message.reply_text("Ainda não guardaste localidades.\n\n" + AJUDA_RESUMO, parse_mode="Markdown")
+            return
+        mensagem = await obter_resumo(ids)
+        if not mensagem:
+            await update.message.reply_text("⚠️ Erro ao obter as previsões das tuas localidades.")
+            return
+        await update.message.reply_text(mensagem, parse_mode="Markdown")
+
+    elif acao == "adicionar" and len(args) >= 2:
+        nome = " ".join(args[1:])
+        if len(ids) >= CONFIG.resumo_max_locais:
+            await update.message.reply_text(f"⚠️ Atingiste o limite de {CONFIG.resumo_max_locais} localidades.")
+            return
+        resultados = procurar_localidades(nome)
+        if not resultados:
+            await update.message.reply_text(f"❌ Nenhuma localidade encontrada para \"{nome}\".")
+            return
+        local = resultados[0]
+        if locais.adicionar(chat_id, local.id):
+            await update.message.reply_text(f"✅ {local.nome} adicionada ao teu resumo.")
+        else:
+            await update.message.reply_text(f"ℹ️ {local.nome} já faz parte do teu resumo.")
+
+    elif acao == "remover" and len(args) >= 2:
+        nome = " ".join(args[1:])
+        local = _procurar_guardada(nome, ids)
+        if local is None or not locais.remover(chat_id, local.id):
+            await update.message.reply_text(f"❌ \"{nome}\" não faz parte do teu resumo.")
+            return
+        await update.message.reply_text(f"🗑️ {local.nome} removida do teu resumo.")
+
+    elif acao == "diario" and len(args) == 2 and normalizar(args[1]) in ("sim", "nao"):
+        ativo = normalizar(args[1]) == "sim"
+        locais.definir_diario(chat_id, ativo)
+        if ativo:
+            await update.message.reply_text(f"⏰ Vais receber o resumo todos os dias às {CONFIG.resumo_hora}.")
+        else:
+            await update.message.reply_text("🔕 Deixas de receber o resumo diário.")
+
+    else:
+        await update.message.reply_text(AJUDA_RESUMO, parse_mode="Markdown")
+
+# ------------------------- RESUMO DIÁRIO ----------------------------------
+
+@apenas_lider
+@medir_job
+async def enviar_resumos_diarios(context: ContextTypes.DEFAULT_TYPE):
+    """Gera um resumo por conjunto de localidades e enfileira-o para todos os chats que o partilham."""
+    grupos = obter_locais_guardados().grupos_diarios()
+    if not grupos:
+        return
+
+    dia = data_de_hoje()
+    resultados = await asyncio.gather(*(obter_resumo(ids) for ids in grupos), return_exceptions=True)
+    fila = obter_fila()
+    novos = 0
+    for (ids, chats), mensagem in zip(grupos.items(), resultados):
+        if not isinstance(mensagem, str):
+            logger.warning("Resumo diário das localidades %s não gerado: %r", ids, mensagem)
+            continue
+        # A chave inclui o dia: um segundo envio no mesmo dia (reinício, novo líder) não repete mensagens
+        novos += fila.enfileirar(f"resumo:{dia}:{calcular_versao(ids)}", chats, mensagem, parse_mode="Markdown")
+
+    logger.info("Resumo diário: %d conjuntos de localidades, %d mensagens enfileiradas", len(grupos), novos)
+    if novos:
+        agendar_drenagem(context.bot)
+
+def agendar_resumos_diarios(job_queue: JobQueue) -> None:
+    """Agenda o resumo diário para RESUMO_HORA (hora de Lisboa)."""
+    horas, minutos = (int(parte) for parte in CONFIG.resumo_hora.split(":"))
+    job_queue.run_daily(
+        enviar_resumos_diarios,
+        time=hora_do_dia(horas, minutos, tzinfo=FUSO_HORARIO),
+        name="resumo_diario",
+    )
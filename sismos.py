@@ -1,15 +1,16 @@
-import os
-import aiohttp
-from dotenv import load_dotenv
+import re
+import math
 from telegram import Update
 from telegram.ext import ContextTypes
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
-# ------------------------- CARREGAR VARIÁVEIS DE AMBIENTE -----------------
-
-load_dotenv()
-
-SISMOS_API = os.getenv("SISMOS_API")
+from cache import CacheMensagem
+from config import CONFIG
+from historico import obter_historico
+from http_cliente import recolher_json
+from metricas import medir_handler
+from modelos import FORMATO_DATA, Sismo, formatar_numero
+from regioes import REGIOES, obter_regiao
 
 # ------------------------- CONFIGURAÇÕES DA MAGNITUDE ----------------------
 
@@ -23,69 +24,218 @@ def cor_magnitude(mag: float) -> str:
     else:
         return "⚪"  # Neutro (abaixo de 2)
 
-# ------------------------- COMANDOS DO BOT --------------------------------
+# ------------------------- OBTER SISMOS DO API ----------------------------
 
-async def sismos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+# Sismos da última mensagem do /sismos: (ids, hora do mais antigo, quantos), ou None se ainda não foi gerada
+_mostrados = None
+
+async def descarregar_sismos() -> list:
+    global _mostrados
+    params = {
+        "start": CONFIG.seismic_start,
+        "format": CONFIG.seismic_format,
+        "minmag": str(CONFIG.seismic_minmag),
+        "limit": str(CONFIG.seismic_limit)
+    }
+
+    if CONFIG.seismic_end:
+        params["end"] = CONFIG.seismic_end
+
+    # Lido em streaming, só com os campos usados, até ao limite pedido
+    eventos = await recolher_json(
+        CONFIG.sismos_api, params=params, chave="features", projetar=Sismo.de_feature, limite=CONFIG.seismic_limit
+    )
+    instantes = [sismo.instante for sismo in eventos if sismo.instante]
+    _mostrados = ({sismo.id for sismo in eventos}, min(instantes, default=None), len(eventos))
+    return eventos
+
+def afeta_mensagem_sismos(sismo: Sismo) -> bool:
+    """
+    Se um sismo novo ou revisto muda a mensagem do /sismos: os que já lá
+    estão e os que passam a fazer parte dos últimos SEISMIC_LIMIT.
+    """
+    if _mostrados is None:
+        return True
+    ids, mais_antigo, total = _mostrados
+    if sismo.id in ids:
+        return True
+    if (sismo.magnitude or 0) < CONFIG.seismic_minmag:
+        return False
+    return total < CONFIG.seismic_limit or mais_antigo is None or (sismo.instante or 0) > mais_antigo
+
+# ------------------------- FORMATAÇÃO DA MENSAGEM -------------------------
+
+def formatar_mensagem_sismos(eventos: list, titulo: str = "🌍 *Últimos Sismos:*") -> str:
+    if not eventos:
+        return "❌ Não foram encontrados sismos com os critérios definidos."
+
+    partes = [f"{titulo}\n\n"]
+    for sismo in eventos:
+        datahora = sismo.data.replace("T", " ").split(".")[0]
+
+        if sismo.latitude is not None and sismo.longitude is not None:
+            link_mapa = f"https://www.google.com/maps/search/?api=1&query={sismo.latitude},{sismo.longitude}"
+            mapa_texto = f"🗺️ [Ver no mapa]({link_mapa})"
+        else:
+            mapa_texto = "🗺️ Localização desconhecida"
+
+        # Cor de acordo com magnitude
+        cor = cor_magnitude(sismo.magnitude or 0)
+
+        partes.append(
+            f"📍 *{sismo.regiao}*\n"
+            f"🕒 {datahora}\n"
+            f"💥️ Magnitude: {cor} {sismo.tipo_magnitude} {formatar_numero(sismo.magnitude)}\n"
+            f"📏 Profundidade: {formatar_numero(sismo.profundidade)} Km\n"
+            f"{mapa_texto}\n\n"
+        )
+
+    return "".join(partes).strip()
+
+def formatar_alerta_sismo(sismo: Sismo, titulo: str = "🚨 *Sismo de Grande Magnitude Detetado!*") -> str:
+    datahora = sismo.data[:16].replace("T", " ")
+
+    if sismo.latitude is not None and sismo.longitude is not None:
+        link_mapa = f"https://www.google.com/maps/search/?api=1&query={sismo.latitude},{sismo.longitude}"
+        mapa_texto = f"🗺️ [Ver no mapa]({link_mapa})"
+    else:
+        mapa_texto = "🗺️ Localização desconhecida"
+
+    return (
+        f"{titulo}\n\n"
+        f"📍 *{sismo.regiao}*\n"
+        f"🕒 Hora: {datahora} UTC\n"
+        f"💥 Magnitude: {sismo.tipo_magnitude} *{formatar_numero(sismo.magnitude)}*\n"
+        f"📏 Profundidade: {formatar_numero(sismo.profundidade)} Km\n"
+        f"{mapa_texto}\n"
+    )
+
+# Gerada uma vez por versão dos dados; os jobs dos alertas invalidam-na quando há sismos novos
+mensagem_sismos = CacheMensagem(
+    descarregar_sismos, formatar_mensagem_sismos, CONFIG.sismos_cache_ttl, CONFIG.sismos_cache_stale, nome="mensagem /sismos", partilhada="sismos"
+)
+
+# ------------------------- PESQUISA COM FILTROS ---------------------------
+
+AJUDA_FILTROS = (
+    "Utilização: `/sismos [período] [magnitude] [região]`\n"
+    "ex.: `/sismos 24h 3.0 acores`, `/sismos 7d 4`\n"
+    f"Regiões: {', '.join(regiao.chave for regiao in REGIOES)}"
+)
+_PERIODO = re.compile(r"^(\d+(?:[.,]\d+)?)([hd])$", re.ASCII)
+MAGNITUDE_MAX = 10.0
+
+def interpretar_filtros(args: list):
+    """Devolve (horas, magnitude mínima ou None, região ou None); levanta ValueError se não perceber."""
+    horas, min_magnitude, regiao = 24.0, None, None
+    for arg in args:
+        texto = arg.lower().replace(",", ".")
+        periodo = _PERIODO.match(texto)
+        if periodo:
+            horas = float(periodo.group(1)) * (24 if periodo.group(2) == "d" else 1)
+            continue
+        try:
+            min_magnitude = float(texto)
+        except ValueError:
+            pass
+        else:
+            # float() também aceita "nan" e "inf"
+            if not (math.isfinite(min_magnitude) and 0 <= min_magnitude <= MAGNITUDE_MAX):
+                raise ValueError(arg)
+            continue
+        regiao = obter_regiao(arg)
+        if regiao is None:
+            raise ValueError(arg)
+    return horas, min_magnitude, regiao
+
+def _data_api(instante: float) -> str:
+    return datetime.fromtimestamp(instante, timezone.utc).strftime(FORMATO_DATA)
+
+async def _pesquisar_api(inicio: float, fim: float, min_magnitude: float, caixa: dict, limite: int) -> list:
+    # Os `limite` sismos mais recentes entre `inicio` e `fim` (None = até agora)
     params = {
-        "start": os.getenv("SEISMIC_START"),
-        "format": os.getenv("SEISMIC_FORMAT", "json"),
-        "minmag": os.getenv("SEISMIC_MINMAG", "2"),
-        "limit": os.getenv("SEISMIC_LIMIT", "10")
+        "format": "json",
+        "start": _data_api(inicio),
+        "minmag": str(min_magnitude),
+        "limit": str(limite),
+        **(caixa or {}),
     }
+    if fim is not None:
+        params["end"] = _data_api(fim)
+    return await recolher_json(CONFIG.sismos_api, params=params, chave="features", projetar=Sismo.de_feature, limite=limite)
+
+async def pesquisar_sismos(horas: float, min_magnitude: float, regiao=None, limite: int = 10) -> list:
+    """
+    Responde a partir do histórico local no período que este cobre e pergunta
+    à API só pelo que falta (antes do início da cobertura ou depois da última
+    atualização), guardando no histórico o que vier da API.
+    """
+    historico = obter_historico()
+    desde = (datetime.now(timezone.utc) - timedelta(hours=horas)).timestamp()
+    caixa = regiao.caixa() if regiao else None
+
+    # Troços do período (início, fim, no histórico?), dos mais recentes para os mais antigos
+    coberto = historico.intervalo_coberto(desde, min_magnitude)
+    if coberto is None:
+        trocos = [(desde, None, False)]
+    else:
+        inicio, fim = coberto
+        trocos = [(fim, None, False)] if fim is not None else []
+        trocos.append((inicio, fim, True))
+        if inicio > desde:
+            trocos.append((desde, inicio, False))
+
+    eventos = {}
+    for inicio, fim, local in trocos:
+        if local:
+            encontrados = historico.consultar(inicio, min_magnitude, caixa, limite, ate=fim)
+        else:
+            encontrados = await _pesquisar_api(inicio, fim, min_magnitude, caixa, limite)
+            historico.guardar(encontrados)
+        for sismo in encontrados:
+            eventos.setdefault(sismo.id, sismo)
+        # Os troços seguintes são mais antigos: já não entram nos `limite` mais recentes
+        if len(eventos) >= limite:
+            break
 
-    seismic_end = os.getenv("SEISMIC_END")
-    if seismic_end:
-        params["end"] = seismic_end
+    return sorted(eventos.values(), key=lambda sismo: sismo.instante or 0, reverse=True)[:limite]
+
+async def sismos_filtrados(update: Update, args: list) -> None:
+    try:
+        horas, min_magnitude, regiao = interpretar_filtros(args)
+    except ValueError:
+        await update.message.reply_text(AJUDA_FILTROS, parse_mode="Markdown")
+        return
+
+    if min_magnitude is None:
+        min_magnitude = CONFIG.seismic_minmag
+
+    try:
+        eventos = await pesquisar_sismos(horas, min_magnitude, regiao, CONFIG.seismic_limit)
+    except Exception as e:
+        await update.message.reply_text(f"⚠️ Erro ao obter dados sísmicos: {e}")
+        return
+
+    local = f" - {regiao.nome}" if regiao else ""
+    titulo = f"🌍 *Sismos nas últimas {formatar_numero(horas)}h (M≥{formatar_numero(min_magnitude)}{local}):*"
+    await update.message.reply_text(formatar_mensagem_sismos(eventos, titulo), parse_mode="Markdown")
+
+# ------------------------- COMANDOS DO BOT --------------------------------
+
+@medir_handler
+async def sismos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Com argumentos (ex.: /sismos 24h 3.0 acores) a resposta vem do histórico local
+    if update.message and context.args:
+        await sismos_filtrados(update, context.args)
+        return
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(SISMOS_API, params=params) as response:
-                data = await response.json()
-
-        eventos = data.get("features", [])
-        if not eventos:
-            await update.message.reply_text("❌ Não foram encontrados sismos com os critérios definidos.")
-            return
-
-        mensagem = "🌍 *Últimos Sismos:*\n\n"
-        for evento in eventos:
-            props = evento.get("properties", {})
-            geo = evento.get("geometry", {})
-
-            mag = props.get("mag", "?")
-            magtype = props.get("magtype", "?")
-            profundidade = props.get("depth", "?")
-            lugar = props.get("flynn_region", "Região desconhecida")
-            datahora = props.get("time", "").replace("T", " ").split(".")[0]
-
-            latitude = geo.get("coordinates", [None, None])[1]
-            longitude = geo.get("coordinates", [None, None])[0]
-
-            if latitude and longitude:
-                link_mapa = f"https://www.google.com/maps/search/?api=1&query={latitude},{longitude}"
-                mapa_texto = f"🗺️ [Ver no mapa]({link_mapa})"
-            else:
-                mapa_texto = "🗺️ Localização desconhecida"
-
-            # Cor de acordo com magnitude
-            try:
-                mag_valor = float(mag)
-            except:
-                mag_valor = 0
-            cor = cor_magnitude(mag_valor)
-
-            mensagem += (
-                f"📍 *{lugar}*\n"
-                f"🕒 {datahora}\n"
-                f"💥️ Magnitude: {cor} {magtype} {mag}\n"
-                f"📏 Profundidade: {profundidade} Km\n"
-                f"{mapa_texto}\n\n"
-            )
+        mensagem = await mensagem_sismos.obter()
 
         if update.message:
-            await update.message.reply_text(mensagem.strip(), parse_mode="Markdown")
+            await update.message.reply_text(mensagem, parse_mode="Markdown")
         elif update.callback_query:
-            await update.callback_query.message.reply_text(mensagem.strip(), parse_mode="Markdown")
+            await update.callback_query.message.reply_text(mensagem, parse_mode="Markdown")
 
     except Exception as e:
         erro_msg = f"⚠️ Erro ao obter dados sísmicos: {e}"
@@ -94,6 +244,7 @@ async def sismos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         elif update.callback_query:
             await update.callback_query.message.reply_text(erro_msg)
 
+@medir_handler
 async def magnitude_sismica(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Explica os diferentes tipos de magnitude sísmica."""
     mensagem = (
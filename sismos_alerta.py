@@ -1,102 +1,358 @@
-import os
-import aiohttp
 import json
-from datetime import datetime
+import random
+import asyncio
+import logging
+import aiohttp
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from telegram.ext import ContextTypes
-from dotenv import load_dotenv
 
-# ---------------------- CARREGAR VARIÁVEIS DE AMBIENTE ----------------------
+from config import CONFIG
+from dedup import obter_registo
+from estado_partilhado import apenas_lider, lideranca_alertas
+from ficheiros import guardar_json
+from fila_alertas import obter_fila, agendar_drenagem, drenar_fila_alertas
+from historico import obter_historico
+from http_cliente import recolher_json, obter_sessao
+from metricas import medir_job
+from modelos import FORMATO_DATA, Sismo, ler_data
+from resiliencia import saltar_se_indisponivel
+from sismos import afeta_mensagem_sismos, formatar_alerta_sismo, mensagem_sismos
+from subscricoes import obter_motor, processar_sismos_subscricoes
+
+# ---------------------- CONFIGURAÇÃO DE LOGS ---------------------------------
+
+logger = logging.getLogger(__name__)
 
-load_dotenv()
+# ---------------------- FICHEIROS DE ESTADO ----------------------------------
 
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-CHANNEL_IDS_RAW = os.getenv("ALERTA_SISMOS_CHANNEL_IDS", "")
-CHANNEL_IDS = [canal.strip() for canal in CHANNEL_IDS_RAW.split(",") if canal.strip()]
-MIN_MAGNITUDE_ALERTA = float(os.getenv("MIN_MAGNITUDE_ALERTA", 6))
-SISMOS_API = os.getenv("SISMOS_API")
 ARQUIVO_SISMOS = "sismos_notificados.json"
+ARQUIVO_MARCA = "sismos_marca.json"
+ARQUIVO_MARCA_HISTORICO = "sismos_historico_marca.json"
+
+# Consulta incremental (marca = "lastupdate" mais recente já processado)
+FORMATO_DATA_API = FORMATO_DATA
 
 # ---------------------- FUNÇÕES PARA ARMAZENAR/VERIFICAR ---------------------
 
 def carregar_sismos_notificados():
+    # Registo em SQLite; o antigo sismos_notificados.json é importado na 1ª vez
+    return obter_registo("sismos", importar_de=ARQUIVO_SISMOS)
+
+@dataclass(frozen=True, slots=True)
+class Marca:
+    """
+    Estado da consulta incremental: `lastupdate` é a revisão mais recente já
+    processada. Se o limite de páginas cortou a consulta, `cursor` é a hora
+    do último sismo recebido, `vistos` quantos sismos com essa hora já vieram
+    e `desde` a hora da primeira consulta cortada.
+    """
+    lastupdate: datetime | None
+    cursor: datetime | None = None
+    vistos: int = 0
+    desde: datetime | None = None
+
+def _formatar(data: datetime | None) -> str | None:
+    return data.strftime(FORMATO_DATA_API) if data else None
+
+def carregar_estado_marca(arquivo: str = ARQUIVO_MARCA) -> Marca | None:
+    """Devolve o estado guardado da consulta incremental, ou None se ainda não existir."""
     try:
-        with open(ARQUIVO_SISMOS, "r", encoding="utf-8") as f:
-            return set(json.load(f))
-    except (FileNotFoundError, json.JSONDecodeError):
-        return set()
+        with open(arquivo, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        return Marca(
+            ler_data(dados.get("lastupdate")), ler_data(dados.get("cursor")),
+            int(dados.get("vistos") or 0), ler_data(dados.get("desde")),
+        )
+    except (FileNotFoundError, json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        return None
+
+def carregar_marca(arquivo: str = ARQUIVO_MARCA):
+    """Devolve a marca guardada (datetime UTC) ou None se ainda não existir."""
+    estado = carregar_estado_marca(arquivo)
+    return estado.lastupdate if estado else None
+
+def guardar_marca(marca: Marca | datetime, arquivo: str = ARQUIVO_MARCA):
+    if isinstance(marca, datetime):
+        marca = Marca(marca)
+    dados = {"lastupdate": _formatar(marca.lastupdate)}
+    if marca.cursor is not None:
+        dados.update(cursor=_formatar(marca.cursor), vistos=marca.vistos, desde=_formatar(marca.desde))
+    guardar_json(dados, arquivo)
+
+# ------------------------ CONSULTA INCREMENTAL -------------------------------
+
+async def obter_eventos_incrementais(params_base: dict, arquivo_marca: str = ARQUIVO_MARCA):
+    """
+    Obtém apenas os eventos novos ou atualizados desde a última marca guardada,
+    página a página até não haver mais. Devolve (eventos, nova_marca); a marca
+    só deve ser guardada depois de os eventos estarem processados.
+
+    Se o limite de páginas cortar a consulta, a marca não avança (a API ordena
+    pela hora do sismo e não pela revisão) e guarda onde continuar: a próxima
+    consulta começa no último sismo recebido, saltando os dessa hora que já
+    vieram, até a consulta deixar de ser cortada.
+    """
+    estado = carregar_estado_marca(arquivo_marca) or Marca(None)
+    marca = estado.lastupdate
+    agora = datetime.now(timezone.utc)
+
+    params = {**params_base, "format": "json", "orderby": "time-asc", "limit": str(CONFIG.sismos_pagina)}
+    saltar = 0
+    if estado.cursor is not None:
+        params["start"] = _formatar(estado.cursor)
+        saltar = estado.vistos
+    elif marca is None:
+        params["start"] = _formatar(agora - timedelta(hours=CONFIG.sismos_janela_inicial))
+    else:
+        # Eventos antigos revistos há pouco (ex.: magnitude corrigida) também voltam
+        params["start"] = _formatar(marca - timedelta(hours=CONFIG.sismos_margem_revisao))
+    if marca is not None:
+        params["updatedafter"] = _formatar(marca)
+
+    eventos = []
+    mais_recente = marca
+    for pagina in range(CONFIG.sismos_max_paginas):
+        params["offset"] = str(1 + saltar + pagina * CONFIG.sismos_pagina)
+        pagina_eventos = await recolher_json(CONFIG.sismos_api, params=params, chave="features", projetar=Sismo.de_feature)
+
+        for sismo in pagina_eventos:
+            atualizado = ler_data(sismo.atualizado) or ler_data(sismo.data)
+            if atualizado and (mais_recente is None or atualizado > mais_recente):
+                mais_recente = atualizado
+        eventos.extend(pagina_eventos)
+
+        if len(pagina_eventos) < CONFIG.sismos_pagina:
+            cursor = None
+            break
+    else:
+        cursor = ler_data(eventos[-1].data)
+
+    if cursor is not None:
+        # Vários sismos podem ter a mesma hora (ao segundo): os que já vieram são saltados pelo offset
+        vistos = sum(1 for sismo in eventos if ler_data(sismo.data) == cursor)
+        if cursor == estado.cursor:
+            vistos += estado.vistos
+        nova_marca = Marca(marca, cursor, vistos, estado.desde or agora)
+        logger.warning(
+            "Limite de %d páginas atingido; a próxima verificação continua a partir de %s",
+            CONFIG.sismos_max_paginas, eventos[-1].data,
+        )
+    else:
+        # Depois de consultas cortadas, a marca não passa da hora da primeira: os sismos revistos
+        # entretanto, mais antigos do que o cursor, voltam na próxima consulta
+        if estado.desde is not None and mais_recente is not None:
+            mais_recente = min(mais_recente, estado.desde)
+            if marca is not None:
+                mais_recente = max(mais_recente, marca)
+        nova_marca = Marca(mais_recente) if mais_recente is not None else None
+
+    if eventos:
+        # Tudo o que os jobs veem fica no histórico local (consultas do /sismos com filtros)
+        obter_historico().guardar(eventos)
+    # Há sismos novos ou revistos na mensagem do /sismos: é gerada de novo no próximo pedido
+    if any(map(afeta_mensagem_sismos, eventos)):
+        mensagem_sismos.invalidar()
+
+    return eventos, nova_marca
+
+# ------------------------ PROCESSAMENTO DOS EVENTOS -------------------------
+
+def _atualizar_marca(eventos: list, arquivo: str = ARQUIVO_MARCA):
+    # Avança a marca com eventos recebidos fora da consulta incremental (stream)
+    estado = carregar_estado_marca(arquivo)
+    if estado is not None and estado.cursor is not None:
+        # A recuperação ainda está a meio: avançar a marca saltaria os sismos que faltam
+        return
+    marca = estado.lastupdate if estado else None
+    for sismo in eventos:
+        atualizado = ler_data(sismo.atualizado) or ler_data(sismo.data)
+        if atualizado and (marca is None or atualizado > marca):
+            marca = atualizado
+    if marca is not None:
+        guardar_marca(marca, arquivo)
+
+async def processar_sismos(bot, eventos: list):
+    """
+    Coloca na fila persistente o alerta dos eventos ainda não notificados
+    (um por canal) e lança o envio em segundo plano.
+    """
+    sismos_notificados = carregar_sismos_notificados()
+    fila = obter_fila()
+    canais = CONFIG.canais_alerta_sismos
+    novos = 0
+
+    for sismo in eventos:
+        # Eventos atualizados que já foram notificados não voltam a ser enviados
+        if sismo.id in sismos_notificados:
+            continue
+
+        # Só é marcado como notificado depois de estar guardado na fila
+        novos += fila.enfileirar(
+            f"sismo:{sismo.id}", canais, formatar_alerta_sismo(sismo),
+            parse_mode="Markdown", disable_web_page_preview=True,
+        )
+        sismos_notificados.adicionar(sismo.id)
 
-def guardar_sismos_notificados(sismos_set):
-    with open(ARQUIVO_SISMOS, "w", encoding="utf-8") as f:
-        json.dump(list(sismos_set), f, ensure_ascii=False, indent=2)
+    if novos:
+        agendar_drenagem(bot)
 
 # ------------------------ FUNÇÃO PRINCIPAL DE ALERTA -------------------------
 
+async def _verificar_sismos_graves(bot):
+    carregar_sismos_notificados().expirar()
+
+    # A mesma consulta serve os canais e as subscrições (magnitude mínima entre todos)
+    motor = obter_motor()
+    min_magnitude = CONFIG.min_magnitude_alerta
+    if motor.tem_sismos():
+        min_magnitude = min(min_magnitude, motor.min_magnitude_sismos())
+
+    params = {"minmag": str(min_magnitude)}
+    eventos, nova_marca = await obter_eventos_incrementais(params, ARQUIVO_MARCA)
+
+    await processar_sismos(bot, [sismo for sismo in eventos if (sismo.magnitude or 0) >= CONFIG.min_magnitude_alerta])
+    await processar_sismos_subscricoes(bot, eventos)
+    if nova_marca is not None:
+        guardar_marca(nova_marca, ARQUIVO_MARCA)
+
+@apenas_lider
+@medir_job
+@saltar_se_indisponivel(CONFIG.sismos_api)
 async def verificar_sismos_graves(context: ContextTypes.DEFAULT_TYPE):
-    bot = context.bot
-    sismos_notificados = carregar_sismos_notificados()
+    try:
+        await _verificar_sismos_graves(context.bot)
+    except Exception:
+        logger.exception("Erro ao verificar sismos")
+
+# ------------------------ HISTÓRICO LOCAL ------------------------------------
+
+@apenas_lider
+@medir_job
+@saltar_se_indisponivel(CONFIG.sismos_api)
+async def verificar_historico_sismos(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Mantém o histórico local completo para magnitudes >= HISTORICO_MIN_MAGNITUDE
+    (todo o mundo), com a mesma consulta incremental dos alertas.
+    """
+    try:
+        agora = datetime.now(timezone.utc)
+        # Na primeira consulta o histórico começa na janela inicial; depois só avança
+        inicio = agora - timedelta(hours=CONFIG.sismos_janela_inicial) if carregar_marca(ARQUIVO_MARCA_HISTORICO) is None else agora
+
+        params = {"minmag": str(CONFIG.historico_min_magnitude)}
+        eventos, nova_marca = await obter_eventos_incrementais(params, ARQUIVO_MARCA_HISTORICO)
+
+        # Com a consulta cortada pelo limite de páginas, só está completo até ao último sismo recebido
+        fim = agora.timestamp()
+        if len(eventos) >= CONFIG.sismos_pagina * CONFIG.sismos_max_paginas:
+            fim = min(fim, (eventos[-1].instante or inicio.timestamp()) - 1)
+
+        historico = obter_historico()
+        historico.registar_cobertura(min(inicio.timestamp(), fim), fim)
+        historico.limpar()
+        if nova_marca is not None:
+            guardar_marca(nova_marca, ARQUIVO_MARCA_HISTORICO)
+    except Exception:
+        logger.exception("Erro ao atualizar o histórico de sismos")
+
+def agendar_historico_sismos(job_queue) -> None:
+    job_queue.run_repeating(verificar_historico_sismos, interval=CONFIG.historico_intervalo, first=5, name="historico_sismos")
 
+# ------------------------ STREAM EM TEMPO REAL (WEBSOCKET) -------------------
+
+async def _tratar_mensagem_stream(bot, texto: str):
+    # Mensagens do SeismicPortal: {"action": "create" | "update", "data": <Feature>}
     try:
-        params = {
-            "format": "json",
-            "minmag": str(MIN_MAGNITUDE_ALERTA),
-            "limit": "10",
-            "orderby": "time",
-            "end": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
-        }
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(SISMOS_API, params=params) as resposta:
-                if resposta.status != 200:
-                    print(f"[Erro] Código de resposta HTTP: {resposta.status}")
-                    return
-
-                dados = await resposta.json()
-
-                for sismo in dados.get("features", []):
-                    props = sismo.get("properties", {})
-                    geo = sismo.get("geometry", {})
-
-                    sismo_id = props.get("unid")  # Correção aqui
-                    if not sismo_id or sismo_id in sismos_notificados:
-                        continue
-
-                    mag = props.get("mag", 0)
-                    magtype = props.get("magtype", "?")
-                    profundidade = props.get("depth", "?")
-                    lugar = props.get("flynn_region", "Desconhecido")
-                    datahora = props.get("time", "")[:16].replace("T", " ")
-                    latitude = geo.get("coordinates", [None, None])[1]
-                    longitude = geo.get("coordinates", [None, None])[0]
-
-                    if latitude and longitude:
-                        link_mapa = f"https://www.google.com/maps/search/?api=1&query={latitude},{longitude}"
-                        mapa_texto = f"🗺️ [Ver no mapa]({link_mapa})"
-                    else:
-                        mapa_texto = "🗺️ Localização desconhecida"
-
-                    mensagem = (
-                        f"🚨 *Sismo de Grande Magnitude Detetado!*\n\n"
-                        f"📍 *{lugar}*\n"
-                        f"🕒 Hora: {datahora} UTC\n"
-                        f"💥 Magnitude: {magtype} *{mag}*\n"
-                        f"📏 Profundidade: {profundidade} Km\n"
-                        f"{mapa_texto}\n"
-                    )
-
-                    for canal_id in CHANNEL_IDS:
-                        try:
-                            await bot.send_message(
-                                chat_id=int(canal_id),
-                                text=mensagem,
-                                parse_mode="Markdown",
-                                disable_web_page_preview=True
-                            )
-                        except Exception as e:
-                            print(f"[Erro ao enviar para canal {canal_id}]: {e}")
-
-                    sismos_notificados.add(sismo_id)
-
-                guardar_sismos_notificados(sismos_notificados)
-
-    except Exception as erro:
-        print(f"[Erro ao verificar sismos]: {erro}")
+        mensagem = json.loads(texto)
+    except json.JSONDecodeError:
+        logger.warning("Mensagem inválida no stream de sismos: %s", texto[:100])
+        return
+
+    dados = mensagem.get("data")
+    if mensagem.get("action") not in ("create", "update") or not isinstance(dados, dict):
+        return
+    sismo = Sismo.de_feature(dados)
+    if sismo is None:
+        return
+
+    obter_historico().guardar([sismo])
+    if afeta_mensagem_sismos(sismo):
+        mensagem_sismos.invalidar()
+    if (sismo.magnitude or 0) >= CONFIG.min_magnitude_alerta:
+        await processar_sismos(bot, [sismo])
+    await processar_sismos_subscricoes(bot, [sismo])
+    _atualizar_marca([sismo], ARQUIVO_MARCA)
+
+async def consumir_stream_sismos(bot):
+    """
+    Mantém a ligação ao stream do SeismicPortal, com heartbeats e reconexão
+    com backoff exponencial. Em cada (re)ligação, os eventos perdidos enquanto
+    a ligação esteve em baixo são recuperados pela API REST (consulta incremental).
+    Com vários processos, só o líder dos alertas mantém a ligação: a liderança
+    é confirmada ao ligar e, depois, basta o arrendamento (renovado pelo job
+    da liderança) para cada mensagem.
+    """
+    espera = 1
+    while True:
+        if not await lideranca_alertas.confirmar():
+            await asyncio.sleep(CONFIG.lider_renovar)
+            continue
+        try:
+            session = obter_sessao()
+            async with session.ws_connect(CONFIG.sismos_ws_url, heartbeat=CONFIG.sismos_ws_heartbeat) as ws:
+                logger.info("Ligado ao stream de sismos: %s", CONFIG.sismos_ws_url)
+                espera = 1
+
+                try:
+                    await _verificar_sismos_graves(bot)
+                except Exception:
+                    logger.exception("Erro ao recuperar sismos em falta")
+
+                async for msg in ws:
+                    if not lideranca_alertas.lider:
+                        logger.info("Liderança perdida: a desligar do stream de sismos")
+                        break
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        await _tratar_mensagem_stream(bot, msg.data)
+                    elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+
+            logger.warning("Ligação ao stream de sismos terminada")
+        except asyncio.CancelledError:
+            raise
+        except Exception as erro:
+            logger.error("Erro no stream de sismos: %s", erro)
+
+        await asyncio.sleep(espera + random.uniform(0, 1))
+        espera = min(espera * 2, CONFIG.sismos_ws_espera_max)
+
+# ------------------------ ARRANQUE DOS ALERTAS -------------------------------
+
+_tarefa_stream = None
+
+async def iniciar_alertas_sismos(application):
+    """
+    Inicia os alertas no modo configurado (SISMOS_MODO): "stream" liga ao
+    WebSocket; "polling" (por defeito) agenda a verificação periódica.
+    """
+    global _tarefa_stream
+    # Envia o que ficou na fila (ex.: antes de um reinício) e depois periodicamente
+    application.job_queue.run_repeating(drenar_fila_alertas, interval=CONFIG.fila_intervalo, first=1, name="fila_alertas")
+
+    if CONFIG.sismos_modo == "stream":
+        _tarefa_stream = asyncio.create_task(consumir_stream_sismos(application.bot))
+    else:
+        application.job_queue.run_repeating(
+            verificar_sismos_graves, interval=CONFIG.intervalo_verificacao, first=10, name="alerta_sismos"
+        )
+
+async def parar_alertas_sismos(application=None):
+    global _tarefa_stream
+    if _tarefa_stream is not None:
+        _tarefa_stream.cancel()
+        try:
+            await _tarefa_stream
+        except asyncio.CancelledError:
+            pass
+        _tarefa_stream = None
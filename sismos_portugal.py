@@ -0,0 +1,75 @@
+# Ficheiro: sismos_portugal.py
+# Alertas de sismos em Portugal (continente, Açores e Madeira), por região
+
+import logging
+from telegram.ext import ContextTypes
+
+from config import CONFIG
+from dedup import obter_registo
+from estado_partilhado import apenas_lider
+from fila_alertas import obter_fila, agendar_drenagem
+from metricas import medir_job
+from regioes import REGIOES, INDICE_REGIOES
+from resiliencia import saltar_se_indisponivel
+from sismos_alerta import obter_eventos_incrementais, formatar_alerta_sismo, guardar_marca
+
+# ---------------------- CONFIGURAÇÃO DE LOGS ---------------------------------
+
+logger = logging.getLogger(__name__)
+
+# ---------------------- CONFIGURAÇÕES ----------------------------------------
+
+ARQUIVO_SISMOS_PORTUGAL = "sismos_portugal_notificados.json"  # formato antigo, importado na 1ª vez
+ARQUIVO_MARCA_PORTUGAL = "sismos_portugal_marca.json"
+
+# ---------------------- FUNÇÃO PRINCIPAL DE ALERTA ---------------------------
+
+async def processar_sismos_portugal(bot, eventos: list):
+    """Coloca na fila o alerta de cada sismo para os canais da região onde ocorreu."""
+    notificados = obter_registo("portugal", importar_de=ARQUIVO_SISMOS_PORTUGAL)
+    fila = obter_fila()
+    novos = 0
+
+    for sismo in eventos:
+        if sismo.id in notificados or sismo.latitude is None or sismo.longitude is None:
+            continue
+
+        mag = sismo.magnitude or 0
+        candidatas = INDICE_REGIOES.procurar(sismo.latitude, sismo.longitude)
+        regioes = [regiao for regiao in candidatas if mag >= regiao.min_magnitude]
+        if not regioes:
+            continue
+
+        for regiao in regioes:
+            novos += fila.enfileirar(
+                f"portugal:{sismo.id}", regiao.canais,
+                formatar_alerta_sismo(sismo, titulo=f"🇵🇹 *Sismo em Portugal - {regiao.nome}*"),
+                parse_mode="Markdown", disable_web_page_preview=True,
+            )
+        notificados.adicionar(sismo.id)
+
+    if novos:
+        agendar_drenagem(bot)
+
+@apenas_lider
+@medir_job
+@saltar_se_indisponivel(CONFIG.sismos_api)
+async def verificar_sismos_portugal(context: ContextTypes.DEFAULT_TYPE):
+    """Um único pedido (caixa de todas as regiões) serve todas as regras regionais."""
+    try:
+        obter_registo("portugal", importar_de=ARQUIVO_SISMOS_PORTUGAL).expirar()
+
+        params = {
+            **INDICE_REGIOES.caixa_total(),
+            "minmag": str(min(regiao.min_magnitude for regiao in REGIOES)),
+        }
+        eventos, nova_marca = await obter_eventos_incrementais(params, ARQUIVO_MARCA_PORTUGAL)
+
+        await processar_sismos_portugal(context.bot, eventos)
+        if nova_marca is not None:
+            guardar_marca(nova_marca, ARQUIVO_MARCA_PORTUGAL)
+    except Exception:
+        logger.exception("Erro ao verificar sismos em Portugal")
+
+def agendar_alertas_portugal(job_queue) -> None:
+    job_queue.run_repeating(verificar_sismos_portugal, interval=CONFIG.intervalo_verificacao, first=20, name="alerta_sismos_portugal")
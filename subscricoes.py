@@ -0,0 +1,335 @@
+# Ficheiro: subscricoes.py
+# Subscrições de alertas por utilizador (sismos perto de uma localidade, fogos por distrito)
+
+import math
+import time
+import logging
+from dataclasses import dataclass, replace
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from base_dados import ligar
+from config import CONFIG
+from dedup import obter_registo
+from fila_alertas import obter_fila, agendar_drenagem
+from indice_locais import distritos, normalizar, procurar_localidades
+from metricas import medir_handler
+from sismos import MAGNITUDE_MAX, formatar_alerta_sismo
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+# Tamanhos das células da grelha, em graus (1° ~ 111 km de latitude): cada subscrição usa
+# o mais pequeno em que o seu círculo cabe em MAX_CELULAS células, para que um raio grande
+# não ocupe centenas de células
+TAMANHOS_CELULA = (1.0, 5.0, 20.0)
+MAX_CELULAS = 16
+RAIO_TERRA_KM = 6371.0
+
+# ------------------------- MODELO -----------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class Subscricao:
+    id: int
+    chat_id: int
+    tipo: str  # "sismo" ou "fogo"
+    min_magnitude: float | None = None
+    latitude: float | None = None
+    longitude: float | None = None
+    raio_km: float | None = None
+    local: str | None = None
+    distrito: str | None = None  # normalizado
+
+    def valida(self) -> bool:
+        """Se os campos permitem indexá-la (ex.: magnitude e raio finitos, dentro dos limites)."""
+        if self.tipo == "fogo":
+            return bool(self.distrito)
+        if self.tipo != "sismo":
+            return False
+        valores = (self.min_magnitude, self.latitude, self.longitude, self.raio_km)
+        if not all(isinstance(valor, (int, float)) and math.isfinite(valor) for valor in valores):
+            return False
+        return 0 <= self.min_magnitude <= MAGNITUDE_MAX and self.raio_km > 0 and -90 <= self.latitude <= 90
+
+    def descricao(self) -> str:
+        if self.tipo == "sismo":
+            return f"Sismos M≥{self.min_magnitude:g} a menos de {self.raio_km:g} km de {self.local}"
+        return f"Incêndios no distrito de {distritos().get(self.distrito, self.distrito)}"
+
+# ------------------------- FUNÇÕES AUXILIARES -----------------------------
+
+def distancia_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distância (haversine) entre dois pontos, em km."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(a))
+
+def _celula(lat: float, lon: float, tamanho: float) -> tuple:
+    return tamanho, math.floor(lat / tamanho), math.floor(lon / tamanho)
+
+def _celulas_do_circulo(lat: float, lon: float, raio_km: float) -> list:
+    # Todas as células que intersetam o quadrado que envolve o círculo
+    dlat = raio_km / 111.0
+    dlon = min(raio_km / (111.0 * max(math.cos(math.radians(lat)), 0.01)), 180.0)
+    for tamanho in TAMANHOS_CELULA:
+        _, i_min, j_min = _celula(lat - dlat, lon - dlon, tamanho)
+        _, i_max, j_max = _celula(lat + dlat, lon + dlon, tamanho)
+        if (i_max - i_min + 1) * (j_max - j_min + 1) <= MAX_CELULAS:
+            break
+    return [(tamanho, i, j) for i in range(i_min, i_max + 1) for j in range(j_min, j_max + 1)]
+
+# ------------------------- MOTOR DE SUBSCRIÇÕES ---------------------------
+
+class MotorSubscricoes:
+    """
+    Guarda as subscrições em SQLite e mantém índices em memória:
+    - sismos: grelha espacial em vários tamanhos (célula -> balde de magnitude -> subscrições)
+    - fogos: distrito -> subscrições
+    Cada evento só é comparado com as subscrições da sua célula/distrito.
+    """
+
+    def __init__(self, caminho: str = CONFIG.base_dados):
+        self._ligacao = ligar(caminho)
+        self._ligacao.execute(
+            "CREATE TABLE IF NOT EXISTS subscricoes ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER NOT NULL, tipo TEXT NOT NULL,"
+            " min_magnitude REAL, latitude REAL, longitude REAL, raio_km REAL, local TEXT,"
+            " distrito TEXT, criado REAL NOT NULL)"
+        )
+        self._ligacao.execute("CREATE INDEX IF NOT EXISTS idx_subscricoes_chat ON subscricoes (chat_id)")
+
+        self._versao = None
+        self.sincronizar()
+
+    def _versao_atual(self) -> tuple:
+        # Os IDs nunca são reutilizados (AUTOINCREMENT): qualquer inserção ou remoção muda o par.
+        # As alterações do próprio processo também obrigam a reconstruir (uma vez), o que é raro
+        return self._ligacao.execute("SELECT MAX(id), COUNT(*) FROM subscricoes").fetchone()
+
+    def sincronizar(self) -> None:
+        """Reconstrói os índices se as subscrições foram alteradas por outro processo."""
+        versao = self._versao_atual()
+        if versao == self._versao:
+            return
+        self._por_id = {}
+        self._grelha = {}  # (tamanho, i, j) -> {balde_magnitude: [Subscricao]}
+        self._por_distrito = {}  # distrito -> [Subscricao]
+        linhas = self._ligacao.execute(
+            "SELECT id, chat_id, tipo, min_magnitude, latitude, longitude, raio_km, local, distrito FROM subscricoes"
+        )
+        for linha in linhas:
+            sub = Subscricao(*linha)
+            # Uma linha inválida (ex.: gravada por uma versão antiga) não pode impedir os alertas das outras
+            if not sub.valida():
+                logger.warning("Subscrição #%s inválida ignorada: %s", sub.id, sub)
+                continue
+            self._indexar(sub)
+        self._versao = versao
+
+    # ------------------------- ÍNDICES ------------------------------------
+
+    def _indexar(self, sub: Subscricao) -> None:
+        self._por_id[sub.id] = sub
+        if sub.tipo == "sismo":
+            balde = math.floor(sub.min_magnitude)
+            for celula in _celulas_do_circulo(sub.latitude, sub.longitude, sub.raio_km):
+                self._grelha.setdefault(celula, {}).setdefault(balde, []).append(sub)
+        else:
+            self._por_distrito.setdefault(sub.distrito, []).append(sub)
+
+    def _desindexar(self, sub: Subscricao) -> None:
+        del self._por_id[sub.id]
+        if sub.tipo == "sismo":
+            balde = math.floor(sub.min_magnitude)
+            for celula in _celulas_do_circulo(sub.latitude, sub.longitude, sub.raio_km):
+                self._grelha[celula][balde].remove(sub)
+        else:
+            self._por_distrito[sub.distrito].remove(sub)
+
+    # ------------------------- GESTÃO -------------------------------------
+
+    def do_chat(self, chat_id: int) -> list:
+        return sorted((sub for sub in self._por_id.values() if sub.chat_id == chat_id), key=lambda sub: sub.id)
+
+    def adicionar(self, chat_id: int, tipo: str, **campos) -> Subscricao:
+        """Guarda e indexa a subscrição. Levanta ValueError (sem guardar nada) se for inválida."""
+        sub = Subscricao(0, chat_id, tipo, **campos)
+        if not sub.valida():
+            raise ValueError(f"Subscrição inválida: {sub}")
+        cursor = self._ligacao.execute(
+            "INSERT INTO subscricoes (chat_id, tipo, min_magnitude, latitude, longitude, raio_km, local, distrito, criado)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                chat_id, tipo, campos.get("min_magnitude"), campos.get("latitude"), campos.get("longitude"),
+                campos.get("raio_km"), campos.get("local"), campos.get("distrito"), time.time(),
+            ),
+        )
+        sub = replace(sub, id=cursor.lastrowid)
+        self._indexar(sub)
+        return sub
+
+    def remover(self, chat_id: int, sub_id: int) -> bool:
+        sub = self._por_id.get(sub_id)
+        if sub is None or sub.chat_id != chat_id:
+            return False
+        self._ligacao.execute("DELETE FROM subscricoes WHERE id = ?", (sub_id,))
+        self._desindexar(sub)
+        return True
+
+    def tem_sismos(self) -> bool:
+        return any(sub.tipo == "sismo" for sub in self._por_id.values())
+
+    def min_magnitude_sismos(self) -> float:
+        return min((sub.min_magnitude for sub in self._por_id.values() if sub.tipo == "sismo"), default=0.0)
+
+    # ------------------------- CORRESPONDÊNCIA ----------------------------
+
+    def corresponder_sismo(self, lat: float, lon: float, mag: float) -> set:
+        """Devolve os chats com subscrições que abrangem este sismo."""
+        chats = set()
+        for tamanho in TAMANHOS_CELULA:
+            baldes = self._grelha.get(_celula(lat, lon, tamanho))
+            if not baldes:
+                continue
+            for balde, subs in baldes.items():
+                if balde > mag:
+                    continue
+                for sub in subs:
+                    if (sub.chat_id not in chats and mag >= sub.min_magnitude
+                            and distancia_km(lat, lon, sub.latitude, sub.longitude) <= sub.raio_km):
+                        chats.add(sub.chat_id)
+        return chats
+
+    def corresponder_fogo(self, distrito: str) -> set:
+        """Devolve os chats subscritos ao distrito (os alertas de incêndios são enviados por fogos_alerta)."""
+        return {sub.chat_id for sub in self._por_distrito.get(normalizar(distrito or ""), ())}
+
+_motor = None
+
+def obter_motor() -> MotorSubscricoes:
+    global _motor
+    if _motor is None:
+        _motor = MotorSubscricoes()
+    elif CONFIG.estado_backend != "local":
+        # Vários processos: as subscrições podem ter sido alteradas noutro
+        _motor.sincronizar()
+    return _motor
+
+# ------------------------- COMANDOS DO BOT --------------------------------
+
+AJUDA_SUBSCREVER = (
+    "Utilização:\n"
+    "• `/subscrever sismos <magnitude> <raio_km> <localidade>`\n"
+    "   ex.: `/subscrever sismos 4 200 Lisboa`\n"
+    "• `/subscrever fogos <distrito>`\n"
+    "   ex.: `/subscrever fogos Braga`"
+)
+
+# Comando /subscrever - cria uma subscrição de alertas para este chat
+@medir_handler
+async def subscrever(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    args = context.args or []
+    chat_id = update.effective_chat.id
+    motor = obter_motor()
+
+    if len(motor.do_chat(chat_id)) >= CONFIG.subscricoes_max_por_chat:
+        await update.message.reply_text(f"⚠️ Atingiste o limite de {CONFIG.subscricoes_max_por_chat} subscrições.")
+        return
+
+    tipo = normalizar(args[0]) if args else ""
+
+    if tipo in ("sismo", "sismos") and len(args) >= 4:
+        try:
+            min_magnitude = float(args[1].replace(",", "."))
+            raio_km = float(args[2].replace(",", "."))
+        except ValueError:
+            await update.message.reply_text(AJUDA_SUBSCREVER, parse_mode="Markdown")
+            return
+        # float() aceita "nan" e "inf": só valores finitos dentro dos limites
+        if not (math.isfinite(min_magnitude) and 0 <= min_magnitude <= MAGNITUDE_MAX):
+            await update.message.reply_text(f"⚠️ A magnitude tem de estar entre 0 e {MAGNITUDE_MAX:g}.")
+            return
+        if not 0 < raio_km <= CONFIG.subscricoes_raio_max:
+            await update.message.reply_text(f"⚠️ O raio tem de estar entre 0 e {CONFIG.subscricoes_raio_max:g} km.")
+            return
+
+        nome = " ".join(args[3:])
+        resultados = [loc for loc in procurar_localidades(nome) if loc.latitude is not None]
+        if not resultados:
+            await update.message.reply_text(f"❌ Nenhuma localidade encontrada para \"{nome}\".")
+            return
+        local = resultados[0]
+
+        sub = motor.adicionar(
+            chat_id, "sismo", min_magnitude=min_magnitude, latitude=local.latitude,
+            longitude=local.longitude, raio_km=raio_km, local=local.nome,
+        )
+
+    elif tipo in ("fogo", "fogos") and len(args) >= 2:
+        distrito = normalizar(" ".join(args[1:]))
+        if distrito not in distritos():
+            await update.message.reply_text(f"❌ Distrito desconhecido: {' '.join(args[1:])}")
+            return
+        sub = motor.adicionar(chat_id, "fogo", distrito=distrito)
+
+    else:
+        await update.message.reply_text(AJUDA_SUBSCREVER, parse_mode="Markdown")
+        return
+
+    await update.message.reply_text(f"✅ Subscrição #{sub.id} criada: {sub.descricao()}")
+
+# Comando /subscricoes - lista as subscrições deste chat
+@medir_handler
+async def listar_subscricoes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    subs = obter_motor().do_chat(update.effective_chat.id)
+    if not subs:
+        await update.message.reply_text("Não tens subscrições. Usa /subscrever para criar uma.")
+        return
+    linhas = [f"#{sub.id} - {sub.descricao()}" for sub in subs]
+    await update.message.reply_text("🔔 As tuas subscrições:\n\n" + "\n".join(linhas) + "\n\nPara cancelar: /cancelar_subscricao <número>")
+
+# Comando /cancelar_subscricao <número>
+@medir_handler
+async def cancelar_subscricao(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        sub_id = int((context.args or [""])[0].lstrip("#"))
+    except ValueError:
+        await update.message.reply_text("Utilização: /cancelar_subscricao <número>")
+        return
+
+    if obter_motor().remover(update.effective_chat.id, sub_id):
+        await update.message.reply_text(f"🗑️ Subscrição #{sub_id} cancelada.")
+    else:
+        await update.message.reply_text(f"❌ Não existe a subscrição #{sub_id}.")
+
+# ------------------------- ALERTAS DAS SUBSCRIÇÕES ------------------------
+
+async def processar_sismos_subscricoes(bot, eventos: list):
+    """
+    Coloca na fila o alerta dos sismos que cada subscrição abrange. Chamado
+    pelos alertas de sismos (stream ou consulta incremental), que pedem à API
+    a menor magnitude entre os canais e as subscrições.
+    """
+    motor = obter_motor()
+    notificados = obter_registo("subscricoes_sismos")
+    fila = obter_fila()
+    novos = 0
+
+    for sismo in eventos:
+        if sismo.id in notificados or sismo.latitude is None or sismo.longitude is None or sismo.magnitude is None:
+            continue
+
+        chats = motor.corresponder_sismo(sismo.latitude, sismo.longitude, sismo.magnitude)
+        if chats:
+            novos += fila.enfileirar(
+                f"sub_sismo:{sismo.id}", chats,
+                formatar_alerta_sismo(sismo, titulo="🔔 *Sismo na tua zona*"),
+                parse_mode="Markdown", disable_web_page_preview=True,
+            )
+            notificados.adicionar(sismo.id)
+
+    if novos:
+        agendar_drenagem(bot)
@@ -0,0 +1,49 @@
+# Testes do bot (unittest da biblioteca padrão):
+#   python3 -m unittest discover -s tests -t .
+#
+# A configuração é lida ao importar os módulos do bot, por isso as variáveis
+# de ambiente obrigatórias são definidas aqui, antes de qualquer teste.
+
+import os
+import sys
+import logging
+import tempfile
+import unittest
+
+PASTA_TESTES = tempfile.mkdtemp(prefix="ra_testes_")
+
+for variavel, valor in (
+    ("BOT_TOKEN", "123456:TESTES"),
+    ("IPMA_API", "http://127.0.0.1:9/ipma/"),
+    ("FOGOS_API", "http://127.0.0.1:9/fogos"),
+    ("SISMOS_API", "http://127.0.0.1:9/sismos"),
+    ("ALERTA_SISMOS_CHANNEL_IDS", "-1000000000001"),
+    ("BASE_DADOS", os.path.join(PASTA_TESTES, "testes.db")),
+    ("METRICAS_PORTA", "0"),
+):
+    os.environ.setdefault(variavel, valor)
+
+# Os módulos do bot estão na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Alguns módulos configuram os logs ao importar: nos testes só interessam os resultados
+logging.disable(logging.CRITICAL)
+
+# ------------------------- APIS SIMULADAS ---------------------------------
+
+class TesteComAPIs(unittest.IsolatedAsyncioTestCase):
+    """Arranca as APIs simuladas do benchmark num porto local e uma pasta temporária por teste."""
+
+    async def asyncSetUp(self):
+        from benchmark import APIsSimuladas, _servir
+
+        self.apis = APIsSimuladas(atraso=0, erros=0, total_fogos=0, total_sismos=0)
+        self.runner, porta = await _servir(self.apis.aplicacao())
+        self.url_apis = f"http://127.0.0.1:{porta}"
+        self.pasta = tempfile.mkdtemp(dir=PASTA_TESTES)
+
+    async def asyncTearDown(self):
+        import http_cliente
+
+        await http_cliente.fechar_cliente_http()
+        await self.runner.cleanup()
@@ -0,0 +1,36 @@
+# Registo dos alertas já enviados: consultas em memória e IDs registados por outros processos
+
+import os
+import unittest
+from unittest import mock
+
+import tests
+from dedup import RegistoNotificados
+
+
+class RegistoNotificadosTeste(unittest.TestCase):
+    def setUp(self):
+        self.caminho = os.path.join(tests.PASTA_TESTES, f"dedup_{os.urandom(4).hex()}.db")
+
+    def test_consulta_nao_usa_a_base_de_dados(self):
+        registo = RegistoNotificados("sismos", self.caminho)
+        registo.adicionar("a")
+        with mock.patch.object(registo, "_ligacao") as ligacao:
+            self.assertIn("a", registo)
+            self.assertNotIn("b", registo)
+        ligacao.execute.assert_not_called()
+
+    def test_ids_de_outro_processo_chegam_ao_sincronizar(self):
+        registo = RegistoNotificados("sismos", self.caminho)
+        outro = RegistoNotificados("sismos", self.caminho)
+        outro.adicionar("a")
+        RegistoNotificados("portugal", self.caminho).adicionar("b")
+
+        self.assertNotIn("a", registo)
+        registo.sincronizar()
+        self.assertIn("a", registo)
+        self.assertNotIn("b", registo)
+
+    def test_carrega_os_ids_guardados(self):
+        RegistoNotificados("sismos", self.caminho).adicionar("a")
+        self.assertIn("a", RegistoNotificados("sismos", self.caminho))
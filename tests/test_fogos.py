@@ -0,0 +1,65 @@
+# Páginas e filtros do /fogos: callback_data dos botões e filtros pedidos no comando
+
+import unittest
+from unittest import mock
+
+import tests  # noqa: F401 (configuração do ambiente)
+import handlers
+from benchmark import _gerar_fogos
+from fogos import FiltroFogos, FotografiaFogos
+from modelos import Fogo
+
+
+class CallbackFogosTeste(unittest.TestCase):
+    def test_ida_e_volta(self):
+        filtros = (
+            FiltroFogos(),
+            FiltroFogos("braga", "em curso", 50),
+            FiltroFogos("vila_real", "em_resolucao", 10),
+            FiltroFogos("", "a_b_c", 0),
+            FiltroFogos("_", "", 100),
+        )
+        for filtro in filtros:
+            for vista, pagina in (("p", 0), ("p", 12), ("d", 0), ("e", 3)):
+                with self.subTest(filtro=filtro, vista=vista):
+                    dados = filtro.callback(vista, pagina)
+                    self.assertLessEqual(len(dados.encode("utf-8")), 64)  # limite do Telegram
+                    self.assertEqual(FiltroFogos.de_callback(dados), (vista, pagina, filtro))
+
+    def test_callback_invalido(self):
+        for dados in ("fogos_p_0_0_em curso_braga", "fogos_p_0_0_99_braga", "fogos_p_x_0_0_"):
+            with self.subTest(dados=dados), self.assertRaises(ValueError):
+                FiltroFogos.de_callback(dados)
+
+
+class FiltroComandoFogosTeste(unittest.TestCase):
+    def setUp(self):
+        # Só incêndios "Em Curso" e "Conclusão" na fotografia
+        fogos = [Fogo.de_api(fogo) for fogo in _gerar_fogos(20) if fogo["status"] in ("Em Curso", "Conclusão")]
+        self.fotografia = FotografiaFogos(fogos)
+        patcher = mock.patch.object(handlers, "distritos", return_value={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_estado_valido_sem_incendios_mostra_a_lista_vazia(self):
+        filtro = handlers.filtro_fogos(self.fotografia, ["vigilancia"])
+
+        self.assertEqual(filtro, FiltroFogos(estado="vigilancia"))
+        texto, _ = self.fotografia.pagina(filtro)
+        self.assertIn("Sem incêndios ativos com estes filtros (estado: Vigilância)", texto)
+
+    def test_estado_com_incendios_e_operacionais(self):
+        self.assertEqual(
+            handlers.filtro_fogos(self.fotografia, ["Em", "Curso", "50"]), FiltroFogos(estado="em curso", min_operacionais=50)
+        )
+
+    def test_algarismos_nao_decimais_sao_parte_do_nome(self):
+        self.assertIsNone(handlers.filtro_fogos(self.fotografia, ["²"]))
+        self.assertEqual(handlers.filtro_fogos(self.fotografia, ["٥٠"]), FiltroFogos(min_operacionais=50))
+
+    def test_nome_desconhecido(self):
+        self.assertIsNone(handlers.filtro_fogos(self.fotografia, ["marte"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
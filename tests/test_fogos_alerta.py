@@ -0,0 +1,36 @@
+# Diferenças entre verificações dos incêndios: chaves dos alertas na fila
+
+import os
+import unittest
+
+import tests  # noqa: F401 (configuração do ambiente)
+from fogos_alerta import calcular_diferencas, carregar_fotografia, guardar_fotografia
+from modelos import Fogo
+
+
+def _fogo(estado: str, operacionais: int = 0) -> Fogo:
+    return Fogo("1", "Local", "Braga", "Braga", "Sé", estado, "Mato", "01-08-2025", "12:00",
+                operacionais, 0, 0, None, None)
+
+
+class DiferencasFogosTeste(unittest.TestCase):
+    def test_chave_nova_quando_o_estado_se_repete(self):
+        fotografia = {}
+        chaves = []
+        for estado in ("Em Curso", "Em Resolução", "Em Curso", "Em Resolução"):
+            alteracoes, fotografia = calcular_diferencas(fotografia, [_fogo(estado)])
+            chaves.extend(alteracao.chave for alteracao in alteracoes)
+        self.assertEqual(chaves, ["fogo:1:novo", "fogo:1:1", "fogo:1:2", "fogo:1:3"])
+
+    def test_comparacao_repetida_da_a_mesma_chave(self):
+        _, anterior = calcular_diferencas({}, [_fogo("Em Curso")])
+        primeira, _ = calcular_diferencas(anterior, [_fogo("Em Resolução")])
+        repetida, _ = calcular_diferencas(anterior, [_fogo("Em Resolução")])
+        self.assertEqual([a.chave for a in primeira], [a.chave for a in repetida])
+
+    def test_fotografia_guardada(self):
+        _, fotografia = calcular_diferencas({}, [_fogo("Em Curso", 40)])
+        arquivo = os.path.join(tests.PASTA_TESTES, "fogos_fotografia.json")
+        guardar_fotografia(fotografia, arquivo)
+        self.assertEqual(carregar_fotografia(arquivo), fotografia)
+        self.assertFalse(os.path.exists(f"{arquivo}.tmp"))
@@ -0,0 +1,76 @@
+# Histórico local dos sismos: cobertura registada pelo job e pesquisa do /sismos com filtros
+
+import os
+import time
+import unittest
+from dataclasses import replace
+from types import SimpleNamespace
+from unittest import mock
+
+from tests import TesteComAPIs
+
+import sismos
+import sismos_alerta
+from benchmark import _gerar_sismo
+from config import CONFIG
+from historico import HistoricoSismos
+from modelos import Sismo, ler_data
+
+
+class HistoricoTeste(TesteComAPIs):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.historico = HistoricoSismos(os.path.join(self.pasta, "historico.db"))
+        configuracao = replace(CONFIG, sismos_api=f"{self.url_apis}/sismos", sismos_pagina=5, sismos_max_paginas=2)
+        self.addCleanup(mock.patch.stopall)
+        for modulo in (sismos, sismos_alerta):
+            mock.patch.object(modulo, "CONFIG", configuracao).start()
+            mock.patch.object(modulo, "obter_historico", return_value=self.historico).start()
+        mock.patch.object(sismos_alerta, "ARQUIVO_MARCA_HISTORICO", os.path.join(self.pasta, "marca.json")).start()
+        self.pedidos_api = mock.patch.object(self.apis, "filtrar_sismos", wraps=self.apis.filtrar_sismos).start()
+
+    async def test_cobertura_para_no_ultimo_sismo_recebido(self):
+        # 23 sismos nas últimas 23 horas: a primeira verificação só traz os 10 mais antigos
+        self.apis.sismos = [_gerar_sismo(i, 5.0, (23 - i) * 3600) for i in range(23)]
+
+        await sismos_alerta.verificar_historico_sismos(SimpleNamespace(bot=None, job=None))
+
+        inicio, fim = self.historico.intervalo_coberto(0, 5.0)
+        self.assertIsNotNone(fim)
+        self.assertLess(fim, Sismo.de_feature(self.apis.sismos[10]).instante)
+
+        # As verificações seguintes trazem o resto e a cobertura chega até agora
+        for _ in range(2):
+            await sismos_alerta.verificar_historico_sismos(SimpleNamespace(bot=None, job=None))
+        self.assertEqual(self.historico.intervalo_coberto(0, 5.0), (inicio, None))
+        self.assertEqual(len(self.historico), 23)
+
+    async def test_pesquisa_pede_a_api_so_o_que_falta(self):
+        self.apis.sismos = [_gerar_sismo(i, 5.0, i * 3600 + 60) for i in range(23)]
+        # O histórico só cobre as últimas 5 horas
+        agora = time.time()
+        self.historico.guardar([Sismo.de_feature(sismo) for sismo in self.apis.sismos[:5]])
+        self.historico.registar_cobertura(agora - 5 * 3600, agora)
+
+        eventos = await sismos.pesquisar_sismos(24, 4.0, limite=50)
+
+        self.assertEqual([sismo.id for sismo in eventos], [f"bench{i}" for i in range(23)])
+        self.assertEqual(self.pedidos_api.call_count, 1)
+        consulta = self.pedidos_api.call_args.args[0]
+        self.assertIn("end", consulta)
+        self.assertAlmostEqual(ler_data(consulta["end"]).timestamp(), agora - 5 * 3600, delta=1)
+
+    async def test_pesquisa_coberta_nao_usa_a_api(self):
+        self.apis.sismos = [_gerar_sismo(i, 5.0, i * 3600 + 60) for i in range(5)]
+        agora = time.time()
+        self.historico.guardar([Sismo.de_feature(sismo) for sismo in self.apis.sismos])
+        self.historico.registar_cobertura(agora - 24 * 3600, agora)
+
+        eventos = await sismos.pesquisar_sismos(12, 4.0, limite=3)
+
+        self.assertEqual([sismo.id for sismo in eventos], ["bench0", "bench1", "bench2"])
+        self.pedidos_api.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
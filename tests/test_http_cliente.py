@@ -0,0 +1,43 @@
+# Leitura de JSON em streaming (http_cliente._LeitorJSON), com o documento partido em blocos
+
+import json
+import unittest
+
+import tests  # noqa: F401 (configuração do ambiente)
+from http_cliente import _LeitorJSON, _iterar_lista
+
+DOCUMENTO = '{"tipo": "x", "features": [1.5, 0.25, -4.5e3, 10, 1E-2, "a,b", true, null, {"mag": [2.75, -3]}], "fim": 0}'
+
+
+class StreamEmBlocos:
+    """Substitui o `aiohttp.StreamReader`: devolve o conteúdo em blocos de `tamanho` bytes."""
+
+    def __init__(self, conteudo: bytes, tamanho: int):
+        self._conteudo = conteudo
+        self._tamanho = tamanho
+
+    async def read(self, n: int = -1) -> bytes:
+        bloco, self._conteudo = self._conteudo[:self._tamanho], self._conteudo[self._tamanho:]
+        return bloco
+
+
+class LeitorJSONTeste(unittest.IsolatedAsyncioTestCase):
+    async def _ler(self, documento: str, tamanho: int, chave: str = "features") -> list:
+        leitor = _LeitorJSON(StreamEmBlocos(documento.encode("utf-8"), tamanho))
+        return [elemento async for elemento in _iterar_lista(leitor, chave)]
+
+    async def test_numeros_partidos_entre_blocos(self):
+        esperado = json.loads(DOCUMENTO)["features"]
+        for tamanho in (1, 2, 3, 7, len(DOCUMENTO)):
+            with self.subTest(tamanho=tamanho):
+                self.assertEqual(await self._ler(DOCUMENTO, tamanho), esperado)
+
+    async def test_lista_na_raiz_terminada_por_numero(self):
+        self.assertEqual(await self._ler("[0.125, 42]", 1, chave=None), [0.125, 42])
+
+    async def test_texto_com_caracteres_de_varios_bytes(self):
+        self.assertEqual(await self._ler('{"features": ["Açores", "São Miguel"]}', 1), ["Açores", "São Miguel"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,21 @@
+# Filtros do /sismos (período, magnitude mínima e região)
+
+import unittest
+
+import tests  # noqa: F401 (configuração do ambiente)
+from sismos import interpretar_filtros
+
+
+class FiltrosSismosTeste(unittest.TestCase):
+    def test_filtros_validos(self):
+        self.assertEqual(interpretar_filtros(["12h", "4,5"]), (12.0, 4.5, None))
+        self.assertEqual(interpretar_filtros(["7d", "0"]), (168.0, 0.0, None))
+
+    def test_magnitude_invalida(self):
+        for magnitude in ("nan", "inf", "-inf", "-1", "10.5", "1e309"):
+            with self.subTest(magnitude=magnitude), self.assertRaises(ValueError):
+                interpretar_filtros(["24h", magnitude])
+
+    def test_periodo_so_com_algarismos_ascii(self):
+        with self.assertRaises(ValueError):
+            interpretar_filtros(["²h"])
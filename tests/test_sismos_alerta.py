@@ -0,0 +1,69 @@
+# Consulta incremental dos sismos contra um SeismicPortal local (benchmark.APIsSimuladas)
+
+import os
+import unittest
+from dataclasses import replace
+from unittest import mock
+
+from tests import TesteComAPIs
+
+import sismos_alerta
+from benchmark import _agora_iso, _gerar_sismo
+from config import CONFIG
+
+
+class ConsultaIncrementalTeste(TesteComAPIs):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        configuracao = replace(CONFIG, sismos_api=f"{self.url_apis}/sismos", sismos_pagina=5, sismos_max_paginas=2)
+        self.addCleanup(mock.patch.stopall)
+        mock.patch.object(sismos_alerta, "CONFIG", configuracao).start()
+        self.marca = os.path.join(self.pasta, "marca.json")
+
+    async def _consultar(self) -> list:
+        eventos, nova_marca = await sismos_alerta.obter_eventos_incrementais({"minmag": "4"}, self.marca)
+        if nova_marca is not None:
+            sismos_alerta.guardar_marca(nova_marca, self.marca)
+        return eventos
+
+    async def test_limite_de_paginas_nao_perde_eventos(self):
+        # 23 sismos na última hora (um por cada 2 minutos), mais do que cabem em 2 páginas de 5
+        self.apis.sismos = [_gerar_sismo(i, 5.0, 3600 - i * 120) for i in range(23)]
+        # Um dos primeiros foi revisto agora: a sua revisão é a mais recente de todas
+        self.apis.sismos[1]["properties"]["lastupdate"] = _agora_iso()
+
+        recebidos = set()
+        for _ in range(4):
+            recebidos.update(sismo.id for sismo in await self._consultar())
+
+        self.assertEqual(recebidos, {f"bench{i}" for i in range(23)})
+
+    async def test_pagina_cheia_com_a_hora_da_marca(self):
+        # 12 sismos com a mesma hora da marca, revistos depois dela (mais do que cabem em 2 páginas de 5)
+        marca = _agora_iso(600)
+        sismos_alerta.guardar_marca(sismos_alerta.ler_data(marca), self.marca)
+        self.apis.sismos = [_gerar_sismo(i, 5.0, 600) for i in range(12)]
+        for sismo in self.apis.sismos:
+            sismo["properties"].update(time=marca, lastupdate=_agora_iso(599))
+        # E 3 sismos mais recentes, que só chegam depois dos anteriores
+        self.apis.sismos += [_gerar_sismo(i, 5.0, 300 - i) for i in range(12, 15)]
+
+        recebidos = [sismo.id for sismo in await self._consultar()]
+        self.assertEqual(len(recebidos), 10)
+        recebidos += [sismo.id for sismo in await self._consultar()]
+
+        self.assertEqual(sorted(recebidos), sorted(f"bench{i}" for i in range(15)))
+        self.assertEqual(await self._consultar(), [])
+
+    async def test_sem_limite_a_marca_e_a_revisao_mais_recente(self):
+        self.apis.sismos = [_gerar_sismo(i, 5.0, 600 - i * 60) for i in range(3)]
+
+        eventos = await self._consultar()
+
+        self.assertEqual([sismo.id for sismo in eventos], ["bench0", "bench1", "bench2"])
+        self.assertEqual(sismos_alerta.carregar_marca(self.marca), sismos_alerta.ler_data(eventos[-1].atualizado))
+        self.assertEqual(await self._consultar(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
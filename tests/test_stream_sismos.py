@@ -0,0 +1,102 @@
+# Stream de sismos (WebSocket) contra um servidor local que faz de SeismicPortal
+
+import json
+import asyncio
+import unittest
+from dataclasses import replace
+from unittest import mock
+from aiohttp import web
+
+from tests import TesteComAPIs
+
+import sismos
+import sismos_alerta
+from benchmark import _gerar_sismo, _servir
+from config import CONFIG
+from estado_partilhado import Lideranca, lideranca_alertas
+from historico import HistoricoSismos
+from modelos import Sismo
+
+
+class StreamSismosTeste(TesteComAPIs):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.mensagens = []
+        self.desligado = asyncio.Event()
+        app = web.Application()
+        app.router.add_get("/ws", self._ws)
+        self.runner_ws, porta = await _servir(app)
+
+        configuracao = replace(
+            CONFIG, sismos_api=f"{self.url_apis}/sismos", sismos_ws_url=f"ws://127.0.0.1:{porta}/ws", min_magnitude_alerta=5.0,
+        )
+        self.addCleanup(mock.patch.stopall)
+        mock.patch.object(sismos_alerta, "CONFIG", configuracao).start()
+        mock.patch.object(sismos_alerta, "ARQUIVO_MARCA", f"{self.pasta}/marca.json").start()
+        mock.patch.object(sismos_alerta, "obter_historico", return_value=HistoricoSismos(f"{self.pasta}/historico.db")).start()
+        self.processar = mock.patch.object(sismos_alerta, "processar_sismos", mock.AsyncMock()).start()
+        self.invalidar = mock.patch.object(sismos_alerta.mensagem_sismos, "invalidar").start()
+        self.confirmar = mock.patch.object(lideranca_alertas, "confirmar", mock.AsyncMock(return_value=True)).start()
+
+        # A mensagem do /sismos mostra 10 sismos, o mais antigo de há 1 hora (entre eles o "mostrado")
+        mostrado = Sismo.de_feature(_gerar_sismo(1, 3.0, 3600))
+        mock.patch.object(sismos, "_mostrados", ({mostrado.id}, mostrado.instante, 10)).start()
+
+    async def asyncTearDown(self):
+        await self.runner_ws.cleanup()
+        await super().asyncTearDown()
+
+    async def _ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        for mensagem in self.mensagens:
+            await ws.send_str(mensagem)
+        # Fica ligado até o cliente desligar (ou o teste acabar)
+        async for _ in ws:
+            pass
+        self.desligado.set()
+        return ws
+
+    def _alertados(self) -> list:
+        # processar_sismos também é chamado (sem eventos) pela recuperação ao ligar
+        return [sismo.id for chamada in self.processar.await_args_list for sismo in chamada.args[1]]
+
+    async def _consumir_ate(self, condicao) -> None:
+        tarefa = asyncio.create_task(sismos_alerta.consumir_stream_sismos(bot=None))
+        try:
+            async with asyncio.timeout(5):
+                while not condicao():
+                    await asyncio.sleep(0.01)
+        finally:
+            tarefa.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await tarefa
+
+    async def test_alerta_e_invalida_so_os_sismos_relevantes(self):
+        self.mensagens = [
+            json.dumps({"action": "create", "data": _gerar_sismo(100, 6.1, 60)}),    # grave e recente
+            json.dumps({"action": "create", "data": _gerar_sismo(101, 1.2, 60)}),    # abaixo do SEISMIC_MINMAG
+            json.dumps({"action": "create", "data": _gerar_sismo(102, 3.0, 7200)}),  # mais antigo que os mostrados
+            "não é JSON",
+            json.dumps({"action": "update", "data": _gerar_sismo(1, 3.4, 3600)}),    # revisão de um sismo mostrado
+        ]
+
+        await self._consumir_ate(lambda: self.invalidar.call_count >= 2)
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(self.invalidar.call_count, 2)
+        self.assertEqual(self._alertados(), ["bench100"])
+        # A liderança só é confirmada ao ligar; as mensagens usam o arrendamento
+        self.confirmar.assert_awaited_once()
+
+    async def test_desliga_quando_perde_a_lideranca(self):
+        self.mensagens = [json.dumps({"action": "create", "data": _gerar_sismo(100, 6.1, 60)})]
+
+        with mock.patch.object(Lideranca, "lider", new_callable=mock.PropertyMock, return_value=False):
+            await self._consumir_ate(self.desligado.is_set)
+
+        self.assertEqual(self._alertados(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+# Subscrições de sismos: grelha com vários tamanhos de célula e alertas vindos dos alertas de sismos
+
+import os
+import json
+import unittest
+from types import SimpleNamespace
+from dataclasses import replace
+from unittest import mock
+
+import tests
+from tests import TesteComAPIs
+
+import sismos_alerta
+import subscricoes
+from benchmark import _gerar_sismo
+from config import CONFIG
+from historico import HistoricoSismos
+from subscricoes import MAX_CELULAS, MotorSubscricoes, _celulas_do_circulo
+
+
+def _caminho() -> str:
+    return os.path.join(tests.PASTA_TESTES, f"subscricoes_{os.urandom(4).hex()}.db")
+
+
+def _motor() -> MotorSubscricoes:
+    return MotorSubscricoes(_caminho())
+
+
+class GrelhaSubscricoesTeste(unittest.TestCase):
+    def test_raio_grande_ocupa_poucas_celulas(self):
+        for raio_km in (10, 100, 300, 1000, 2000):
+            with self.subTest(raio_km=raio_km):
+                self.assertLessEqual(len(_celulas_do_circulo(38.7, -9.1, raio_km)), MAX_CELULAS)
+
+    def test_correspondencia(self):
+        motor = _motor()
+        motor.adicionar(1, "sismo", min_magnitude=4.0, latitude=38.7, longitude=-9.1, raio_km=1000, local="Lisboa")
+        motor.adicionar(2, "sismo", min_magnitude=3.0, latitude=38.7, longitude=-9.1, raio_km=50, local="Lisboa")
+
+        self.assertEqual(motor.corresponder_sismo(38.8, -9.0, 4.5), {1, 2})
+        self.assertEqual(motor.corresponder_sismo(38.8, -9.0, 3.5), {2})
+        self.assertEqual(motor.corresponder_sismo(36.0, -17.0, 4.5), {1})  # ~760 km
+        self.assertEqual(motor.corresponder_sismo(32.6, -25.0, 6.0), set())  # ~1580 km
+
+        motor.remover(1, 1)
+        self.assertEqual(motor.corresponder_sismo(36.0, -17.0, 4.5), set())
+
+
+class ValidacaoSubscricoesTeste(unittest.IsolatedAsyncioTestCase):
+    async def test_magnitude_invalida_nao_e_guardada(self):
+        motor = _motor()
+        for magnitude in ("nan", "inf", "-inf", "-1", "11"):
+            with self.subTest(magnitude=magnitude):
+                resposta = mock.AsyncMock()
+                update = SimpleNamespace(effective_chat=SimpleNamespace(id=1), message=SimpleNamespace(reply_text=resposta))
+                context = SimpleNamespace(args=["sismos", magnitude, "10", "Lisboa"])
+                with mock.patch.object(subscricoes, "obter_motor", return_value=motor):
+                    await subscricoes.subscrever(update, context)
+                self.assertIn("magnitude", resposta.await_args.args[0])
+        self.assertEqual(motor.do_chat(1), [])
+        self.assertEqual(motor._versao_atual(), (None, 0))
+
+    def test_adicionar_recusa_valores_nao_finitos(self):
+        motor = _motor()
+        for campos in ({"min_magnitude": float("nan"), "raio_km": 10.0}, {"min_magnitude": 4.0, "raio_km": float("inf")}):
+            with self.subTest(campos=campos), self.assertRaises(ValueError):
+                motor.adicionar(1, "sismo", latitude=38.7, longitude=-9.1, local="Lisboa", **campos)
+        self.assertEqual(motor._versao_atual(), (None, 0))
+
+    def test_linha_invalida_e_ignorada_ao_carregar(self):
+        caminho = _caminho()
+        motor = MotorSubscricoes(caminho)
+        motor.adicionar(1, "sismo", min_magnitude=4.0, latitude=38.7, longitude=-9.1, raio_km=100, local="Lisboa")
+        # NaN é gravado como NULL pelo SQLite
+        motor._ligacao.execute(
+            "INSERT INTO subscricoes (chat_id, tipo, min_magnitude, latitude, longitude, raio_km, local, criado)"
+            " VALUES (2, 'sismo', NULL, 38.7, -9.1, 10, 'Lisboa', 0)"
+        )
+
+        recarregado = MotorSubscricoes(caminho)
+
+        self.assertEqual([sub.chat_id for sub in recarregado.do_chat(1)], [1])
+        self.assertEqual(recarregado.do_chat(2), [])
+        self.assertEqual(recarregado.min_magnitude_sismos(), 4.0)
+        self.assertEqual(recarregado.corresponder_sismo(38.7, -9.1, 5.0), {1})
+
+
+class AlertasSubscricoesTeste(TesteComAPIs):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        configuracao = replace(CONFIG, sismos_api=f"{self.url_apis}/sismos", min_magnitude_alerta=5.0)
+        self.motor = _motor()
+        self.addCleanup(mock.patch.stopall)
+        mock.patch.object(sismos_alerta, "CONFIG", configuracao).start()
+        mock.patch.object(sismos_alerta, "ARQUIVO_MARCA", os.path.join(self.pasta, "marca.json")).start()
+        mock.patch.object(sismos_alerta, "obter_historico", return_value=HistoricoSismos(f"{self.pasta}/historico.db")).start()
+        mock.patch.object(sismos_alerta, "obter_motor", return_value=self.motor).start()
+        self.canais = mock.patch.object(sismos_alerta, "processar_sismos", mock.AsyncMock()).start()
+        self.subscricoes = mock.patch.object(sismos_alerta, "processar_sismos_subscricoes", mock.AsyncMock()).start()
+
+    @staticmethod
+    def _ids(chamada) -> list:
+        return [sismo.id for sismo in chamada.args[1]]
+
+    async def test_consulta_incremental_serve_as_subscricoes(self):
+        self.motor.adicionar(1, "sismo", min_magnitude=3.0, latitude=30.0, longitude=-30.0, raio_km=100, local="Mar")
+        self.apis.sismos = [_gerar_sismo(0, 3.5, 120), _gerar_sismo(1, 5.5, 60), _gerar_sismo(2, 2.5, 30)]
+
+        await sismos_alerta._verificar_sismos_graves(None)
+
+        self.assertEqual(self._ids(self.canais.await_args), ["bench1"])
+        self.assertEqual(sorted(self._ids(self.subscricoes.await_args)), ["bench0", "bench1"])
+
+    async def test_stream_serve_as_subscricoes(self):
+        mensagem = json.dumps({"action": "create", "data": _gerar_sismo(0, 3.5, 0)})
+
+        await sismos_alerta._tratar_mensagem_stream(None, mensagem)
+
+        self.canais.assert_not_awaited()
+        self.assertEqual(self._ids(self.subscricoes.await_args), ["bench0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+# Servidor do modo webhook: validação do segredo
+
+import unittest
+from aiohttp.test_utils import TestClient, TestServer
+
+import tests  # noqa: F401 (configuração do ambiente)
+from webhook import CABECALHO_SEGREDO, ServidorWebhook
+
+
+class SegredoWebhookTeste(unittest.IsolatedAsyncioTestCase):
+    def test_nao_arranca_sem_segredo(self):
+        for segredo in ("", None):
+            with self.subTest(segredo=segredo), self.assertRaises(ValueError):
+                ServidorWebhook(application=None, segredo=segredo)
+
+    async def test_recusa_pedidos_sem_o_segredo_certo(self):
+        servidor = ServidorWebhook(application=None, caminho="/telegram", segredo="certo")
+        async with TestClient(TestServer(servidor.aplicacao_web())) as cliente:
+            for cabecalhos in ({}, {CABECALHO_SEGREDO: ""}, {CABECALHO_SEGREDO: "errado"}):
+                with self.subTest(cabecalhos=cabecalhos):
+                    resposta = await cliente.post("/telegram", json={"update_id": 1}, headers=cabecalhos)
+                    self.assertEqual(resposta.status, 403)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+# Ficheiro: webhook.py
+# Modo webhook: servidor aiohttp que recebe os updates do Telegram e os processa em paralelo
+
+import os
+import hmac
+import json
+import signal
+import asyncio
+import logging
+import multiprocessing
+from aiohttp import web
+from telegram import Update
+
+from config import CONFIG
+from metricas import Contador, registar_coletor
+
+# ------------------------- CONFIGURAÇÃO DE LOGS ---------------------------
+
+logger = logging.getLogger(__name__)
+
+CABECALHO_SEGREDO = "X-Telegram-Bot-Api-Secret-Token"
+
+UPDATES = Contador("ra_webhook_updates_total", "Updates recebidos pelo webhook, por resultado", ("resultado",))
+
+# ------------------------- SERVIDOR WEBHOOK -------------------------------
+
+class ServidorWebhook:
+    """
+    Recebe os updates em POST `caminho` e entrega-os à Application, cada um
+    na sua tarefa (vários updates processados em simultâneo).
+
+    - Pedidos sem o segredo certo (`X-Telegram-Bot-Api-Secret-Token`) são
+      recusados com 403. Sem segredo configurado o servidor não arranca.
+    - No máximo `max_em_curso` updates são processados ao mesmo tempo; um
+      pedido espera até `espera` segundos por vaga e depois recebe 503, para
+      que o Telegram o volte a enviar mais tarde (backpressure).
+    """
+
+    def __init__(
+        self,
+        application,
+        caminho: str = CONFIG.webhook_caminho,
+        segredo: str = CONFIG.webhook_segredo,
+        max_em_curso: int = CONFIG.webhook_max_em_curso,
+        espera: float = CONFIG.webhook_espera,
+    ):
+        if not segredo:
+            # Sem segredo, qualquer pessoa que conheça o URL podia enviar updates falsos
+            raise ValueError("WEBHOOK_SEGREDO é obrigatório no modo webhook")
+        self.application = application
+        self.caminho = caminho
+        self._segredo = segredo.encode("utf-8")
+        self.max_em_curso = max_em_curso
+        self.espera = espera
+        self._vagas = asyncio.Semaphore(max_em_curso)
+        self._tarefas = set()
+        self._runner = None
+
+    @property
+    def em_curso(self) -> int:
+        return len(self._tarefas)
+
+    def aplicacao_web(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.caminho, self._receber)
+        app.router.add_get("/saude", self._saude)
+        return app
+
+    async def iniciar(self, host: str = CONFIG.webhook_host, porta: int = CONFIG.webhook_porta) -> None:
+        self._runner = web.AppRunner(self.aplicacao_web(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, porta).start()
+        _servidores.add(self)
+        logger.info("Webhook à escuta em http://%s:%d%s", host, porta, self.caminho)
+
+    async def parar(self, tempo_max: float = 10) -> None:
+        """Deixa de aceitar updates e espera (até `tempo_max`) pelos que estão a ser processados."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        _servidores.discard(self)
+        if self._tarefas:
+            await asyncio.wait(set(self._tarefas), timeout=tempo_max)
+
+    # ------------------------- PEDIDOS ------------------------------------
+
+    def _segredo_valido(self, request: web.Request) -> bool:
+        recebido = request.headers.get(CABECALHO_SEGREDO, "").encode("utf-8")
+        return hmac.compare_digest(recebido, self._segredo)
+
+    async def _receber(self, request: web.Request) -> web.Response:
+        if not self._segredo_valido(request):
+            UPDATES.inc(resultado="segredo_invalido")
+            return web.Response(status=403)
+
+        try:
+            dados = await request.json()
+            update = Update.de_json(dados, self.application.bot)
+        except (json.JSONDecodeError, UnicodeDecodeError, TypeError, ValueError, KeyError):
+            UPDATES.inc(resultado="invalido")
+            return web.Response(status=400)
+
+        try:
+            await asyncio.wait_for(self._vagas.acquire(), timeout=self.espera)
+        except asyncio.TimeoutError:
+            UPDATES.inc(resultado="recusado")
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        # Responde logo ao Telegram; o update é processado em segundo plano
+        tarefa = asyncio.create_task(self._processar(update))
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+        UPDATES.inc(resultado="aceite")
+        return web.Response(status=200)
+
+    async def _processar(self, update: Update) -> None:
+        try:
+            await self.application.process_update(update)
+        except Exception:
+            logger.exception("Erro ao processar o update %s", update.update_id)
+        finally:
+            self._vagas.release()
+
+    async def _saude(self, request: web.Request) -> web.Response:
+        return web.json_response({"em_curso": self.em_curso, "max_em_curso": self.max_em_curso})
+
+_servidores = set()
+
+def _coletor_webhook() -> list:
+    return [(
+        "ra_webhook_em_curso", "gauge", "Updates do webhook a ser processados",
+        [({}, sum(servidor.em_curso for servidor in _servidores))],
+    )]
+
+registar_coletor(_coletor_webhook)
+
+# ------------------------- EXECUÇÃO (UM PROCESSO) -------------------------
+
+async def registar_webhook(bot, url: str = CONFIG.webhook_url, caminho: str = CONFIG.webhook_caminho) -> None:
+    """Indica ao Telegram para onde enviar os updates (só precisa de ser feito por um processo)."""
+    await bot.set_webhook(
+        url=url.rstrip("/") + caminho,
+        secret_token=CONFIG.webhook_segredo,
+        max_connections=CONFIG.webhook_max_ligacoes,
+        allowed_updates=Update.ALL_TYPES,
+    )
+    logger.info("Webhook registado no Telegram: %s%s", url.rstrip("/"), caminho)
+
+async def servir_webhook(application, trabalhador: int = CONFIG.trabalhador, registar: bool = None) -> None:
+    """
+    Corre a Application em modo webhook até receber SIGINT/SIGTERM: arranca
+    a Application (post_init, job_queue), o servidor na porta
+    WEBHOOK_PORTA + `trabalhador` e, no processo 0, regista o webhook.
+    """
+    if registar is None:
+        registar = trabalhador == 0 and bool(CONFIG.webhook_url)
+
+    parar = asyncio.Event()
+    ciclo = asyncio.get_running_loop()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            ciclo.add_signal_handler(sinal, parar.set)
+        except (NotImplementedError, RuntimeError):  # Windows
+            pass
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    servidor = ServidorWebhook(application)
+    try:
+        await servidor.iniciar(porta=CONFIG.webhook_porta + trabalhador)
+        if registar:
+            await registar_webhook(application.bot)
+        await parar.wait()
+    finally:
+        await servidor.parar()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+# ------------------------- VÁRIOS PROCESSOS -------------------------------
+
+def _executar_trabalhador(criar_aplicacao, trabalhador: int) -> None:
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    asyncio.run(servir_webhook(criar_aplicacao(trabalhador), trabalhador))
+
+def executar_trabalhadores(criar_aplicacao, trabalhadores: int = CONFIG.webhook_trabalhadores) -> None:
+    """
+    Arranca `trabalhadores` processos, cada um com a sua Application
+    (`criar_aplicacao(trabalhador)`, uma função ao nível do módulo) e o seu
+    servidor na porta WEBHOOK_PORTA + N, para ficarem atrás de um proxy
+    local (ex.: nginx) que reparte os pedidos. Só o processo 0 regista o
+    webhook; os jobs de alertas só correm no líder (estado_partilhado.py).
+    """
+    if trabalhadores <= 1:
+        _executar_trabalhador(criar_aplicacao, CONFIG.trabalhador)
+        return
+
+    contexto = multiprocessing.get_context("spawn")
+    processos = []
+    for trabalhador in range(trabalhadores):
+        # Lido pelo config.py do novo processo (portas do webhook e das métricas)
+        os.environ["TRABALHADOR"] = str(trabalhador)
+        processo = contexto.Process(
+            target=_executar_trabalhador, args=(criar_aplicacao, trabalhador), name=f"webhook-{trabalhador}"
+        )
+        processo.start()
+        processos.append(processo)
+    os.environ["TRABALHADOR"] = str(CONFIG.trabalhador)
+
+    try:
+        for processo in processos:
+            processo.join()
+    except KeyboardInterrupt:
+        for processo in processos:
+            processo.terminate()
+        for processo in processos:
+            processo.join()